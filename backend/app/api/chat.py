@@ -1,55 +1,100 @@
 import time
-from fastapi import APIRouter, HTTPException
-from app.models.schemas import ChatRequest, ChatResponse, ChatResponseResult
+import asyncio
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Header, Response
+from starlette.concurrency import run_in_threadpool
+from app.models.schemas import SearchFilters, ChatRequest, ChatResponse, ChatResponseResult
+from app.rag import metrics
+from app.rag.profiling import request_profiler, should_profile
+from app.rag.admission import admission, Overloaded, ADMISSION_DEGRADE, ADMISSION_RETRY_AFTER
+from app.api.singleflight import SingleFlight, SINGLEFLIGHT_ENABLED, request_key
 
 router = APIRouter()
 
-@router.post("/message", response_model=ChatResponse)
-async def chat_endpoint(request: ChatRequest):
+# Identical requests in flight at the same time share one pipeline run (per worker)
+single_flight = SingleFlight()
+
+def run_pipeline(rag, query: str, mode: str, codes: Optional[List[str]] = None,
+                 filters: Optional[SearchFilters] = None) -> ChatResponseResult:
+    """Retrieve + generate for one mode, with per-stage timings."""
+    timings = {}
+    t0 = time.perf_counter()
+    docs = rag.retrieve(query, mode=mode, timings=timings, codes=codes, filters=filters)
+    answer = rag.generate(query, docs, mode=mode, timings=timings)
+    elapsed = time.perf_counter() - t0
+    timings["total"] = elapsed * 1000
+    metrics.REQUEST_LATENCY.labels(mode=mode).observe(elapsed)
+    return ChatResponseResult(
+        answer=answer,
+        sources=docs,
+        processing_time=elapsed,
+        timings=timings
+    )
+
+def answer_request(request: ChatRequest, profile: bool) -> ChatResponse:
+    """Blocking part of the endpoint (models, DB, OpenAI): runs in the threadpool."""
     from app.rag.rag_engine import RagEngine
     rag = RagEngine.get_instance()
-    
-    # --- COMPARISON LOGIC ---
-    if request.mode == "compare":
-        print("⚔️ COMPARISON Mode activated")
-        start_global = time.time()
-
-        # 1. Naive Pipeline
-        t0 = time.time()
-        docs_naive = rag.retrieve(request.query, mode="naive")
-        ans_naive = rag.generate(request.query, docs_naive)
-        res_naive = ChatResponseResult(
-            answer=ans_naive,
-            sources=docs_naive,
-            processing_time=time.time() - t0
-        )
-
-        # 2. Advanced Pipeline
-        t1 = time.time()
-        docs_adv = rag.retrieve(request.query, mode="advanced")
-        ans_adv = rag.generate(request.query, docs_adv)
-        res_adv = ChatResponseResult(
-            answer=ans_adv,
-            sources=docs_adv,
-            processing_time=time.time() - t1
-        )
-
-        return ChatResponse(
-            comparison={
-                "naive": res_naive,
-                "advanced": res_adv
-            },
-            processing_time=time.time() - start_global
-        )
-
-    # --- CLASSIC LOGIC (Naive or Advanced) ---
-    else:
-        start = time.time()
-        relevant_docs = rag.retrieve(request.query, mode=request.mode)
-        ai_answer = rag.generate(request.query, relevant_docs)
-        
-        return ChatResponse(
-            answer=ai_answer, 
-            sources=relevant_docs,
-            processing_time=time.time() - start
-        )
+
+    # Opt-in sampling profiler (X-Profile header or PROFILE_SAMPLE_RATE)
+    with request_profiler(request.query, request.mode, profile):
+
+        # --- COMPARISON LOGIC ---
+        if request.mode == "compare":
+            print("⚔️ COMPARISON Mode activated")
+            start_global = time.time()
+
+            # 1. Naive Pipeline
+            res_naive = run_pipeline(rag, request.query, "naive", request.codes, request.filters)
+
+            # 2. Advanced Pipeline
+            res_adv = run_pipeline(rag, request.query, "advanced", request.codes, request.filters)
+
+            return ChatResponse(
+                comparison={
+                    "naive": res_naive,
+                    "advanced": res_adv
+                },
+                processing_time=time.time() - start_global
+            )
+
+        # --- CLASSIC LOGIC (Naive or Advanced) ---
+        else:
+            result = run_pipeline(rag, request.query, request.mode, request.codes, request.filters)
+
+            return ChatResponse(
+                answer=result.answer,
+                sources=result.sources,
+                processing_time=result.processing_time,
+                timings=result.timings
+            )
+
+async def admit_and_answer(request: ChatRequest, profile: bool) -> ChatResponse:
+    """Counts against the worker's in-flight cap (Overloaded when full) for the whole pipeline run."""
+    with admission.request():
+        return await run_in_threadpool(answer_request, request, profile)
+
+@router.post("/message", response_model=ChatResponse)
+async def chat_endpoint(request: ChatRequest, response: Response, x_profile: Optional[str] = Header(None)):
+    profile = should_profile(x_profile)
+
+    # Under pressure, skip keyword search + reranking rather than queue behind them
+    if ADMISSION_DEGRADE and request.mode == "advanced" and admission.under_pressure():
+        request = request.model_copy(update={"mode": "naive"})
+        response.headers["X-Degraded-Mode"] = "naive"
+        metrics.ADMISSION_DEGRADED.inc()
+
+    try:
+        # Profiled requests run on their own: a joined request would have nothing to profile
+        if not SINGLEFLIGHT_ENABLED or profile:
+            return await admit_and_answer(request, profile)
+
+        # Same normalized question, mode and scope already being answered: wait for that answer
+        key = request_key(request.query, request.mode, request.codes, request.filters)
+        result, _ = await single_flight.do(key, lambda: admit_and_answer(request, False))
+        return result
+    except Overloaded as e:
+        raise HTTPException(status_code=503, detail=f"Server busy ({e}), retry shortly.",
+                            headers={"Retry-After": str(ADMISSION_RETRY_AFTER)})
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="The same question is still being answered, retry shortly.")
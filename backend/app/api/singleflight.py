@@ -0,0 +1,85 @@
+# backend/app/api/singleflight.py
+import os
+import json
+import asyncio
+import logging
+import unicodedata
+from typing import Awaitable, Callable, Dict, Hashable, Tuple, TypeVar
+
+from app.rag import metrics
+
+logger = logging.getLogger(__name__)
+
+# Coalescing Configuration
+SINGLEFLIGHT_ENABLED = os.getenv("SINGLEFLIGHT_ENABLED", "true").lower() in ("1", "true", "yes")
+SINGLEFLIGHT_MAX_WAITERS = int(os.getenv("SINGLEFLIGHT_MAX_WAITERS", "50"))
+SINGLEFLIGHT_TIMEOUT = float(os.getenv("SINGLEFLIGHT_TIMEOUT", "60"))
+
+T = TypeVar("T")
+
+
+def request_key(query: str, mode: str, codes=None, filters=None) -> Tuple[str, str, str]:
+    """
+    Requests that must get the same answer: case, accents composition and whitespace of the
+    query are normalized; codes and filters are part of the key (they change the sources).
+    """
+    normalized = " ".join(unicodedata.normalize("NFC", query).lower().split())
+    scope = json.dumps([sorted(codes or []), filters.model_dump() if filters is not None else None],
+                       sort_keys=True, ensure_ascii=False)
+    return normalized, mode, scope
+
+
+class _Flight:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller starts the computation and
+    later callers await the same result (or exception). Nothing is kept once it completes.
+    The computation runs as its own task: a disconnecting caller does not cancel it for the others.
+    At most `max_waiters` callers join a flight (the next ones run their own computation), and a
+    joined caller gives up after `timeout` seconds (asyncio.TimeoutError).
+    """
+
+    def __init__(self, max_waiters: int = SINGLEFLIGHT_MAX_WAITERS, timeout: float = SINGLEFLIGHT_TIMEOUT):
+        self.max_waiters = max_waiters
+        self.timeout = timeout
+        self._flights: Dict[Hashable, _Flight] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """Returns (result, shared): shared is True when the result came from another caller's flight."""
+        flight = self._flights.get(key)
+        if flight is not None:
+            if flight.waiters >= self.max_waiters:
+                metrics.SINGLEFLIGHT_REQUESTS.labels(result="overflow").inc()
+                return await fn(), False
+            flight.waiters += 1
+            metrics.SINGLEFLIGHT_REQUESTS.labels(result="joined").inc()
+            try:
+                return await asyncio.wait_for(asyncio.shield(flight.task), self.timeout), True
+            except asyncio.TimeoutError:
+                metrics.SINGLEFLIGHT_REQUESTS.labels(result="timeout").inc()
+                raise
+            finally:
+                flight.waiters -= 1
+
+        task = asyncio.ensure_future(fn())
+        self._flights[key] = _Flight(task)
+        task.add_done_callback(lambda _: self._forget(key, task))
+        metrics.SINGLEFLIGHT_REQUESTS.labels(result="leader").inc()
+        return await asyncio.shield(task), False
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        flight = self._flights.get(key)
+        if flight is not None and flight.task is task:
+            del self._flights[key]
+        if flight is not None and flight.waiters:
+            logger.info(f"Single-flight: 1 computation served {flight.waiters + 1} requests")
+        if not task.cancelled():
+            task.exception()  # marks a failure as retrieved if every caller gave up on it
+
+    def in_flight(self) -> int:
+        return len(self._flights)
@@ -1,5 +1,5 @@
 # backend/app/main.py
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from app.api import chat
 import os
@@ -22,6 +22,12 @@ app.add_middleware(
 
 app.include_router(chat.router, prefix="/api")
 
+@app.get("/metrics")
+async def prometheus_metrics():
+    from prometheus_client import CONTENT_TYPE_LATEST
+    from app.rag.metrics import render_metrics
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE_LATEST)
+
 @app.get("/")
 async def root():
     return {"status": "Legal AI API is running 🚀"}
\ No newline at end of file
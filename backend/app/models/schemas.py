@@ -8,23 +8,36 @@ class Metadata(BaseModel):
 
 class Source(BaseModel):
     article_number: str
+    code_source: Optional[str] = None
     content: str
     metadata: Metadata
     score: float
 
+class SearchFilters(BaseModel):
+    # Values of one field are OR-ed, fields are AND-ed. Article "L221-18": type "L", number 221, book 2
+    themes: Optional[List[str]] = None  # metadata.theme
+    types: Optional[List[str]] = None  # L (législative), R (réglementaire), D (décret)
+    books: Optional[List[int]] = None
+    range_from: Optional[int] = None  # first number of the article, inclusive (e.g. 211)
+    range_to: Optional[int] = None
+
 class ChatRequest(BaseModel):
     query: str
     mode: str = "advanced"  # naive, advanced, or compare
+    codes: Optional[List[str]] = None  # restricts retrieval to these code_source values (all codes if empty)
+    filters: Optional[SearchFilters] = None
 
 
 class ChatResponseResult(BaseModel):
     answer: str
     sources: List[Source]
     processing_time: float
+    timings: Optional[Dict[str, float]] = None  # per-stage latency in ms
 
 
 class ChatResponse(BaseModel):
     answer: Optional[str] = None
     sources: Optional[List[Source]] = None
     processing_time: Optional[float] = None
+    timings: Optional[Dict[str, float]] = None  # per-stage latency in ms
     comparison: Optional[Dict[str, ChatResponseResult]] = None
\ No newline at end of file
@@ -0,0 +1,149 @@
+# backend/app/rag/admission.py
+import os
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict
+
+from app.rag import metrics
+
+# Admission Configuration
+# Per stage: concurrent calls (0 = unlimited) and callers allowed to wait for a slot.
+# Sized for one worker: the DB limit matches the connection pool (maxconn=10).
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() in ("1", "true", "yes")
+STAGE_LIMITS = {
+    "embedding": (int(os.getenv("ADMISSION_EMBEDDING_LIMIT", "4")), int(os.getenv("ADMISSION_EMBEDDING_QUEUE", "16"))),
+    "db": (int(os.getenv("ADMISSION_DB_LIMIT", "10")), int(os.getenv("ADMISSION_DB_QUEUE", "32"))),
+    "rerank": (int(os.getenv("ADMISSION_RERANK_LIMIT", "2")), int(os.getenv("ADMISSION_RERANK_QUEUE", "8"))),
+    "llm": (int(os.getenv("ADMISSION_LLM_LIMIT", "16")), int(os.getenv("ADMISSION_LLM_QUEUE", "64"))),
+}
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "5"))  # seconds waiting for a stage slot
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "32"))  # pipeline runs per worker
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", "2"))  # Retry-After of the 503 (seconds)
+# Under pressure, "advanced" requests run the "naive" pipeline (no keyword search, no reranking)
+ADMISSION_DEGRADE = os.getenv("ADMISSION_DEGRADE", "true").lower() in ("1", "true", "yes")
+ADMISSION_DEGRADE_AT = float(os.getenv("ADMISSION_DEGRADE_AT", "0.75"))  # fraction of the in-flight cap
+
+# True while an API request admitted by AdmissionController.request() runs (the threadpool call
+# inherits it): stage limits only apply then, offline callers (evaluation scripts) are never shed.
+_admitted: ContextVar[bool] = ContextVar("admitted", default=False)
+
+
+class Overloaded(Exception):
+    """No capacity left for a request: answered with 503 + Retry-After."""
+
+    def __init__(self, stage: str, reason: str):
+        super().__init__(f"{stage} overloaded ({reason})")
+        self.stage = stage
+        self.reason = reason
+
+
+class StageLimiter:
+    """
+    Bounded concurrency for one pipeline stage, used from the threadpool threads.
+    Callers beyond `limit` wait (FIFO-ish) for up to `timeout` seconds; when `max_queue`
+    callers are already waiting, new ones are shed immediately instead of piling up.
+    """
+
+    def __init__(self, stage: str, limit: int, max_queue: int, timeout: float = ADMISSION_QUEUE_TIMEOUT):
+        self.stage = stage
+        self.limit = limit
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.active = 0
+        self.waiting = 0
+        self._cond = threading.Condition()
+
+    def _shed(self, reason: str):
+        metrics.ADMISSION_SHED.labels(stage=self.stage, reason=reason).inc()
+        raise Overloaded(self.stage, reason)
+
+    @contextmanager
+    def slot(self):
+        if self.limit <= 0:
+            yield
+            return
+        with self._cond:
+            if self.active >= self.limit:
+                if self.waiting >= self.max_queue:
+                    self._shed("queue_full")
+                self.waiting += 1
+                metrics.ADMISSION_QUEUE.labels(stage=self.stage).inc()
+                try:
+                    admitted = self._cond.wait_for(lambda: self.active < self.limit, self.timeout)
+                finally:
+                    self.waiting -= 1
+                    metrics.ADMISSION_QUEUE.labels(stage=self.stage).dec()
+                if not admitted:
+                    self._shed("timeout")
+            self.active += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.active -= 1
+                self._cond.notify()
+
+    def saturated(self) -> bool:
+        return self.limit > 0 and self.active >= self.limit and self.waiting > 0
+
+
+class AdmissionController:
+    """
+    Per-worker admission: an overall cap on pipeline runs in flight (checked on the event loop,
+    no waiting) and one StageLimiter per stage (checked inside the pipeline, for admitted
+    requests only: RagEngine called outside the API is not limited).
+    """
+
+    def __init__(self, max_in_flight: int = ADMISSION_MAX_IN_FLIGHT, stage_limits: Dict = None,
+                 enabled: bool = ADMISSION_ENABLED):
+        self.enabled = enabled
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self._lock = threading.Lock()
+        self.stages = {
+            stage: StageLimiter(stage, limit, queue)
+            for stage, (limit, queue) in (stage_limits or STAGE_LIMITS).items()
+        }
+
+    @contextmanager
+    def request(self):
+        """One pipeline run; raises Overloaded when the worker already runs max_in_flight."""
+        if not self.enabled:
+            yield
+            return
+        with self._lock:
+            if self.max_in_flight > 0 and self.in_flight >= self.max_in_flight:
+                metrics.ADMISSION_SHED.labels(stage="request", reason="in_flight").inc()
+                raise Overloaded("request", "in_flight")
+            self.in_flight += 1
+        metrics.ADMISSION_IN_FLIGHT.inc()
+        token = _admitted.set(True)
+        try:
+            yield
+        finally:
+            _admitted.reset(token)
+            with self._lock:
+                self.in_flight -= 1
+            metrics.ADMISSION_IN_FLIGHT.dec()
+
+    @contextmanager
+    def stage(self, name: str):
+        limiter = self.stages.get(name) if self.enabled and _admitted.get() else None
+        if limiter is None:
+            yield
+            return
+        with limiter.slot():
+            yield
+
+    def under_pressure(self) -> bool:
+        """Worth degrading: in-flight close to the cap, or the rerank stage has a queue."""
+        if not self.enabled:
+            return False
+        if self.max_in_flight > 0 and self.in_flight >= ADMISSION_DEGRADE_AT * self.max_in_flight:
+            return True
+        rerank = self.stages.get("rerank")
+        return rerank is not None and rerank.saturated()
+
+
+admission = AdmissionController()
@@ -0,0 +1,211 @@
+# backend/app/rag/embedding_cache.py
+import os
+import sqlite3
+import hashlib
+import logging
+from pathlib import Path
+from typing import Callable, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Cache Configuration
+# Shared by the API (query embeddings), the evaluation and the ingest scripts (article embeddings).
+DEFAULT_CACHE_DIR = Path(__file__).resolve().parents[2] / ".cache" / "embeddings"
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", str(DEFAULT_CACHE_DIR))
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+DEFAULT_BACKEND = "sentence-transformers"
+VECTOR_DTYPE = np.dtype("<f2")
+LOOKUP_CHUNK = 500  # stays under SQLite's bound-parameter limit
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS namespaces (
+    id INTEGER PRIMARY KEY,
+    model TEXT NOT NULL,
+    backend TEXT NOT NULL,
+    instruction_prefix TEXT NOT NULL,
+    dim INTEGER,
+    rows INTEGER NOT NULL DEFAULT 0,
+    UNIQUE (model, backend, instruction_prefix)
+);
+
+CREATE TABLE IF NOT EXISTS entries (
+    namespace INTEGER NOT NULL,
+    text_hash BLOB NOT NULL,
+    row INTEGER NOT NULL,
+    PRIMARY KEY (namespace, text_hash)
+) WITHOUT ROWID;
+"""
+
+
+def text_hash(text: str) -> bytes:
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    """
+    Content-addressed store of embeddings for one (model, backend, instruction prefix).
+    Vectors are appended to a float16 array file (`<namespace>.f16`) read through np.memmap;
+    a SQLite index (WAL mode) maps sha256(text) to a row, so several processes can share the store.
+    Writers serialize on the SQLite write lock; rows written by a crashed writer are simply reused.
+    """
+
+    def __init__(self, model: str, backend: str = DEFAULT_BACKEND, instruction_prefix: str = "",
+                 root: str = EMBEDDING_CACHE_DIR):
+        self.model = model
+        self.backend = backend
+        self.instruction_prefix = instruction_prefix
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.index_path = self.root / "index.sqlite3"
+        self.hits = 0
+        self.misses = 0
+
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL;")
+            conn.executescript(SCHEMA)
+            conn.execute(
+                "INSERT OR IGNORE INTO namespaces (model, backend, instruction_prefix) VALUES (?, ?, ?);",
+                (model, backend, instruction_prefix)
+            )
+            self.namespace, self.dim = conn.execute(
+                "SELECT id, dim FROM namespaces WHERE model = ? AND backend = ? AND instruction_prefix = ?;",
+                (model, backend, instruction_prefix)
+            ).fetchone()
+        finally:
+            conn.close()
+        self.vectors_path = self.root / f"{self.namespace}.f16"
+        self._mmap = None
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(str(self.index_path), timeout=30, isolation_level=None)
+
+    def _vectors(self, needed_rows: int) -> np.ndarray:
+        """Memory-maps the array file, re-mapping when another writer made it grow."""
+        if self._mmap is None or self._mmap.shape[0] < needed_rows:
+            rows = os.path.getsize(self.vectors_path) // (self.dim * VECTOR_DTYPE.itemsize)
+            self._mmap = np.memmap(self.vectors_path, dtype=VECTOR_DTYPE, mode="r", shape=(rows, self.dim))
+        return self._mmap
+
+    def _lookup(self, conn: sqlite3.Connection, hashes: Sequence[bytes]) -> dict:
+        found = {}
+        for i in range(0, len(hashes), LOOKUP_CHUNK):
+            chunk = hashes[i:i + LOOKUP_CHUNK]
+            found.update(conn.execute(
+                f"SELECT text_hash, row FROM entries WHERE namespace = ? "
+                f"AND text_hash IN ({', '.join('?' * len(chunk))});",
+                (self.namespace, *chunk)
+            ).fetchall())
+        return found
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """float32 vector for each text, or None when it was never embedded with this namespace."""
+        hashes = [text_hash(t) for t in texts]
+        conn = self._connect()
+        try:
+            if self.dim is None:
+                self.dim = conn.execute("SELECT dim FROM namespaces WHERE id = ?;", (self.namespace,)).fetchone()[0]
+            found = self._lookup(conn, hashes) if self.dim else {}
+        finally:
+            conn.close()
+
+        result = [None] * len(texts)
+        if found:
+            rows = [found.get(h) for h in hashes]
+            vectors = self._vectors(max(r for r in rows if r is not None) + 1)
+            for i, row in enumerate(rows):
+                if row is not None:
+                    result[i] = np.asarray(vectors[row], dtype=np.float32)
+        hits = sum(v is not None for v in result)
+        self.hits += hits
+        self.misses += len(texts) - hits
+        return result
+
+    def put_many(self, texts: Sequence[str], vectors) -> int:
+        """Appends the vectors of texts not stored yet. Returns the number of new rows."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if len(texts) == 0:
+            return 0
+        unique = {}
+        for t, v in zip(texts, vectors):
+            unique[text_hash(t)] = v
+
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE;")
+            dim, rows = conn.execute("SELECT dim, rows FROM namespaces WHERE id = ?;", (self.namespace,)).fetchone()
+            if dim is None:
+                dim = vectors.shape[1]
+                conn.execute("UPDATE namespaces SET dim = ? WHERE id = ?;", (dim, self.namespace))
+            elif dim != vectors.shape[1]:
+                raise ValueError(f"Embedding cache {self.model}: expected dim {dim}, got {vectors.shape[1]}")
+            existing = self._lookup(conn, list(unique))
+            new = [(h, v) for h, v in unique.items() if h not in existing]
+            if not new:
+                conn.execute("COMMIT;")
+                return 0
+
+            # Rows past `rows` belong to no committed entry: overwrite them
+            with open(self.vectors_path, "r+b" if self.vectors_path.exists() else "w+b") as f:
+                f.seek(rows * dim * VECTOR_DTYPE.itemsize)
+                f.write(np.stack([v for _, v in new]).astype(VECTOR_DTYPE).tobytes())
+            conn.executemany(
+                "INSERT INTO entries (namespace, text_hash, row) VALUES (?, ?, ?);",
+                [(self.namespace, h, rows + i) for i, (h, _) in enumerate(new)]
+            )
+            conn.execute("UPDATE namespaces SET rows = ? WHERE id = ?;", (rows + len(new), self.namespace))
+            conn.execute("COMMIT;")
+            self.dim = dim
+            return len(new)
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK;")
+            raise
+        finally:
+            conn.close()
+
+    def encode(self, texts: Sequence[str], encode_fn: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """
+        Cached version of `encode_fn(texts)`: only the missing texts (deduplicated) reach the model,
+        so a fully cached corpus needs no inference at all. Returns float32 (len(texts), dim).
+        """
+        texts = list(texts)
+        cached = self.get_many(texts)
+        missing = list(dict.fromkeys(t for t, v in zip(texts, cached) if v is None))
+        computed = {}
+        if missing:
+            vectors = np.asarray(encode_fn(missing), dtype=np.float32)
+            self.put_many(missing, vectors)
+            computed = dict(zip(missing, vectors))
+        if not texts:
+            return np.zeros((0, self.dim or 0), dtype=np.float32)
+        return np.stack([v if v is not None else computed[t] for t, v in zip(texts, cached)])
+
+    def stats(self) -> dict:
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT rows FROM namespaces WHERE id = ?;", (self.namespace,)).fetchone()[0]
+        finally:
+            conn.close()
+        lookups = self.hits + self.misses
+        return {
+            "rows": rows,
+            "size_bytes": os.path.getsize(self.vectors_path) if self.vectors_path.exists() else 0,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def open_embedding_cache(model: str, instruction_prefix: str = "",
+                         backend: str = DEFAULT_BACKEND) -> Optional[EmbeddingCache]:
+    """EmbeddingCache, or None when disabled or unusable (callers then always run the model)."""
+    if not EMBEDDING_CACHE_ENABLED:
+        return None
+    try:
+        return EmbeddingCache(model, backend=backend, instruction_prefix=instruction_prefix)
+    except Exception as e:
+        logger.error(f"Embedding cache initialization error: {e}")
+        return None
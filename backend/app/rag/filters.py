@@ -0,0 +1,41 @@
+# backend/app/rag/filters.py
+import json
+from typing import Optional, Sequence, Tuple
+
+from app.models.schemas import SearchFilters
+
+
+def is_empty(codes: Optional[Sequence[str]], filters: Optional[SearchFilters]) -> bool:
+    return not codes and (filters is None or not any(filters.model_dump().values()))
+
+
+def filter_sql(codes: Optional[Sequence[str]] = None,
+               filters: Optional[SearchFilters] = None) -> Tuple[str, list]:
+    """
+    "AND ..." clause + parameters for the search queries. Every condition can use an index:
+    code_source (partition pruning), metadata @> (GIN jsonb_path_ops) and the article_type /
+    article_major generated columns (btree). Values within a field are OR-ed, fields are AND-ed.
+    """
+    clauses, params = [], []
+    if codes:
+        clauses.append("code_source = ANY(%s)")
+        params.append(list(codes))
+    if filters is not None:
+        if filters.themes:
+            clauses.append("(" + " OR ".join(["metadata @> %s::jsonb"] * len(filters.themes)) + ")")
+            params.extend(json.dumps({"theme": t}, ensure_ascii=False) for t in filters.themes)
+        if filters.types:
+            clauses.append("article_type = ANY(%s)")
+            params.append([t.upper() for t in filters.types])
+        if filters.books:
+            # Book n = articles n00 to n99
+            clauses.append("(article_major / 100) = ANY(%s)")
+            params.append(list(filters.books))
+        if filters.range_from is not None:
+            clauses.append("article_major >= %s")
+            params.append(filters.range_from)
+        if filters.range_to is not None:
+            clauses.append("article_major <= %s")
+            params.append(filters.range_to)
+    sql = "".join(f" AND {c}" for c in clauses)
+    return sql, params
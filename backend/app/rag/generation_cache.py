@@ -0,0 +1,232 @@
+# backend/app/rag/generation_cache.py
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Cache Configuration
+# The file lives next to the backend so the API workers and the ingest scripts share it.
+DEFAULT_CACHE_PATH = Path(__file__).resolve().parents[2] / ".cache" / "generation_cache.sqlite3"
+CACHE_PATH = os.getenv("GENERATION_CACHE_PATH", str(DEFAULT_CACHE_PATH))
+CACHE_MAX_BYTES = int(os.getenv("GENERATION_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+CACHE_ENABLED = os.getenv("GENERATION_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS generations (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS generations_last_access_idx ON generations (last_access);
+
+-- Article numbers repeat across codes (L221-18...): dependencies are (code_source, article_number)
+CREATE TABLE IF NOT EXISTS generation_sources (
+    key TEXT NOT NULL,
+    code_source TEXT NOT NULL,
+    article_number TEXT NOT NULL,
+    PRIMARY KEY (key, code_source, article_number)
+);
+CREATE INDEX IF NOT EXISTS generation_sources_article_idx ON generation_sources (code_source, article_number);
+
+CREATE TABLE IF NOT EXISTS generation_stats (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+def prompt_fingerprint(model: str, temperature: float, system_prompt: str,
+                       source_contents: List[str], query: str) -> str:
+    """
+    Hash of everything that determines the LLM output.
+    Source order is kept on purpose: a different order is a different prompt.
+    """
+    payload = json.dumps(
+        [model, temperature, system_prompt, list(source_contents), query],
+        ensure_ascii=False, separators=(",", ":")
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class GenerationCache:
+    """
+    Exact-match cache of LLM answers stored in a local SQLite file.
+    SQLite (WAL mode) lets every uvicorn worker and the ingest scripts share the same store.
+    Entries are evicted in LRU order once the stored answers exceed `max_bytes`.
+    """
+
+    def __init__(self, path: str = CACHE_PATH, max_bytes: int = CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL;")
+            conn.executescript(SCHEMA)
+            self._drop_legacy_dependencies(conn)
+
+    def _drop_legacy_dependencies(self, conn: sqlite3.Connection):
+        """Files written before dependencies had a code: their answers cannot be purged per code."""
+        legacy = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'generation_articles';"
+        ).fetchone()
+        if legacy:
+            conn.execute("DELETE FROM generations;")
+            conn.execute("DROP TABLE generation_articles;")
+            logger.info("Generation cache: dropped entries without code_source dependencies.")
+
+    def _connect(self) -> sqlite3.Connection:
+        # One short-lived connection per operation: safe across threads and processes.
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def _bump(self, conn: sqlite3.Connection, name: str, amount: int = 1):
+        conn.execute(
+            "INSERT INTO generation_stats (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value;",
+            (name, amount)
+        )
+
+    def get(self, key: str) -> Optional[str]:
+        """Returns the cached answer and refreshes its LRU position, or None."""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE;")
+            row = conn.execute("SELECT answer, size FROM generations WHERE key = ?;", (key,)).fetchone()
+            if row is None:
+                self._bump(conn, "misses")
+                conn.execute("COMMIT;")
+                return None
+            conn.execute("UPDATE generations SET last_access = ? WHERE key = ?;", (time.time(), key))
+            self._bump(conn, "hits")
+            self._bump(conn, "bytes_saved", row[1])
+            conn.execute("COMMIT;")
+            return row[0]
+        except sqlite3.Error as e:
+            logger.error(f"Generation cache read error: {e}")
+            return None
+        finally:
+            conn.close()
+
+    def put(self, key: str, model: str, answer: str, articles: Iterable[Tuple[str, str]]):
+        """Stores an answer, records the (code_source, article_number) it depends on, then evicts LRU entries."""
+        size = len(answer.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE;")
+            conn.execute(
+                "INSERT OR REPLACE INTO generations (key, model, answer, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?);",
+                (key, model, answer, size, now, now)
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO generation_sources (key, code_source, article_number) VALUES (?, ?, ?);",
+                [(key, code or "", number) for code, number in set(articles)]
+            )
+            self._evict(conn)
+            conn.execute("COMMIT;")
+        except sqlite3.Error as e:
+            logger.error(f"Generation cache write error: {e}")
+        finally:
+            conn.close()
+
+    def _evict(self, conn: sqlite3.Connection):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM generations;").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = 0
+        for key, size in conn.execute("SELECT key, size FROM generations ORDER BY last_access ASC;").fetchall():
+            if total <= self.max_bytes:
+                break
+            self._delete_keys(conn, [key])
+            total -= size
+            evicted += 1
+        self._bump(conn, "evictions", evicted)
+        logger.info(f"Generation cache: evicted {evicted} entries (LRU).")
+
+    def _delete_keys(self, conn: sqlite3.Connection, keys: List[str]):
+        conn.executemany("DELETE FROM generations WHERE key = ?;", [(k,) for k in keys])
+        conn.executemany("DELETE FROM generation_sources WHERE key = ?;", [(k,) for k in keys])
+
+    def purge_articles(self, code_source: str, article_numbers: Iterable[str]) -> int:
+        """Drops every cached answer whose prompt referenced one of these articles of `code_source`."""
+        article_numbers = list(set(article_numbers))
+        if not article_numbers:
+            return 0
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE;")
+            keys = set()
+            for a in article_numbers:
+                rows = conn.execute(
+                    "SELECT key FROM generation_sources WHERE code_source = ? AND article_number = ?;",
+                    (code_source, a)
+                ).fetchall()
+                keys.update(r[0] for r in rows)
+            self._delete_keys(conn, list(keys))
+            conn.execute("COMMIT;")
+            return len(keys)
+        except sqlite3.Error as e:
+            logger.error(f"Generation cache purge error: {e}")
+            return 0
+        finally:
+            conn.close()
+
+    def clear(self):
+        """Drops all cached answers (used after a full TRUNCATE + reload)."""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE;")
+            conn.execute("DELETE FROM generations;")
+            conn.execute("DELETE FROM generation_sources;")
+            conn.execute("COMMIT;")
+        finally:
+            conn.close()
+
+    def stats(self) -> dict:
+        """Cumulative counters shared by all processes using this file."""
+        conn = self._connect()
+        try:
+            values = dict(conn.execute("SELECT name, value FROM generation_stats;").fetchall())
+            entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM generations;").fetchone()
+        finally:
+            conn.close()
+        hits, misses = values.get("hits", 0), values.get("misses", 0)
+        lookups = hits + misses
+        return {
+            "entries": entries,
+            "size_bytes": size,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "bytes_saved": values.get("bytes_saved", 0),
+            "evictions": values.get("evictions", 0),
+        }
+
+
+def purge_cached_generations(code_source: str, article_numbers: Optional[Iterable[str]] = None):
+    """
+    Helper for the ingest scripts: invalidates answers built on re-ingested articles of `code_source`
+    (the same article number in another code is left alone).
+    Without article numbers (full reload), the whole cache is cleared.
+    """
+    try:
+        cache = GenerationCache()
+        if article_numbers is None:
+            cache.clear()
+            print("Generation cache cleared.")
+        else:
+            purged = cache.purge_articles(code_source, article_numbers)
+            print(f"Generation cache: {purged} answers invalidated.")
+    except Exception as e:
+        print(f"Generation cache purge failed: {e}")
@@ -0,0 +1,152 @@
+# backend/app/rag/metrics.py
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+from prometheus_client import Counter, Gauge, Histogram, CollectorRegistry, REGISTRY, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+
+# Latency buckets (seconds): from a cached keyword lookup up to a slow OpenAI call
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# --- GENERATION CACHE ---
+
+GENERATION_CACHE_LOOKUPS = Counter(
+    "rag_generation_cache_lookups_total",
+    "Exact-match generation cache lookups",
+    ["result"]  # hit | miss
+)
+
+GENERATION_CACHE_BYTES_SAVED = Counter(
+    "rag_generation_cache_bytes_saved_total",
+    "Bytes of LLM answers served from the generation cache instead of the API"
+)
+
+# --- PIPELINE ---
+
+STAGE_LATENCY = Histogram(
+    "rag_stage_latency_seconds",
+    "Latency of each pipeline stage",
+    ["stage", "mode"],
+    buckets=LATENCY_BUCKETS
+)
+
+REQUEST_LATENCY = Histogram(
+    "rag_request_latency_seconds",
+    "End-to-end latency of /api/message",
+    ["mode"],
+    buckets=LATENCY_BUCKETS
+)
+
+DB_POOL_WAIT = Histogram(
+    "rag_db_pool_wait_seconds",
+    "Time spent acquiring a connection from the PostgreSQL pool",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+)
+
+CANDIDATES = Counter(
+    "rag_candidates_total",
+    "Documents handled per retrieval step",
+    ["step", "mode"]  # vector | keyword | fused | reranked
+)
+
+LLM_TOKENS = Counter(
+    "rag_llm_tokens_total",
+    "OpenAI token usage",
+    ["kind"]  # prompt | completion
+)
+
+
+# --- API ---
+
+SINGLEFLIGHT_REQUESTS = Counter(
+    "rag_singleflight_requests_total",
+    "Chat requests by single-flight outcome",
+    ["result"]  # leader | joined | overflow | timeout
+)
+
+# livesum: with several workers, the exported value is the sum over the live workers
+ADMISSION_IN_FLIGHT = Gauge(
+    "rag_admission_in_flight",
+    "Pipeline runs in flight",
+    multiprocess_mode="livesum"
+)
+
+ADMISSION_QUEUE = Gauge(
+    "rag_admission_queue_length",
+    "Requests waiting for a stage slot",
+    ["stage"],  # embedding | db | rerank | llm
+    multiprocess_mode="livesum"
+)
+
+ADMISSION_SHED = Counter(
+    "rag_admission_shed_total",
+    "Requests rejected with 503 by admission control",
+    ["stage", "reason"]  # reason: in_flight | queue_full | timeout
+)
+
+ADMISSION_DEGRADED = Counter(
+    "rag_admission_degraded_total",
+    "Advanced requests served by the naive pipeline under pressure"
+)
+
+
+@contextmanager
+def stage_timer(stage: str, mode: str, timings: Optional[Dict[str, float]] = None):
+    """
+    Times a pipeline stage into the Prometheus histogram and,
+    when given, into the per-request `timings` dict (milliseconds).
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_LATENCY.labels(stage=stage, mode=mode).observe(elapsed)
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + elapsed * 1000
+
+
+class GenerationCacheCollector:
+    """Exposes the cross-process totals kept in the generation cache file."""
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def collect(self):
+        try:
+            stats = self.cache.stats()
+        except Exception:
+            return
+        for name, help_text in (
+            ("hit_rate", "Generation cache hit rate (all workers)"),
+            ("entries", "Entries in the generation cache"),
+            ("size_bytes", "Size of the cached answers"),
+            ("bytes_saved", "Bytes served from the generation cache (all workers)"),
+        ):
+            yield GaugeMetricFamily(f"rag_generation_cache_shared_{name}", help_text, value=stats[name])
+
+
+_cache_collector = None
+
+
+def register_generation_cache(cache):
+    global _cache_collector
+    if cache is not None and _cache_collector is None:
+        _cache_collector = GenerationCacheCollector(cache)
+        REGISTRY.register(_cache_collector)
+
+
+def render_metrics() -> bytes:
+    """
+    Prometheus text exposition.
+    With PROMETHEUS_MULTIPROC_DIR set (several uvicorn workers), samples from all workers are merged.
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        if _cache_collector is not None:
+            registry.register(_cache_collector)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
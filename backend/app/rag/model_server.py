@@ -0,0 +1,401 @@
+# backend/app/rag/model_server.py
+"""
+Model-serving sidecar: one process owns the embedding and reranking models and serves every API
+worker over a Unix socket (or localhost TCP). With N uvicorn workers there is still one copy of
+the models in RAM, one torch thread pool and one cold start.
+
+    cd backend && python -m app.rag.model_server                 # listens on DEFAULT_MODEL_SERVER_URL
+    MODEL_SERVER_URL=unix:///tmp/legal-ai-models.sock uvicorn app.main:app --workers 4
+
+Without MODEL_SERVER_URL, RagEngine loads the models in-process as before.
+
+Protocol (header big-endian, float32 payloads little-endian):
+    request  = op:u8 request_id:u32 length:u32 payload
+    response = status:u8 request_id:u32 length:u32 payload      (status 1: payload is the error)
+    strings  = count:u32 (length:u32 utf-8)*
+    encode   : strings                            -> rows:u32 dim:u32 float32[rows * dim]
+    rerank   : strings (query, passage, query...) -> count:u32 float32[count]
+    ping     : empty                              -> utf-8 JSON (models, threads, batching)
+Requests from all workers arriving within MODEL_SERVER_BATCH_WAIT_MS are run as one model batch.
+"""
+import os
+import json
+import time
+import select
+import socket
+import struct
+import asyncio
+import logging
+import argparse
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Server Configuration
+DEFAULT_MODEL_SERVER_URL = "unix:///tmp/legal-ai-models.sock"
+MODEL_SERVER_URL = os.getenv("MODEL_SERVER_URL", "")  # empty: each process loads its own models
+MODEL_SERVER_THREADS = int(os.getenv("MODEL_SERVER_THREADS", str(os.cpu_count() or 1)))
+MODEL_SERVER_MAX_BATCH = int(os.getenv("MODEL_SERVER_MAX_BATCH", "64"))
+MODEL_SERVER_BATCH_WAIT_MS = float(os.getenv("MODEL_SERVER_BATCH_WAIT_MS", "5"))
+MODEL_SERVER_TIMEOUT = float(os.getenv("MODEL_SERVER_TIMEOUT", "60"))
+
+OP_PING, OP_ENCODE, OP_RERANK = 0, 1, 2
+STATUS_OK, STATUS_ERROR = 0, 1
+HEADER = struct.Struct("!BII")
+COUNT = struct.Struct("!I")
+SHAPE = struct.Struct("!II")
+FLOAT32 = np.dtype("<f4")
+
+
+class ModelServerError(RuntimeError):
+    pass
+
+
+# --- WIRE FORMAT ---
+
+def pack_strings(strings: Sequence[str]) -> bytes:
+    parts = [COUNT.pack(len(strings))]
+    for s in strings:
+        data = s.encode("utf-8")
+        parts.append(COUNT.pack(len(data)))
+        parts.append(data)
+    return b"".join(parts)
+
+
+def unpack_strings(payload: bytes) -> List[str]:
+    (count,), offset = COUNT.unpack_from(payload), COUNT.size
+    strings = []
+    for _ in range(count):
+        (length,) = COUNT.unpack_from(payload, offset)
+        offset += COUNT.size
+        strings.append(payload[offset:offset + length].decode("utf-8"))
+        offset += length
+    return strings
+
+
+def pack_matrix(matrix: np.ndarray) -> bytes:
+    """2D float32 matrix; a 1D vector is sent as one row, an empty array as (0, 0)."""
+    matrix = np.ascontiguousarray(matrix, dtype=FLOAT32)
+    if matrix.size == 0 and matrix.ndim != 2:
+        matrix = matrix.reshape(0, 0)
+    elif matrix.ndim != 2:
+        matrix = matrix.reshape(-1, matrix.shape[-1])
+    return SHAPE.pack(*matrix.shape) + matrix.tobytes()
+
+
+def unpack_matrix(payload: bytes) -> np.ndarray:
+    rows, dim = SHAPE.unpack_from(payload)
+    matrix = np.frombuffer(payload, dtype=FLOAT32, count=rows * dim, offset=SHAPE.size)
+    return matrix.reshape(rows, dim).astype(np.float32)
+
+
+def pack_scores(scores: np.ndarray) -> bytes:
+    scores = np.ascontiguousarray(scores, dtype=FLOAT32).reshape(-1)
+    return COUNT.pack(len(scores)) + scores.tobytes()
+
+
+def unpack_scores(payload: bytes) -> np.ndarray:
+    (count,) = COUNT.unpack_from(payload)
+    return np.frombuffer(payload, dtype=FLOAT32, count=count, offset=COUNT.size).astype(np.float32)
+
+
+def parse_url(url: str) -> Tuple[str, object]:
+    """'unix:///path.sock' -> ('unix', path); 'tcp://host:port' -> ('tcp', (host, port))"""
+    if url.startswith("unix://"):
+        return "unix", url[len("unix://"):]
+    if url.startswith("tcp://"):
+        host, _, port = url[len("tcp://"):].rpartition(":")
+        return "tcp", (host or "127.0.0.1", int(port))
+    raise ValueError(f"Unsupported model server URL: {url} (unix:///path or tcp://host:port)")
+
+
+# --- SERVER ---
+
+class _Batcher:
+    """
+    Queue of (items, future) from concurrent requests: the items that arrive within `wait_s`
+    (up to `max_batch`) go through `run` as one batch, and each future gets its slice back.
+    """
+
+    def __init__(self, run: Callable[[list], np.ndarray], executor: ThreadPoolExecutor,
+                 max_batch: int, wait_s: float):
+        self.run = run
+        self.executor = executor
+        self.max_batch = max_batch
+        self.wait_s = wait_s
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.batches = 0
+        self.items = 0
+
+    async def submit(self, items: list) -> np.ndarray:
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((items, future))
+        return await future
+
+    async def loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            pending = [await self.queue.get()]
+            count = len(pending[0][0])
+            deadline = loop.time() + self.wait_s
+            while count < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    pending.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+                count += len(pending[-1][0])
+
+            flat = [item for items, _ in pending for item in items]
+            try:
+                # One executor thread: batches never run concurrently, torch owns the CPU threads
+                output = await loop.run_in_executor(self.executor, self.run, flat)
+            except Exception as e:
+                for _, future in pending:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.batches += 1
+            self.items += len(flat)
+            offset = 0
+            for items, future in pending:
+                if not future.done():  # the client may have disconnected
+                    future.set_result(output[offset:offset + len(items)])
+                offset += len(items)
+
+
+class ModelServer:
+    def __init__(self, url: str = DEFAULT_MODEL_SERVER_URL, threads: int = MODEL_SERVER_THREADS,
+                 max_batch: int = MODEL_SERVER_MAX_BATCH, batch_wait_ms: float = MODEL_SERVER_BATCH_WAIT_MS):
+        self.url = url
+        self.threads = threads
+        self.max_batch = max_batch
+        self.batch_wait_ms = batch_wait_ms
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model")
+        self.embedder = None
+        self.reranker = None
+
+    def load_models(self):
+        import torch
+        from sentence_transformers import CrossEncoder, SentenceTransformer
+        from app.rag.rag_engine import EMBEDDING_MODEL, RERANKING_MODEL
+
+        torch.set_num_threads(self.threads)
+        start = time.time()
+        self.embedder = SentenceTransformer(EMBEDDING_MODEL, trust_remote_code=True, device="cpu")
+        self.reranker = CrossEncoder(RERANKING_MODEL)
+        self.models = {"embedding_model": EMBEDDING_MODEL, "reranking_model": RERANKING_MODEL}
+        logger.info(f"Models loaded in {time.time() - start:.1f}s ({self.threads} torch threads)")
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        vectors = np.asarray(self.embedder.encode(texts, batch_size=self.max_batch), dtype=np.float32)
+        return vectors.reshape(len(texts), -1)  # one row per text, whatever shape the model returns
+
+    def _rerank(self, pairs: List[List[str]]) -> np.ndarray:
+        return np.asarray(self.reranker.predict(pairs, batch_size=self.max_batch), dtype=np.float32).reshape(-1)
+
+    async def _dispatch(self, op: int, payload: bytes) -> bytes:
+        if op == OP_ENCODE:
+            texts = unpack_strings(payload)
+            if not texts:  # nothing to batch; the dimension still lets the client stack results
+                return pack_matrix(np.zeros((0, self.embedder.get_sentence_embedding_dimension()), dtype=FLOAT32))
+            return pack_matrix(await self.encode_batcher.submit(texts))
+        if op == OP_RERANK:
+            flat = unpack_strings(payload)
+            pairs = [[flat[i], flat[i + 1]] for i in range(0, len(flat), 2)]
+            if not pairs:
+                return pack_scores(np.zeros(0, dtype=FLOAT32))
+            return pack_scores(await self.rerank_batcher.submit(pairs))
+        if op == OP_PING:
+            return json.dumps({
+                **self.models, "threads": self.threads, "max_batch": self.max_batch,
+                "batch_wait_ms": self.batch_wait_ms,
+                "encode": {"batches": self.encode_batcher.batches, "items": self.encode_batcher.items},
+                "rerank": {"batches": self.rerank_batcher.batches, "items": self.rerank_batcher.items},
+            }).encode("utf-8")
+        raise ModelServerError(f"Unknown op {op}")
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """One connection per client thread; requests on a connection are answered in order."""
+        try:
+            while True:
+                op, request_id, length = HEADER.unpack(await reader.readexactly(HEADER.size))
+                payload = await reader.readexactly(length)
+                try:
+                    status, body = STATUS_OK, await self._dispatch(op, payload)
+                except Exception as e:
+                    logger.error(f"Model server error (op {op}): {e}")
+                    status, body = STATUS_ERROR, str(e).encode("utf-8")
+                writer.write(HEADER.pack(status, request_id, len(body)) + body)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self):
+        wait_s = self.batch_wait_ms / 1000
+        self.encode_batcher = _Batcher(self._encode, self.executor, self.max_batch, wait_s)
+        self.rerank_batcher = _Batcher(self._rerank, self.executor, self.max_batch, wait_s)
+        tasks = [asyncio.create_task(b.loop()) for b in (self.encode_batcher, self.rerank_batcher)]
+
+        kind, address = parse_url(self.url)
+        if kind == "unix":
+            if os.path.exists(address):
+                os.remove(address)  # stale socket of a previous run
+            server = await asyncio.start_unix_server(self.handle, path=address)
+        else:
+            server = await asyncio.start_server(self.handle, host=address[0], port=address[1])
+        print(f"🧠 Model server listening on {self.url} (batch <= {self.max_batch}, wait {self.batch_wait_ms}ms)")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+# --- CLIENT ---
+
+class ModelServerClient:
+    """
+    Blocking client: one connection per thread, reconnected if the server restarted.
+    A request is only retried when it could not be sent (connect or send failure): the server
+    runs complete requests only, so it never ran it. A failure while waiting for the response
+    (timeout, connection lost) is raised, the request may have run.
+    """
+
+    def __init__(self, url: str = MODEL_SERVER_URL, timeout: float = MODEL_SERVER_TIMEOUT):
+        self.url = url
+        self.timeout = timeout
+        self._kind, self._address = parse_url(url)
+        self._local = threading.local()
+        self._ids = itertools.count(1)
+
+    def _connect(self) -> socket.socket:
+        family = socket.AF_UNIX if self._kind == "unix" else socket.AF_INET
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self._address)
+        if self._kind == "tcp":
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
+
+    @staticmethod
+    def _recv_exactly(sock: socket.socket, n: int) -> bytes:
+        buf = bytearray(n)
+        view = memoryview(buf)
+        received = 0
+        while received < n:
+            chunk = sock.recv_into(view[received:])
+            if chunk == 0:
+                raise ConnectionError("Model server closed the connection")
+            received += chunk
+        return bytes(buf)
+
+    @staticmethod
+    def _closed_by_peer(sock: socket.socket) -> bool:
+        """An idle connection is readable only once the server closed it (no request pending)."""
+        try:
+            readable, _, _ = select.select([sock], [], [], 0)
+            # Readable while idle: EOF, a reset, or stray bytes; none of them leave a usable connection
+            return bool(readable)
+        except (OSError, ValueError):
+            return True
+
+    def _drop(self, sock: socket.socket):
+        sock.close()
+        self._local.sock = None
+
+    def _send(self, message: bytes) -> socket.socket:
+        """Sends on this thread's connection, reconnecting once if it is gone before anything was sent."""
+        for attempt in range(2):
+            sock = getattr(self._local, "sock", None)
+            if sock is not None and self._closed_by_peer(sock):
+                self._drop(sock)
+                sock = None
+            try:
+                if sock is None:
+                    sock = self._local.sock = self._connect()
+                sock.sendall(message)
+                return sock
+            except OSError as e:
+                if sock is not None:
+                    self._drop(sock)
+                if attempt:
+                    raise ModelServerError(f"Model server unreachable at {self.url}: {e}") from e
+
+    def _call(self, op: int, payload: bytes = b"") -> bytes:
+        request_id = next(self._ids) & 0xFFFFFFFF
+        sock = self._send(HEADER.pack(op, request_id, len(payload)) + payload)
+        try:
+            status, response_id, length = HEADER.unpack(self._recv_exactly(sock, HEADER.size))
+            body = self._recv_exactly(sock, length)
+        except OSError as e:
+            # A late response would be read by the next request: never reuse this connection
+            self._drop(sock)
+            raise ModelServerError(f"No response from the model server at {self.url}: {e}") from e
+        if response_id != request_id:
+            self._drop(sock)
+            raise ModelServerError(f"Out-of-order response ({response_id} != {request_id})")
+        if status != STATUS_OK:
+            raise ModelServerError(body.decode("utf-8", errors="replace"))
+        return body
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        return unpack_matrix(self._call(OP_ENCODE, pack_strings(texts)))
+
+    def rerank(self, pairs: Sequence[Sequence[str]]) -> np.ndarray:
+        if not pairs:
+            return np.zeros(0, dtype=np.float32)
+        return unpack_scores(self._call(OP_RERANK, pack_strings([s for pair in pairs for s in pair])))
+
+    def ping(self) -> dict:
+        return json.loads(self._call(OP_PING))
+
+
+class RemoteEmbedder:
+    """Stands in for SentenceTransformer.encode as called by RagEngine (str -> 1D, list -> 2D)."""
+
+    def __init__(self, client: ModelServerClient):
+        self.client = client
+
+    def encode(self, sentences, batch_size: int = 32, **kwargs) -> np.ndarray:
+        if isinstance(sentences, str):
+            return self.client.encode([sentences])[0]
+        return self.client.encode(list(sentences))
+
+
+class RemoteReranker:
+    """Stands in for CrossEncoder.predict."""
+
+    def __init__(self, client: ModelServerClient):
+        self.client = client
+
+    def predict(self, pairs, **kwargs) -> np.ndarray:
+        return self.client.rerank(pairs)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embedding/reranking model server shared by the API workers")
+    parser.add_argument("--url", default=MODEL_SERVER_URL or DEFAULT_MODEL_SERVER_URL,
+                        help="unix:///path.sock or tcp://127.0.0.1:port")
+    parser.add_argument("--threads", type=int, default=MODEL_SERVER_THREADS, help="torch intra-op threads")
+    parser.add_argument("--max-batch", type=int, default=MODEL_SERVER_MAX_BATCH)
+    parser.add_argument("--batch-wait-ms", type=float, default=MODEL_SERVER_BATCH_WAIT_MS)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    model_server = ModelServer(args.url, args.threads, args.max_batch, args.batch_wait_ms)
+    model_server.load_models()
+    try:
+        asyncio.run(model_server.serve())
+    except KeyboardInterrupt:
+        pass
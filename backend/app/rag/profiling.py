@@ -0,0 +1,95 @@
+# backend/app/rag/profiling.py
+import os
+import time
+import random
+import hashlib
+import logging
+from pathlib import Path
+from contextlib import contextmanager
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Profiling Configuration (everything is off by default)
+DEFAULT_PROFILE_DIR = Path(__file__).resolve().parents[2] / ".profiles"
+PROFILE_DIR = os.getenv("PROFILE_DIR", str(DEFAULT_PROFILE_DIR))
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))  # fraction of requests, 0..1
+PROFILE_ALLOW_HEADER = os.getenv("PROFILE_ALLOW_HEADER", "false").lower() in ("1", "true", "yes")
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.001"))  # sampling period in seconds
+
+PROFILE_HEADER = "X-Profile"
+
+
+def should_profile(header_value: Optional[str] = None) -> bool:
+    """Profile when the client asks for it (if allowed) or when the request is sampled."""
+    if header_value and PROFILE_ALLOW_HEADER and header_value.lower() in ("1", "true", "yes"):
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def _collapsed_stacks(root) -> str:
+    """
+    Converts a pyinstrument frame tree to the collapsed-stack format
+    ("outer;inner;leaf <microseconds>") read by flamegraph.pl / speedscope.
+    """
+    lines = []
+
+    def walk(frame, path):
+        label = f"{frame.function} ({frame.file_path_short}:{frame.line_no})"
+        stack = path + [label]
+        self_time = frame.time - sum(child.time for child in frame.children)
+        if self_time > 0:
+            lines.append(f"{';'.join(stack)} {int(self_time * 1_000_000)}")
+        for child in frame.children:
+            walk(child, stack)
+
+    if root is not None:
+        walk(root, [])
+    return "\n".join(lines) + "\n"
+
+
+@contextmanager
+def request_profiler(query: str, mode: str, enabled: bool):
+    """
+    Runs the block under a wall-clock sampling profiler and writes
+    <timestamp>_<mode>_<query hash>.speedscope.json / .collapsed.txt to PROFILE_DIR.
+    Wall-clock sampling keeps the time spent waiting on torch threads and
+    on psycopg2 (network/DB) under the Python frames that called them.
+    When disabled, this does nothing and nothing is imported.
+    """
+    if not enabled:
+        yield
+        return
+
+    from pyinstrument import Profiler
+    profiler = Profiler(interval=PROFILE_INTERVAL, async_mode="disabled")
+    profiler.start()
+    try:
+        yield
+    finally:
+        profiler.stop()
+        try:
+            _write_profile(profiler, query, mode)
+        except Exception as e:
+            logger.error(f"Profile export error: {e}")
+
+
+def _write_profile(profiler, query: str, mode: str):
+    query_hash = hashlib.sha256(query.encode("utf-8")).hexdigest()[:12]
+    stem = f"{time.strftime('%Y%m%d_%H%M%S')}_{mode}_{query_hash}"
+    out_dir = Path(PROFILE_DIR)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    session = profiler.last_session
+    (out_dir / f"{stem}.collapsed.txt").write_text(_collapsed_stacks(session.root_frame()), encoding="utf-8")
+
+    try:
+        from pyinstrument.renderers import SpeedscopeRenderer
+        (out_dir / f"{stem}.speedscope.json").write_text(
+            profiler.output(renderer=SpeedscopeRenderer()), encoding="utf-8"
+        )
+    except ImportError:
+        # pyinstrument < 4.6: the collapsed stacks can still be loaded in speedscope
+        pass
+
+    logger.info(f"Profile written: {out_dir / stem}.* ({session.duration * 1000:.0f}ms)")
@@ -4,10 +4,17 @@ import time
 import math
 import re
 import logging
-from typing import List, Optional
+from typing import Dict, List, Optional
 import psycopg2
 from psycopg2 import pool
-from app.models.schemas import Source
+from app.models.schemas import SearchFilters, Source
+from app.rag.filters import filter_sql, is_empty
+from app.rag.generation_cache import GenerationCache, prompt_fingerprint, CACHE_ENABLED
+from app.rag.embedding_cache import EmbeddingCache, open_embedding_cache
+from app.rag.model_server import MODEL_SERVER_URL, ModelServerClient, RemoteEmbedder, RemoteReranker
+from app.rag import metrics
+from app.rag.metrics import stage_timer
+from app.rag.admission import Overloaded, admission
 
 # Logging Configuration
 logging.basicConfig(level=logging.INFO)
@@ -18,17 +25,39 @@ DB_HOST = os.getenv("POSTGRES_HOST", "legal-ai-db")
 DB_USER = os.getenv("POSTGRES_USER", "legal_user")
 DB_PASSWORD = os.getenv("POSTGRES_PASSWORD", "legal_pass_dev")
 DB_NAME = os.getenv("POSTGRES_DB", "legal_ai")
+DB_PORT = os.getenv("POSTGRES_PORT", "5432")
 
 DB_CONFIG = {
     "dbname": DB_NAME,
     "user": DB_USER,
     "password": DB_PASSWORD,
     "host": DB_HOST,
-    "port": "5432"
+    "port": DB_PORT
 }
 
 EMBEDDING_MODEL = "Qwen/Qwen3-Embedding-0.6B"
 RERANKING_MODEL = "BAAI/bge-reranker-base"
+LLM_MODEL = "gpt-3.5-turbo"
+LLM_TEMPERATURE = 0.3
+# Answers returned instead of a generation (evaluation scripts must not score them)
+NO_SOURCES_ANSWER = "Désolé, je n'ai trouvé aucun article juridique correspondant à votre recherche."
+GENERATION_ERROR_PREFIX = "An error occurred during response generation."
+
+# Filtered vector searches: pgvector >= 0.8 keeps scanning the HNSW graph until `limit` rows pass
+# the filter ("strict_order", "relaxed_order" or "off" to return whatever the first pass finds)
+HNSW_ITERATIVE_SCAN = os.getenv("HNSW_ITERATIVE_SCAN", "relaxed_order")
+
+
+def version_tuple(version: str) -> tuple:
+    """Extension version as a comparable tuple: "0.8.0" -> (0, 8, 0), "0.7.4-dev" -> (0, 7, 4)."""
+    parts = []
+    for part in version.split("."):
+        digits = re.match(r"\d+", part)
+        if not digits:
+            break
+        parts.append(int(digits.group(0)))
+    return tuple(parts)
+
 
 class RagEngine:
     _instance = None
@@ -36,6 +65,11 @@ class RagEngine:
     _reranker = None
     _openai = None
     _db_pool = None
+    _generation_cache = None
+    _embedding_cache = None
+    _embedding_cache_checked = False
+    _model_client = None
+    _iterative_scan_supported = False
 
     def __new__(cls):
         if cls._instance is None:
@@ -57,6 +91,28 @@ class RagEngine:
                 logger.info("PostgreSQL connection pool initialized.")
             except Exception as e:
                 logger.error(f"DB pool initialization error: {e}")
+                return
+            self._check_pgvector()
+
+    def _check_pgvector(self):
+        """hnsw.iterative_scan only exists since pgvector 0.8: checked once, skipped on older versions."""
+        conn = None
+        try:
+            conn = self._db_pool.getconn()
+            cur = conn.cursor()
+            cur.execute("SELECT extversion FROM pg_extension WHERE extname = 'vector';")
+            row = cur.fetchone()
+            cur.close()
+            version = row[0] if row else None
+            RagEngine._iterative_scan_supported = version is not None and version_tuple(version) >= (0, 8)
+            if HNSW_ITERATIVE_SCAN != "off" and not RagEngine._iterative_scan_supported:
+                logger.warning(f"pgvector {version} has no iterative index scans: filtered vector "
+                               f"searches may return fewer rows than requested.")
+        except Exception as e:
+            logger.error(f"pgvector version check error: {e}")
+        finally:
+            if conn:
+                self._db_pool.putconn(conn)
 
     @classmethod
     def get_instance(cls):
@@ -65,10 +121,9 @@ class RagEngine:
         return cls._instance
 
     def get_db_connection(self):
-        if self._db_pool:
-            return self._db_pool.getconn()
-        else:
+        if not self._db_pool:
             self._init_db_pool()
+        with metrics.DB_POOL_WAIT.time():
             return self._db_pool.getconn()
 
     def release_db_connection(self, conn):
@@ -77,8 +132,18 @@ class RagEngine:
 
     # --- LAZY LOADING MODELS ---
     
+    @property
+    def model_client(self) -> Optional[ModelServerClient]:
+        """Client of the shared model server (MODEL_SERVER_URL), None when models are loaded in-process."""
+        if self._model_client is None and MODEL_SERVER_URL:
+            self._model_client = ModelServerClient(MODEL_SERVER_URL)
+        return self._model_client
+
     @property
     def embedder(self):
+        if self._embedder is None and self.model_client is not None:
+            logger.info(f"Embedder served by the model server ({MODEL_SERVER_URL}).")
+            self._embedder = RemoteEmbedder(self.model_client)
         if self._embedder is None:
             logger.info("Loading Embedder (Qwen3-Embedding)...")
             from sentence_transformers import SentenceTransformer
@@ -87,12 +152,33 @@ class RagEngine:
 
     @property
     def reranker(self):
+        if self._reranker is None and self.model_client is not None:
+            logger.info(f"Reranker served by the model server ({MODEL_SERVER_URL}).")
+            self._reranker = RemoteReranker(self.model_client)
         if self._reranker is None:
             logger.info("Loading Reranker (BGE-Reranker)...")
             from sentence_transformers import CrossEncoder
             self._reranker = CrossEncoder(RERANKING_MODEL)
         return self._reranker
 
+    @property
+    def generation_cache(self) -> Optional[GenerationCache]:
+        if self._generation_cache is None and CACHE_ENABLED:
+            try:
+                self._generation_cache = GenerationCache()
+                metrics.register_generation_cache(self._generation_cache)
+                logger.info(f"Generation cache ready ({self._generation_cache.path}).")
+            except Exception as e:
+                logger.error(f"Generation cache initialization error: {e}")
+        return self._generation_cache
+
+    @property
+    def embedding_cache(self) -> Optional[EmbeddingCache]:
+        if not self._embedding_cache_checked:
+            self._embedding_cache_checked = True
+            self._embedding_cache = open_embedding_cache(EMBEDDING_MODEL)
+        return self._embedding_cache
+
     @property
     def openai_client(self):
         if self._openai is None:
@@ -118,25 +204,45 @@ class RagEngine:
 
     # --- SEARCH METHODS ---
 
-    def _vector_search(self, query_vector, limit=10) -> List[Source]:
+    def _vector_search(self, query_vector, limit=10, ef_search: Optional[int] = None,
+                       codes: Optional[List[str]] = None, filters: Optional[SearchFilters] = None) -> List[Source]:
         """Pure semantic search (PGVector)"""
         results = []
         conn = None
         try:
             conn = self.get_db_connection()
             cur = conn.cursor()
-            sql = """
-                SELECT article_number, content, metadata, 1 - (embedding <=> %s::vector) as score
-                FROM legal_articles
-                WHERE embedding IS NOT NULL
-                ORDER BY embedding <=> %s::vector
-                LIMIT %s;
+            if ef_search:
+                # HNSW returns at most ef_search rows (default 40); raised for deep retrievals.
+                # SET LOCAL only lasts for this transaction, the pool rolls it back on release.
+                cur.execute("SET LOCAL hnsw.ef_search = %s;", (int(ef_search),))
+            # The code filter is a literal list: the planner prunes to those partitions (one HNSW each)
+            where, where_params = filter_sql(codes, filters)
+            if (filters is not None and not is_empty(None, filters) and HNSW_ITERATIVE_SCAN != "off"
+                    and self._iterative_scan_supported):
+                # Metadata filters are applied while walking the graph: without iterative scans a
+                # selective filter leaves fewer than `limit` of the ef_search candidates.
+                cur.execute("SELECT set_config('hnsw.iterative_scan', %s, true);", (HNSW_ITERATIVE_SCAN,))
+            # relaxed_order can return rows slightly out of order: re-sorted outside the index scan
+            sql = f"""
+                WITH nearest AS MATERIALIZED (
+                    SELECT article_number, content, metadata, embedding <=> %s::vector as distance, code_source
+                    FROM legal_articles
+                    WHERE embedding IS NOT NULL {where}
+                    ORDER BY distance
+                    LIMIT %s
+                )
+                SELECT article_number, content, metadata, 1 - distance as score, code_source
+                FROM nearest
+                ORDER BY distance;
             """
-            cur.execute(sql, (query_vector, query_vector, limit))
+            params = (query_vector, *where_params, limit)
+            cur.execute(sql, params)
             for row in cur.fetchall():
                 meta = row[2] if row[2] is not None else {}
                 score_val = float(row[3]) if row[3] is not None else 0.0
-                results.append(Source(article_number=row[0], content=row[1], metadata=meta, score=score_val))
+                results.append(Source(article_number=row[0], content=row[1], metadata=meta, score=score_val,
+                                      code_source=row[4]))
             cur.close()
         except Exception as e:
             logger.error(f"Vector Search Error: {e}")
@@ -144,7 +250,8 @@ class RagEngine:
             self.release_db_connection(conn)
         return results
 
-    def _keyword_search(self, query_text, limit=10) -> List[Source]:
+    def _keyword_search(self, query_text, limit=10, codes: Optional[List[str]] = None,
+                        filters: Optional[SearchFilters] = None) -> List[Source]:
         """Keyword search (Postgres TSVector + Article Number)"""
         results = []
         conn = None
@@ -161,18 +268,20 @@ class RagEngine:
                 search_query = "websearch_to_tsquery"
                 sql_param = query_text
 
+            where, where_params = filter_sql(codes, filters)
             sql = f"""
                 SELECT article_number, content, metadata, 
-                       ts_rank_cd(content_search, {search_query}('french', %s)) as score
+                       ts_rank_cd(content_search, {search_query}('french', %s)) as score, code_source
                 FROM legal_articles
-                WHERE content_search @@ {search_query}('french', %s)
-                   OR article_number ILIKE %s
+                WHERE (content_search @@ {search_query}('french', %s)
+                   OR article_number ILIKE %s) {where}
                 ORDER BY score DESC
                 LIMIT %s;
             """
             
             like_query = f"%{extracted_id if extracted_id else query_text.strip()}%"
-            cur.execute(sql, (sql_param, sql_param, like_query, limit))
+            params = (sql_param, sql_param, like_query, *where_params, limit)
+            cur.execute(sql, params)
             
             for row in cur.fetchall():
                 meta = row[2] if row[2] is not None else {}
@@ -183,7 +292,7 @@ class RagEngine:
                      raw_score += 50.0 
 
                 results.append(Source(
-                    article_number=row[0], content=row[1], metadata=meta, score=raw_score
+                    article_number=row[0], content=row[1], metadata=meta, score=raw_score, code_source=row[4]
                 ))
             cur.close()
         except Exception as e:
@@ -216,47 +325,118 @@ class RagEngine:
         
         return ranked_sources[:top_k]
 
+    def _fuse(self, vector_docs: List[Source], keyword_docs: List[Source]) -> List[Source]:
+        """Merges both candidate lists, one entry per article (keyword hits win ties)."""
+        # Article numbers repeat across codes (e.g. L111-1): the code is part of the key
+        all_docs_map = {(doc.code_source, doc.article_number): doc for doc in vector_docs + keyword_docs}
+        return list(all_docs_map.values())
+
     # --- MAIN ENTRY POINT ---
 
-    def retrieve(self, query: str, mode: str = "advanced") -> List[Source]:
+    def retrieve_deep(self, query: str, depth: int = 100, query_vector: Optional[List[float]] = None,
+                      timings: Optional[Dict[str, float]] = None,
+                      codes: Optional[List[str]] = None,
+                      filters: Optional[SearchFilters] = None) -> Dict[str, List[str]]:
+        """
+        Offline evaluation helper (no generation): returns the deep candidate lists
+        (article numbers) "vector", "keyword" and "reranked" (every fused candidate, reranked).
+        """
+        mode = "deep"
+        if query_vector is None:
+            with stage_timer("embedding", mode, timings):
+                query_vector = self.embedder.encode(query).tolist()
+        with stage_timer("vector_search", mode, timings):
+            vector_docs = self._vector_search(query_vector, limit=depth, ef_search=max(depth, 40), codes=codes,
+                                              filters=filters)
+        with stage_timer("keyword_search", mode, timings):
+            keyword_docs = self._keyword_search(query, limit=depth, codes=codes, filters=filters)
+        with stage_timer("fusion", mode, timings):
+            unique_docs = self._fuse(vector_docs, keyword_docs)
+        vector_ranking = [d.article_number for d in vector_docs]
+        keyword_ranking = [d.article_number for d in keyword_docs]
+        with stage_timer("rerank", mode, timings):
+            reranked = self._rerank(query, unique_docs, top_k=len(unique_docs))
+        return {
+            "vector": vector_ranking,
+            "keyword": keyword_ranking,
+            "reranked": [d.article_number for d in reranked],
+        }
+
+    def embed_queries(self, queries: List[str], batch_size: int = 32) -> List[List[float]]:
+        """
+        Batch-encodes queries (e.g. a whole evaluation set) for reuse across modes.
+        Queries already in the embedding cache are not sent to the model.
+        """
+        def encode(texts):
+            return self.embedder.encode(texts, batch_size=batch_size)
+
+        cache = self.embedding_cache
+        vectors = cache.encode(queries, encode) if cache else encode(queries)
+        return [v.tolist() for v in vectors]
+
+    def retrieve(self, query: str, mode: str = "advanced", timings: Optional[Dict[str, float]] = None,
+                 query_vector: Optional[List[float]] = None, codes: Optional[List[str]] = None,
+                 filters: Optional[SearchFilters] = None) -> List[Source]:
+        """
+        Runs the retrieval pipeline for `mode`.
+        If a `timings` dict is given, per-stage durations (ms) are added to it.
+        A precomputed `query_vector` (see embed_queries) skips the embedding step.
+        `codes` restricts both searches to these code_source values (their partitions only),
+        `filters` to a theme / article type / book or number range (applied inside the SQL searches).
+        """
         logger.info(f"🔎 Search mode: {mode.upper()}")
         
         try:
             # 1. Vector Search
-            query_vector = self.embedder.encode(query).tolist()
+            if query_vector is None:
+                with admission.stage("embedding"), stage_timer("embedding", mode, timings):
+                    query_vector = self.embedder.encode(query).tolist()
             
             if mode == "naive":
-                return self._vector_search(query_vector, limit=3)
+                with admission.stage("db"), stage_timer("vector_search", mode, timings):
+                    docs = self._vector_search(query_vector, limit=3, codes=codes, filters=filters)
+                metrics.CANDIDATES.labels(step="vector", mode=mode).inc(len(docs))
+                return docs
             
             elif mode == "advanced":
                 # 1. Hybrid Retrieval
-                vector_docs = self._vector_search(query_vector, limit=25)
-                keyword_docs = self._keyword_search(query, limit=25)
+                with admission.stage("db"), stage_timer("vector_search", mode, timings):
+                    vector_docs = self._vector_search(query_vector, limit=25, codes=codes, filters=filters)
+                with admission.stage("db"), stage_timer("keyword_search", mode, timings):
+                    keyword_docs = self._keyword_search(query, limit=25, codes=codes, filters=filters)
+                metrics.CANDIDATES.labels(step="vector", mode=mode).inc(len(vector_docs))
+                metrics.CANDIDATES.labels(step="keyword", mode=mode).inc(len(keyword_docs))
                 
                 logger.info(f"Vector docs ({len(vector_docs)}): {[f'{d.article_number}({d.score:.2f})' for d in vector_docs[:10]]}...")
                 logger.info(f"Keyword docs ({len(keyword_docs)}): {[f'{d.article_number}({d.score:.2f})' for d in keyword_docs[:10]]}...")
                 
                 # 2. Deduplication
-                all_docs_map = {doc.article_number: doc for doc in vector_docs + keyword_docs}
-                unique_docs = list(all_docs_map.values())
+                with stage_timer("fusion", mode, timings):
+                    unique_docs = self._fuse(vector_docs, keyword_docs)
+                metrics.CANDIDATES.labels(step="fused", mode=mode).inc(len(unique_docs))
                 
                 logger.info(f"After fusion: {len(unique_docs)} uniques")
                 
                 # 3. Reranking
-                final_docs = self._rerank(query, unique_docs, top_k=5)
+                with admission.stage("rerank"), stage_timer("rerank", mode, timings):
+                    final_docs = self._rerank(query, unique_docs, top_k=5)
+                metrics.CANDIDATES.labels(step="reranked", mode=mode).inc(len(unique_docs))
                 if final_docs:
                      logger.info(f"Top result: {final_docs[0].article_number} (score: {final_docs[0].score:.2%})")
                 return final_docs
                 
+        except Overloaded:
+            raise  # shed by admission control: answered with 503, not with an empty result
         except Exception as e:
             logger.error(f"Global retrieve error: {e}")
             return []
 
         return []
 
-    def generate(self, query: str, sources: List[Source]) -> str:
+    def generate(self, query: str, sources: List[Source], mode: str = "advanced",
+                 timings: Optional[Dict[str, float]] = None) -> str:
         if not sources:
-            return "Désolé, je n'ai trouvé aucun article juridique correspondant à votre recherche."
+            return NO_SOURCES_ANSWER
 
         context_text = "\n\n".join([f"--- ARTICLE {s.article_number} ---\n{s.content}" for s in sources])
         article_numbers = [s.article_number for s in sources]
@@ -274,15 +454,37 @@ class RagEngine:
             
 
         user_message = f"ARTICLES JURIDIQUES DISPONIBLES:\n{context_text}\n\nQUESTION DE L'UTILISATEUR:\n{query}"
-        
+
+        # Exact-match cache: same model, settings, prompt, sources (in order) and query -> same answer
+        cache = self.generation_cache
+        cache_key = prompt_fingerprint(LLM_MODEL, LLM_TEMPERATURE, system_prompt, [s.content for s in sources], query)
+        if cache:
+            with stage_timer("cache_lookup", mode, timings):
+                cached_answer = cache.get(cache_key)
+            if cached_answer is not None:
+                logger.info(f"Generation cache hit ({cache_key[:12]})")
+                metrics.GENERATION_CACHE_LOOKUPS.labels(result="hit").inc()
+                metrics.GENERATION_CACHE_BYTES_SAVED.inc(len(cached_answer.encode("utf-8")))
+                return cached_answer
+            metrics.GENERATION_CACHE_LOOKUPS.labels(result="miss").inc()
+
         try:
             logger.info(f"Generating response with {len(sources)} sources: {article_numbers}")
-            response = self.openai_client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[{"role": "system", "content": system_prompt}, {"role": "user", "content": user_message}],
-                temperature=0.3  
-            )
-            return response.choices[0].message.content
+            with admission.stage("llm"), stage_timer("generation", mode, timings):
+                response = self.openai_client.chat.completions.create(
+                    model=LLM_MODEL,
+                    messages=[{"role": "system", "content": system_prompt}, {"role": "user", "content": user_message}],
+                    temperature=LLM_TEMPERATURE
+                )
+            if response.usage:
+                metrics.LLM_TOKENS.labels(kind="prompt").inc(response.usage.prompt_tokens)
+                metrics.LLM_TOKENS.labels(kind="completion").inc(response.usage.completion_tokens)
+            answer = response.choices[0].message.content
+            if cache and answer:
+                cache.put(cache_key, LLM_MODEL, answer, [(s.code_source, s.article_number) for s in sources])
+            return answer
+        except Overloaded:
+            raise
         except Exception as e:
             logger.error(f"AI Generation Error: {e}")
-            return f"An error occurred during response generation. ({e})"
\ No newline at end of file
+            return f"{GENERATION_ERROR_PREFIX} ({e})"
\ No newline at end of file
@@ -0,0 +1,67 @@
+import os
+import time
+import numpy as np
+
+# --- CONFIGURATION ---
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "16"))
+# Padded tokens per batch (batch size x longest text): bounds activation memory on CPU
+EMBED_MAX_BATCH_TOKENS = int(os.getenv("EMBED_MAX_BATCH_TOKENS", "16384"))
+# Longer texts are truncated (Qwen3-Embedding accepts 32k tokens, far beyond any legal article)
+EMBED_MAX_SEQ_LENGTH = int(os.getenv("EMBED_MAX_SEQ_LENGTH", "8192"))
+
+
+def token_lengths(model, texts):
+    """Exact token count of each text (fast tokenizer, no model inference)."""
+    encoded = model.tokenizer(list(texts), add_special_tokens=True, truncation=False)["input_ids"]
+    return [min(len(ids), model.max_seq_length) for ids in encoded]
+
+
+def length_buckets(lengths, batch_size=EMBED_BATCH_SIZE, max_batch_tokens=EMBED_MAX_BATCH_TOKENS):
+    """
+    Groups indices of similar length (longest first) so padding is minimal.
+    A batch closes when it reaches batch_size or when its padded size would exceed max_batch_tokens:
+    very long articles end up alone in their batch.
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True)
+    batches, current, longest = [], [], 0
+    for i in order:
+        new_longest = max(longest, lengths[i])
+        if current and (len(current) >= batch_size or new_longest * (len(current) + 1) > max_batch_tokens):
+            batches.append(current)
+            current, new_longest = [], lengths[i]
+        current.append(i)
+        longest = new_longest
+    if current:
+        batches.append(current)
+    return batches
+
+
+def embed_texts(model, texts, batch_size=EMBED_BATCH_SIZE, max_batch_tokens=EMBED_MAX_BATCH_TOKENS,
+                max_seq_length=EMBED_MAX_SEQ_LENGTH, label="articles"):
+    """
+    Encodes `texts` in length-bucketed batches and prints progress/throughput.
+    Returns a float32 array (len(texts), dim) in the input order.
+    """
+    texts = list(texts)
+    if not texts:
+        return np.zeros((0, model.get_sentence_embedding_dimension()), dtype=np.float32)
+
+    model.max_seq_length = min(model.max_seq_length or max_seq_length, max_seq_length)
+    lengths = token_lengths(model, texts)
+    batches = length_buckets(lengths, batch_size, max_batch_tokens)
+
+    vectors = np.zeros((len(texts), model.get_sentence_embedding_dimension()), dtype=np.float32)
+    done, done_tokens = 0, 0
+    start = time.time()
+    for b, batch in enumerate(batches, 1):
+        vectors[batch] = model.encode([texts[i] for i in batch], batch_size=len(batch), convert_to_numpy=True)
+        done += len(batch)
+        done_tokens += sum(lengths[i] for i in batch)
+        elapsed = time.time() - start
+        print(f"   🧠 {done}/{len(texts)} {label} | {done / elapsed:.1f} {label}/s | "
+              f"{done_tokens / elapsed:.0f} tokens/s", end="\r")
+
+    elapsed = time.time() - start
+    print(f"\n   ✅ {len(texts)} {label} embedded in {elapsed:.1f}s "
+          f"({len(texts) / elapsed:.1f} {label}/s, {done_tokens / elapsed:.0f} tokens/s, {len(batches)} batches)")
+    return vectors
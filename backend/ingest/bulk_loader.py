@@ -0,0 +1,163 @@
+import io
+import json
+import time
+import struct
+import hashlib
+import numpy as np
+from pathlib import Path
+
+INIT_SQL = Path(__file__).resolve().parent.parent / "scripts" / "init.sql"
+STAGING_TABLE = "legal_articles_staging"
+
+# Binary COPY framing (https://www.postgresql.org/docs/current/sql-copy.html#id-1.9.3.55.9.4)
+COPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+COPY_TRAILER = struct.pack(">h", -1)
+NULL_FIELD = struct.pack(">i", -1)
+STAGING_COLUMNS = ("ord", "code_source", "article_number", "content", "metadata", "embedding",
+                   "content_hash", "embedding_model")
+
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def _field(data: bytes) -> bytes:
+    return struct.pack(">i", len(data)) + data
+
+
+def _encode_text(value: str) -> bytes:
+    return _field(value.encode("utf-8"))
+
+
+def _encode_jsonb(value) -> bytes:
+    if not isinstance(value, str):
+        value = json.dumps(value or {}, ensure_ascii=False)
+    return _field(b"\x01" + value.encode("utf-8"))  # jsonb binary format: version 1 + text
+
+
+def _encode_vector(value) -> bytes:
+    # pgvector binary format: int16 dim, int16 unused, float4[dim] (big-endian)
+    if value is None:
+        return NULL_FIELD
+    arr = np.asarray(value, dtype=">f4")
+    return _field(struct.pack(">hh", arr.shape[0], 0) + arr.tobytes())
+
+
+def encode_row(ord_: int, code_source: str, article_number: str, content: str, metadata, embedding,
+               embedding_model: str = None) -> bytes:
+    return (
+        struct.pack(">h", len(STAGING_COLUMNS))
+        + _field(struct.pack(">i", ord_))
+        + _encode_text(code_source)
+        + _encode_text(article_number)
+        + _encode_text(content)
+        + _encode_jsonb(metadata)
+        + _encode_vector(embedding)
+        + _encode_text(content_hash(content))
+        + (_encode_text(embedding_model) if embedding_model else NULL_FIELD)
+    )
+
+
+class CopyStream(io.RawIOBase):
+    """File-like object streaming binary COPY data from a row iterator (no full copy in memory)."""
+
+    def __init__(self, rows, embedding_model=None):
+        self.embedding_model = embedding_model
+        self.chunks = self._generate(rows)
+        self.buffer = b""
+        self.count = 0
+
+    def _generate(self, rows):
+        yield COPY_HEADER
+        for row in rows:
+            yield encode_row(self.count, *row, embedding_model=self.embedding_model)
+            self.count += 1
+        yield COPY_TRAILER
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                break
+            self.buffer += chunk
+        if size < 0:
+            data, self.buffer = self.buffer, b""
+        else:
+            data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+
+def ensure_schema(conn, code_source: str = None, commit: bool = True):
+    """
+    Applies scripts/init.sql (idempotent): table, unique key, indexes and the tsvectorupdate trigger
+    that the bulk loader relies on to fill content_search.
+    With a code_source, also creates its partition (with its own HNSW/GIN indexes) if missing.
+    With commit=False, it stays part of the caller's transaction.
+    """
+    cur = conn.cursor()
+    cur.execute(INIT_SQL.read_text(encoding="utf-8"))
+    if code_source:
+        cur.execute("SELECT legal_articles_ensure_partition(%s);", (code_source,))
+    cur.close()
+    if commit:
+        conn.commit()
+
+
+def bulk_load(conn, rows, embedding_model: str = None) -> int:
+    """
+    Loads rows (code_source, article_number, content, metadata, embedding) into legal_articles:
+    1. binary COPY into a temporary staging table,
+    2. one INSERT ... SELECT ... ON CONFLICT upsert into legal_articles.
+    content_search is left to the tsvectorupdate trigger (computed once per row);
+    content_hash is computed here and embedding_model recorded for incremental runs.
+    When an article appears several times in `rows`, the last occurrence wins.
+    The caller commits.
+    """
+    cur = conn.cursor()
+    start = time.time()
+
+    cur.execute(f"""
+        CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE} (
+            ord integer,
+            code_source text,
+            article_number text,
+            content text,
+            metadata jsonb,
+            embedding vector,
+            content_hash text,
+            embedding_model text
+        ) ON COMMIT DROP;
+    """)
+    stream = CopyStream(rows, embedding_model)
+    cur.copy_expert(
+        f"COPY {STAGING_TABLE} ({', '.join(STAGING_COLUMNS)}) FROM STDIN WITH (FORMAT binary)",
+        stream,
+        size=1 << 20
+    )
+    copied = stream.count
+    copy_time = time.time() - start
+
+    cur.execute(f"""
+        INSERT INTO legal_articles (code_source, article_number, content, metadata, embedding,
+                                    content_hash, embedding_model)
+        SELECT DISTINCT ON (code_source, article_number)
+               code_source, article_number, content, metadata, embedding, content_hash, embedding_model
+        FROM {STAGING_TABLE}
+        ORDER BY code_source, article_number, ord DESC
+        ON CONFLICT (code_source, article_number) DO UPDATE SET
+            content = EXCLUDED.content,
+            metadata = EXCLUDED.metadata,
+            embedding = EXCLUDED.embedding,
+            content_hash = EXCLUDED.content_hash,
+            embedding_model = EXCLUDED.embedding_model;
+    """)
+    merged = cur.rowcount
+    cur.execute(f"TRUNCATE {STAGING_TABLE};")
+    cur.close()
+
+    print(f"   📦 {copied} rows copied in {copy_time:.2f}s, {merged} merged into legal_articles "
+          f"({time.time() - start:.2f}s total)")
+    return merged
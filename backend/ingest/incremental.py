@@ -0,0 +1,131 @@
+import hashlib
+from bulk_loader import content_hash
+
+
+def model_fingerprint(model_name: str, instruction_prefix: str = "") -> str:
+    """Identifies how a vector was produced: same model + same instruction -> comparable vectors."""
+    if not instruction_prefix:
+        return model_name
+    return f"{model_name}#{hashlib.sha256(instruction_prefix.encode('utf-8')).hexdigest()[:12]}"
+
+
+class ChangePlan:
+    """Diff between the parsed source and what legal_articles holds for one code_source."""
+
+    def __init__(self, code_source, new, changed, unchanged, deleted, to_embed=None):
+        self.code_source = code_source
+        self.new = new                    # [article_number]
+        self.changed = changed            # [article_number]
+        self.unchanged = unchanged        # [article_number]
+        self.deleted = deleted            # [article_number]
+        self.to_embed = to_embed or []    # [(article_number, content)] new + changed (batch mode only)
+
+    def print_summary(self):
+        print(f"📋 {self.code_source}: +{len(self.new)} new, ~{len(self.changed)} changed, "
+              f"-{len(self.deleted)} deleted, ={len(self.unchanged)} unchanged")
+        for label, items in (("changed", self.changed), ("deleted", self.deleted)):
+            if items:
+                preview = ", ".join(items[:10]) + (" ..." if len(items) > 10 else "")
+                print(f"   {label}: {preview}")
+
+
+class ChangeTracker:
+    """
+    Streaming change detection: filter() yields only the articles that must be (re-)embedded,
+    keeping just article numbers and hashes in memory. An article is re-embedded when its text
+    changed or when it was embedded by another model/instruction.
+    When the source repeats an article, the last occurrence is the one stored (as in the loader):
+    once an occurrence has been yielded, every later occurrence with another text is yielded too,
+    and the status compares the last occurrence with what the table held before the run.
+    """
+
+    def __init__(self, conn, code_source: str, fingerprint: str):
+        self.code_source = code_source
+        self.fingerprint = fingerprint
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT article_number, content_hash, embedding_model FROM legal_articles WHERE code_source = %s;",
+            (code_source,)
+        )
+        self.stored = {row[0]: (row[1], row[2]) for row in cur.fetchall()}
+        cur.close()
+        self.last = {}      # article_number -> content_hash of its last occurrence in the source
+        self.written = {}   # article_number -> (content_hash, fingerprint) of its last yielded occurrence
+
+    @property
+    def status(self):
+        """article_number -> "new" | "changed" | "unchanged", from the last occurrence of each article."""
+        status = {}
+        for article_number, digest in self.last.items():
+            stored = self.stored.get(article_number)
+            if stored is None:
+                status[article_number] = "new"
+            elif stored != (digest, self.fingerprint):
+                status[article_number] = "changed"
+            else:
+                status[article_number] = "unchanged"
+        return status
+
+    def filter(self, articles):
+        """Articles are (article_number, content, ...) tuples, yielded unchanged."""
+        for article in articles:
+            article_number, content = article[0], article[1]
+            key = (content_hash(content), self.fingerprint)
+            self.last[article_number] = key[0]
+            # What the table will hold for this article if nothing else is yielded
+            current = self.written.get(article_number, self.stored.get(article_number))
+            if current != key:
+                self.written[article_number] = key
+                yield article
+
+    def plan(self, to_embed=None) -> ChangePlan:
+        by_status = {"new": [], "changed": [], "unchanged": []}
+        for article_number, status in self.status.items():
+            by_status[status].append(article_number)
+        deleted = [a for a in self.stored if a not in self.last]
+        return ChangePlan(self.code_source, by_status["new"], by_status["changed"], by_status["unchanged"],
+                          deleted, to_embed)
+
+
+def plan_changes(conn, code_source: str, articles, fingerprint: str) -> ChangePlan:
+    """Batch version of ChangeTracker: when the source repeats an article, the last one wins (like the loader)."""
+    latest = {}
+    for article_number, content in articles:
+        latest[article_number] = content
+    tracker = ChangeTracker(conn, code_source, fingerprint)
+    to_embed = list(tracker.filter(latest.items()))
+    return tracker.plan(to_embed)
+
+
+def check_embedding_model(conn, code_source: str, fingerprint: str):
+    """
+    Refuses to load vectors next to vectors from another model or instruction prefix
+    (same table, same HNSW index, meaningless distances). Rows of `code_source` itself
+    are fine: the ChangeTracker re-embeds them.
+    """
+    cur = conn.cursor()
+    cur.execute(
+        "SELECT embedding_model, array_agg(DISTINCT code_source), count(*) FROM legal_articles "
+        "WHERE code_source <> %s AND embedding_model IS DISTINCT FROM %s GROUP BY embedding_model;",
+        (code_source, fingerprint)
+    )
+    mismatches = cur.fetchall()
+    cur.close()
+    if mismatches:
+        details = "; ".join(f"{count} rows of {', '.join(codes)} embedded with {model or 'an unknown model'}"
+                            for model, codes, count in mismatches)
+        raise ValueError(f"legal_articles holds vectors from another embedding setup ({details}). "
+                         f"Re-ingest those codes with {fingerprint} first.")
+
+
+def delete_articles(conn, code_source: str, article_numbers) -> int:
+    if not article_numbers:
+        return 0
+    cur = conn.cursor()
+    cur.execute(
+        "DELETE FROM legal_articles WHERE code_source = %s AND article_number = ANY(%s);",
+        (code_source, list(article_numbers))
+    )
+    deleted = cur.rowcount
+    cur.close()
+    return deleted
@@ -0,0 +1,146 @@
+import os
+import time
+import argparse
+from contextlib import contextmanager
+
+# --- CONFIGURATION ---
+CPU_COUNT = os.cpu_count() or 2
+HNSW_M = int(os.getenv("HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "64"))
+# The HNSW build is much faster when the whole graph fits in maintenance_work_mem
+INDEX_MAINTENANCE_WORK_MEM = os.getenv("INDEX_MAINTENANCE_WORK_MEM", "1GB")
+INDEX_PARALLEL_WORKERS = int(os.getenv("INDEX_PARALLEL_WORKERS", str(min(7, max(0, CPU_COUNT - 1)))))
+# Drop the search indexes during ingestion and rebuild them once at the end
+INGEST_BULK_MODE = os.getenv("INGEST_BULK_MODE", "0") == "1"
+
+HNSW_INDEX = "legal_articles_embedding_idx"
+FTS_INDEX = "legal_articles_fts_idx"
+
+
+def index_definitions(m=HNSW_M, ef_construction=HNSW_EF_CONSTRUCTION):
+    """Same indexes as scripts/init.sql, with tunable HNSW parameters."""
+    return {
+        HNSW_INDEX: f"""
+            CREATE INDEX IF NOT EXISTS {HNSW_INDEX} ON legal_articles
+            USING hnsw (embedding vector_cosine_ops) WITH (m = {int(m)}, ef_construction = {int(ef_construction)});
+        """,
+        FTS_INDEX: f"CREATE INDEX IF NOT EXISTS {FTS_INDEX} ON legal_articles USING GIN (content_search);",
+    }
+
+
+def drop_search_indexes(conn):
+    """Drops the HNSW and GIN indexes so rows are loaded without maintaining them. Commits."""
+    cur = conn.cursor()
+    for name in index_definitions():
+        cur.execute(f"DROP INDEX IF EXISTS {name};")
+    cur.close()
+    conn.commit()
+    print(f"   🗑️ Search indexes dropped ({', '.join(index_definitions())})")
+
+
+def build_search_indexes(conn, m=HNSW_M, ef_construction=HNSW_EF_CONSTRUCTION,
+                         maintenance_work_mem=INDEX_MAINTENANCE_WORK_MEM,
+                         parallel_workers=INDEX_PARALLEL_WORKERS) -> dict:
+    """
+    (Re)creates the search indexes in one pass over the loaded table (one index per partition
+    when it is partitioned), with a larger maintenance_work_mem and parallel maintenance workers
+    (pgvector >= 0.6 builds HNSW in parallel).
+    Returns {index_name: {"build_s", "size_bytes", "size"}}. Commits.
+    """
+    cur = conn.cursor()
+    cur.execute("ANALYZE legal_articles;")
+    cur.execute("SELECT count(*) FROM legal_articles;")
+    rows = cur.fetchone()[0]
+    cur.execute("SET LOCAL maintenance_work_mem = %s;", (maintenance_work_mem,))
+    cur.execute("SET LOCAL max_parallel_maintenance_workers = %s;", (int(parallel_workers),))
+    print(f"   🏗️ Building indexes on {rows} rows (m={m}, ef_construction={ef_construction}, "
+          f"maintenance_work_mem={maintenance_work_mem}, {parallel_workers} parallel workers)")
+
+    report = {}
+    notices = len(conn.notices)
+    for name, ddl in index_definitions(m, ef_construction).items():
+        start = time.time()
+        cur.execute(ddl)
+        build_s = time.time() - start
+        size_bytes, size = index_size(cur, name)
+        report[name] = {"build_s": build_s, "size_bytes": size_bytes, "size": size}
+        print(f"   ✅ {name}: {build_s:.2f}s, {size}")
+    cur.close()
+    conn.commit()
+
+    # e.g. pgvector's "hnsw graph no longer fits into maintenance_work_mem"
+    for notice in conn.notices[notices:]:
+        print(f"   ⚠️ {notice.strip()}")
+    return report
+
+
+@contextmanager
+def deferred_indexes(conn, enabled=INGEST_BULK_MODE, **build_options):
+    """
+    Bulk-load mode: the indexes are dropped on entry and rebuilt on exit, even after a failure,
+    so the table is never left without them. Searches fall back to sequential scans meanwhile.
+    On success the caller's pending work is committed before the build; on failure it is rolled back.
+    If the process dies in between, ensure_schema() recreates them with the init.sql parameters.
+    """
+    if not enabled:
+        yield None
+        return
+    drop_search_indexes(conn)
+    report = {}
+    try:
+        yield report
+    except BaseException:
+        conn.rollback()
+        raise
+    else:
+        conn.commit()
+    finally:
+        report.update(build_search_indexes(conn, **build_options))
+
+
+def index_size(cur, name):
+    """(bytes, pretty) of an index; for a partitioned index, the sum of its per-partition indexes."""
+    cur.execute("""
+        SELECT COALESCE(sum(pg_relation_size(relid)), 0), pg_size_pretty(COALESCE(sum(pg_relation_size(relid)), 0))
+        FROM pg_partition_tree(%s::regclass);
+    """, (name,))
+    return cur.fetchone()
+
+
+def index_status(conn) -> list:
+    """Indexes of legal_articles and of each of its partitions."""
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT indexname, pg_size_pretty(pg_relation_size(indexname::regclass)), indexdef
+        FROM pg_indexes
+        WHERE tablename IN (SELECT relid::regclass::text FROM pg_partition_tree('legal_articles'))
+        ORDER BY tablename, indexname;
+    """)
+    rows = cur.fetchall()
+    cur.close()
+    return rows
+
+
+if __name__ == "__main__":
+    import psycopg2
+
+    parser = argparse.ArgumentParser(description="Inspect or rebuild the legal_articles search indexes")
+    parser.add_argument("command", choices=["status", "rebuild"])
+    parser.add_argument("--m", type=int, default=HNSW_M)
+    parser.add_argument("--ef-construction", type=int, default=HNSW_EF_CONSTRUCTION)
+    parser.add_argument("--maintenance-work-mem", default=INDEX_MAINTENANCE_WORK_MEM)
+    parser.add_argument("--workers", type=int, default=INDEX_PARALLEL_WORKERS,
+                        help="max_parallel_maintenance_workers for the build")
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(
+        dbname="legal_ai", user="legal_user", password="legal_pass_dev",
+        host=os.getenv("POSTGRES_HOST", "localhost"), port=os.getenv("POSTGRES_PORT", "5432")
+    )
+    if args.command == "rebuild":
+        # Parameter experiments: drop and rebuild without reloading any data
+        drop_search_indexes(conn)
+        build_search_indexes(conn, args.m, args.ef_construction, args.maintenance_work_mem, args.workers)
+    for name, size, definition in index_status(conn):
+        print(f"{name:35} {size:>10}  {definition}")
+    conn.close()
@@ -0,0 +1,158 @@
+"""
+Single ingestion entry point: any source (TXT, PDF, JSON sample) goes through the same
+change detection, embedding cache, embedding workers and bulk loader, with one embedding setup.
+
+    python backend/ingest/ingest.py backend/data/code_consommation2.txt
+    python backend/ingest/ingest.py backend/data/code_consommation.pdf --dry-run
+    python backend/ingest/ingest.py backend/data/code_consommation_sample.json --limit 2
+"""
+import os
+import sys
+import time
+import argparse
+import itertools
+from pathlib import Path
+import psycopg2
+
+# Makes the backend "app" package importable when the script is run directly
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from app.rag.generation_cache import purge_cached_generations
+from app.rag.embedding_cache import open_embedding_cache
+from bulk_loader import ensure_schema
+from incremental import model_fingerprint, ChangeTracker, check_embedding_model, delete_articles
+from indexes import deferred_indexes, INGEST_BULK_MODE
+from pipeline import IngestPipeline, INGEST_WORKERS, INGEST_WRITE_BATCH
+from batch_embedding import EMBED_BATCH_SIZE
+from pdf_extract import print_page_timings
+from sources import open_source, SOURCES
+
+# --- CONFIGURATION ---
+# Same database settings and embedding model as the API (app/rag/rag_engine.py)
+DB_CONFIG = {
+    "dbname": os.getenv("POSTGRES_DB", "legal_ai"),
+    "user": os.getenv("POSTGRES_USER", "legal_user"),
+    "password": os.getenv("POSTGRES_PASSWORD", "legal_pass_dev"),
+    "host": os.getenv("POSTGRES_HOST", "localhost"),
+    "port": os.getenv("POSTGRES_PORT", "5432"),
+}
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "Qwen/Qwen3-Embedding-0.6B")
+# Documents are embedded as-is: the API embeds queries without instruction either
+INSTRUCTION_PREFIX = os.getenv("EMBEDDING_INSTRUCTION_PREFIX", "")
+
+
+def print_phases(phases):
+    """phases: [(name, articles or None, seconds)]"""
+    print("\n⏱️ Phases:")
+    for name, count, seconds in phases:
+        line = f"   {name:<8} {seconds:8.2f}s"
+        if count is not None:
+            line += f"  {count:>7} articles"
+            if seconds > 0:
+                line += f"  {count / seconds:>8.1f} articles/s"
+        print(line)
+
+
+def dry_run(source, tracker, limit):
+    """Parses the source and reports what would change, without loading any model or writing."""
+    start = time.time()
+    parsed = 0
+    for article in itertools.islice(source, limit) if limit else source:
+        parsed += 1
+        if tracker is not None:
+            for _ in tracker.filter((article,)):
+                pass
+    if tracker is not None:
+        tracker.plan().print_summary()
+        if limit:
+            print("   (--limit: articles beyond the limit are reported as deleted)")
+    return parsed, time.time() - start
+
+
+def ingest(args):
+    source = open_source(args.source, args.format, code_source=args.code_source,
+                         **({"workers": args.pdf_workers} if args.pdf_workers else {}))
+    fingerprint = model_fingerprint(args.model, args.instruction_prefix)
+    print(f"🚀 {source.kind.upper()} {args.source} -> {source.code_source} "
+          f"({fingerprint}{', dry run' if args.dry_run else ''})")
+
+    phases = []
+    start = time.time()
+    try:
+        conn = psycopg2.connect(**DB_CONFIG)
+    except Exception as e:
+        if not args.dry_run:
+            raise SystemExit(f"❌ Database connection failed ({DB_CONFIG['host']}): {e}")
+        print(f"⚠️ Database unreachable ({e}): parsing only")
+        conn = None
+
+    tracker = None
+    if conn is not None:
+        if not args.dry_run:
+            ensure_schema(conn, source.code_source)
+        tracker = ChangeTracker(conn, source.code_source, fingerprint)
+        phases.append(("plan", len(tracker.stored), time.time() - start))
+
+    if args.dry_run:
+        if conn is not None:
+            try:
+                check_embedding_model(conn, source.code_source, fingerprint)
+            except ValueError as e:
+                print(f"⚠️ {e}")
+        parsed, parse_s = dry_run(source, tracker, args.limit)
+        phases.append(("parse", parsed, parse_s))
+    else:
+        check_embedding_model(conn, source.code_source, fingerprint)
+        pipeline = IngestPipeline(
+            conn, args.model, source.code_source, source.metadata,
+            embedding_model=fingerprint, instruction_prefix=args.instruction_prefix,
+            workers=args.workers, batch_size=args.batch_size, write_batch=args.write_batch,
+            cache=None if args.no_cache else open_embedding_cache(args.model, args.instruction_prefix)
+        )
+        articles = itertools.islice(source, args.limit) if args.limit else source
+        with deferred_indexes(conn, args.bulk) as index_report:
+            stats = pipeline.run(tracker.filter(articles))
+            plan = tracker.plan()
+            plan.print_summary()
+            # A partial read (--limit) says nothing about the articles that were not read
+            removed = [] if args.limit else plan.deleted
+            deleted = delete_articles(conn, source.code_source, removed)
+            conn.commit()
+        purge_cached_generations(plan.code_source, plan.changed + removed)
+        print(f"🎉 {stats['written']} articles upserted, {deleted} deleted.")
+
+        parsed, parse_s = stats["parsed"], stats["parse_s"]
+        # Phases overlap (pipeline): embed is the workers' encode time per worker, not wall time
+        phases += [
+            ("parse", parsed, parse_s),
+            ("embed", stats["embedded"], stats["embed_s"] / max(1, len(pipeline.processes))),
+            ("cached", stats["cached"], 0.0),
+            ("write", stats["written"], stats["write_s"]),
+        ]
+        if index_report:
+            phases.append(("indexes", None, sum(r["build_s"] for r in index_report.values())))
+
+    if conn is not None:
+        conn.close()
+    if getattr(source, "page_timings", None):
+        print_page_timings(source.page_timings, parse_s, source.workers)
+    phases.append(("total", parsed, time.time() - start))
+    print_phases(phases)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest a legal code (TXT, PDF or JSON) into legal_articles")
+    parser.add_argument("source", help="Source file")
+    parser.add_argument("--format", choices=list(SOURCES), help="Source format (default: file extension)")
+    parser.add_argument("--code-source", help="code_source value (default: depends on the source)")
+    parser.add_argument("--dry-run", action="store_true", help="Parse and compare with the DB, write nothing")
+    parser.add_argument("--limit", type=int, default=0, help="Only read the first N articles")
+    parser.add_argument("--model", default=EMBEDDING_MODEL)
+    parser.add_argument("--instruction-prefix", default=INSTRUCTION_PREFIX)
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS, help="Embedding processes")
+    parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE)
+    parser.add_argument("--write-batch", type=int, default=INGEST_WRITE_BATCH)
+    parser.add_argument("--pdf-workers", type=int, help="PDF extraction processes")
+    parser.add_argument("--bulk", action="store_true", default=INGEST_BULK_MODE,
+                        help="Drop the HNSW/GIN indexes during the load and rebuild them at the end")
+    parser.add_argument("--no-cache", action="store_true", help="Ignore the embedding cache")
+    ingest(parser.parse_args())
@@ -1,5 +1,16 @@
 import os
+import sys
+from pathlib import Path
 import psycopg2
+
+# Makes the backend "app" package importable when the script is run directly
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from app.rag.generation_cache import purge_cached_generations
+from app.rag.embedding_cache import open_embedding_cache
+from batch_embedding import embed_texts
+from bulk_loader import bulk_load, ensure_schema
+from incremental import model_fingerprint, plan_changes, delete_articles
+from indexes import deferred_indexes, INGEST_BULK_MODE
 import json
 
 
@@ -90,46 +101,53 @@ DATASET = [
     },
 ]
 
+CODE_SOURCE = "Code de la Consommation"
+EMBEDDING_MODEL = "BAAI/bge-m3"
+
 def ingest():
-    print("🚀 Démarrage de l'ingestion massive...")
-    
-    # 1. Chargement du modèle
-    print("⏳ Chargement du modèle BGE-M3...")
-    model = SentenceTransformer("BAAI/bge-m3")
+    print("🚀 Démarrage de l'ingestion incrémentale...")
     
     conn = psycopg2.connect(**DB_CONFIG)
+    ensure_schema(conn, CODE_SOURCE)
     cur = conn.cursor()
 
-    # 2. Nettoyage (Optionnel : on garde les anciens ou on vide tout ?)
-    # Pour le test, on vide pour éviter les doublons avec tes anciens tests
-    print("🧹 Nettoyage de la table...")
-    cur.execute("TRUNCATE TABLE legal_articles;")
-    
-    print(f"📥 Insertion de {len(DATASET)} articles...")
+    # 1. Comparaison avec la base : seuls les articles nouveaux ou modifiés sont revectorisés
+    fingerprint = model_fingerprint(EMBEDDING_MODEL)
+    plan = plan_changes(conn, CODE_SOURCE, [(d["article_number"], d["content"]) for d in DATASET], fingerprint)
+    plan.print_summary()
+    metadata_by_article = {d["article_number"]: d["metadata"] for d in DATASET}
     
-    for doc in DATASET:
+    if plan.to_embed:
+        def encode(texts):
+            # 2. Chargement du modèle, seulement pour les textes absents du cache
+            print("⏳ Chargement du modèle BGE-M3...")
+            model = SentenceTransformer(EMBEDDING_MODEL)
+            return embed_texts(model, texts)
+
         # Vectorisation
-        vector = model.encode(doc["content"]).tolist()
-        metadata_json = json.dumps(doc["metadata"], ensure_ascii=False)
-        # Insertion Hybride (Vecteur + TSVector pour mots-clés)
-        sql = """
-                INSERT INTO legal_articles 
-                (article_number, content, metadata, embedding, content_search, code_source)
-                VALUES (%s, %s, %s, %s, to_tsvector('french', %s), %s);
-            """
-        cur.execute(sql, (
-            doc["article_number"],
-            doc["content"],
-            metadata_json,
-            vector,
-            doc["content"],
-            "Code de la Consommation" # <--- La valeur qui manquait !
-        ))
-        print(f"   ✅ {doc['article_number']} inséré.")
+        texts = [content for _, content in plan.to_embed]
+        cache = open_embedding_cache(EMBEDDING_MODEL)
+        vectors = cache.encode(texts, encode) if cache else encode(texts)
+
+        print(f"📥 Insertion de {len(plan.to_embed)} articles...")
+        rows = []
+        for (article_number, content), vector in zip(plan.to_embed, vectors):
+            metadata_json = json.dumps(metadata_by_article[article_number], ensure_ascii=False)
+            rows.append((CODE_SOURCE, article_number, content, metadata_json, vector))
+
+    # 3. Chargement en masse (COPY), le tsvector est calculé par le trigger ;
+    #    INGEST_BULK_MODE=1 reconstruit les index HNSW/GIN une seule fois à la fin
+    with deferred_indexes(conn, INGEST_BULK_MODE):
+        if plan.to_embed:
+            bulk_load(conn, rows, embedding_model=fingerprint)
+
+        # 4. Suppression des articles qui n'existent plus dans la source
+        delete_articles(conn, CODE_SOURCE, plan.deleted)
+        conn.commit()
 
-    conn.commit()
     cur.close()
     conn.close()
+    purge_cached_generations(plan.code_source, plan.changed + plan.deleted)
     print("🎉 Ingestion terminée avec succès !")
 
 if __name__ == "__main__":
@@ -1,9 +1,18 @@
 import os
-import re
+import sys
+from pathlib import Path
+import time
 import psycopg2
-from langchain_community.document_loaders import PyPDFLoader
-# On utilise RecursiveCharacterTextSplitter qui est plus robuste
-from langchain_text_splitters import RecursiveCharacterTextSplitter 
+
+# Makes the backend "app" package importable when the script is run directly
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from app.rag.generation_cache import purge_cached_generations
+from app.rag.embedding_cache import open_embedding_cache
+from batch_embedding import embed_texts
+from bulk_loader import bulk_load, ensure_schema
+from incremental import model_fingerprint, plan_changes, delete_articles
+from indexes import deferred_indexes, INGEST_BULK_MODE
+from pdf_extract import iter_pdf_articles, print_page_timings, PDF_WORKERS
 from sentence_transformers import SentenceTransformer
 
 # --- CONFIGURATION ---
@@ -19,6 +28,8 @@ DB_CONFIG = {
 
 SOURCE_FILE = "backend/data/code_consommation.pdf"
 EMBEDDING_MODEL = "Qwen/Qwen3-Embedding-0.6B"
+CODE_SOURCE = "Code Consommation"
+METADATA = '{"source": "Code Consommation PDF", "type": "loi"}'
 
 def ingest_with_langchain():
     print(f"🚀 Démarrage de l'ingestion vers {DB_HOST}...")
@@ -28,97 +39,67 @@ def ingest_with_langchain():
         print(f"❌ ERREUR: Le fichier {SOURCE_FILE} est introuvable.")
         return
 
-    # 2. Chargement du PDF
-    print(f"📂 Chargement du PDF : {SOURCE_FILE}")
+    # 2. + 3. Extraction du PDF (pages en parallèle) et découpage au fil de l'eau
+    print(f"📂 Extraction du PDF : {SOURCE_FILE}")
+    print("✂️ Découpage des articles et extraction des numéros...")
+
+    page_timings = []
+    start = time.time()
     try:
-        loader = PyPDFLoader(SOURCE_FILE)
-        pages = loader.load()
-        print(f"   📖 {len(pages)} pages lues.")
-        
-        # Fusion du texte pour ne pas couper un article au milieu d'une phrase entre deux pages
-        full_text = "\n".join([p.page_content for p in pages])
-        print(f"   📝 Taille totale : {len(full_text)} caractères.")
-        
+        articles = list(iter_pdf_articles(SOURCE_FILE, timings=page_timings))
     except Exception as e:
         print(f"❌ Erreur lecture PDF : {e}")
         return
+    print_page_timings(page_timings, time.time() - start, PDF_WORKERS)
+    print(f"✅ {len(articles)} articles identifiés.")
 
-    # 3. Découpage (CORRECTION ICI)
-    print("✂️ Découpage des articles...")
-    
-    text_splitter = RecursiveCharacterTextSplitter(
-        # Note le 's' à separators et c'est une liste
-        separators=[r"(?=\nArticle [L|R])"], 
-        chunk_size=4000,
-        chunk_overlap=0,
-        keep_separator=True,
-        is_separator_regex=True # INDISPENSABLE pour que le regex fonctionne
-    )
-    
-    # CORRECTION ICI : on passe une liste contenant le texte complet à create_documents
-    split_docs = text_splitter.create_documents([full_text])
-    print(f"✅ {len(split_docs)} articles identifiés.")
-
-    if len(split_docs) < 2:
+    if len(articles) < 2:
         print("⚠️ Attention : Peu d'articles trouvés. Vérifie que le PDF contient bien du texte sélectionnable.")
 
-    # 4. Chargement du Modèle (Mac)
-    print(f"🧠 Chargement du modèle {EMBEDDING_MODEL}...")
-    model = SentenceTransformer(EMBEDDING_MODEL, trust_remote_code=True, device="cpu")
-
     # 5. Connexion au Pi
     try:
         conn = psycopg2.connect(**DB_CONFIG)
+        ensure_schema(conn, CODE_SOURCE)
         cur = conn.cursor()
     except Exception as e:
         print(f"❌ Connexion au Pi impossible ({DB_HOST}) : {e}")
         return
 
-    print("🧹 Nettoyage de la table existante...")
-    cur.execute("TRUNCATE TABLE legal_articles;")
-    
+    # 6. Comparaison avec la base : seuls les articles nouveaux ou modifiés sont revectorisés
+    fingerprint = model_fingerprint(EMBEDDING_MODEL)
+    plan = plan_changes(conn, CODE_SOURCE, articles, fingerprint)
+    plan.print_summary()
+
     count = 0
-    print("🌊 Envoi des données vers le Pi...")
-    
-    for doc in split_docs:
-        content = doc.page_content.strip()
-        
-        if len(content) < 50: continue
-
-        # Extraction du numéro d'article
-        # On cherche dans les 200 premiers caractères du chunk
-        header = content[:200]
-        
-        # Regex amélioré pour capturer "Article L. 123" ou "Article L123"
-        match = re.search(r"Article\s+([L|R]\.?\s*\d+[-]\d+[a-zA-Z]?)", header, re.IGNORECASE)
-        
-        if match:
-            # Nettoyage : "L. 123-1" -> "L123-1"
-            article_number = match.group(1).replace(" ", "").replace(".", "")
-        else:
-            # Si on ne trouve pas de numéro au début, c'est peut-être un morceau de texte orphelin
-            # On peut soit l'ignorer, soit le marquer. Ici on l'ignore pour la propreté.
-            continue
-
-        vector = model.encode(content).tolist()
-        metadata = '{"source": "Code Consommation PDF", "type": "loi"}'
-
-        sql = """
-            INSERT INTO legal_articles 
-            (article_number, content, metadata, embedding, content_search, code_source)
-            VALUES (%s, %s, %s, %s, to_tsvector('french', %s), %s);
-        """
-        cur.execute(sql, (
-            article_number, content, metadata, vector, content, "Code Consommation"
-        ))
-        count += 1
-        if count % 10 == 0:
-            print(f"   💾 {count} articles insérés...", end='\r')
-
-    conn.commit()
+    rows = []
+    if plan.to_embed:
+        def encode(texts):
+            # 7. Chargement du Modèle (Mac), seulement pour les textes absents du cache
+            print(f"🧠 Chargement du modèle {EMBEDDING_MODEL}...")
+            model = SentenceTransformer(EMBEDDING_MODEL, trust_remote_code=True, device="cpu")
+            print("🧠 Vectorisation des articles...")
+            return embed_texts(model, texts)
+
+        texts = [content for _, content in plan.to_embed]
+        cache = open_embedding_cache(EMBEDDING_MODEL)
+        vectors = cache.encode(texts, encode) if cache else encode(texts)
+        if cache:
+            print(f"   💾 Cache d'embeddings : {cache.hits} réutilisés, {cache.misses} calculés")
+        rows = [(CODE_SOURCE, article_number, content, METADATA, vector)
+                for (article_number, content), vector in zip(plan.to_embed, vectors)]
+
+    # 8. Écriture (INGEST_BULK_MODE=1 : index HNSW/GIN reconstruits une seule fois à la fin)
+    with deferred_indexes(conn, INGEST_BULK_MODE):
+        if rows:
+            print("\n🌊 Envoi des données vers le Pi (COPY)...")
+            count = bulk_load(conn, rows, embedding_model=fingerprint)
+        deleted = delete_articles(conn, CODE_SOURCE, plan.deleted)
+        conn.commit()
+
     cur.close()
     conn.close()
-    print(f"\n🎉 SUCCÈS ! {count} articles ingérés sur le Raspberry Pi.")
+    purge_cached_generations(plan.code_source, plan.changed + plan.deleted)
+    print(f"\n🎉 SUCCÈS ! {count} articles mis à jour, {deleted} supprimés sur le Raspberry Pi.")
 
 if __name__ == "__main__":
     ingest_with_langchain()
\ No newline at end of file
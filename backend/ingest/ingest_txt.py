@@ -1,7 +1,18 @@
 import os
+import sys
+from pathlib import Path
 import re
+import mmap
 import psycopg2
-from sentence_transformers import SentenceTransformer
+
+# Makes the backend "app" package importable when the script is run directly
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from app.rag.generation_cache import purge_cached_generations
+from app.rag.embedding_cache import open_embedding_cache
+from bulk_loader import ensure_schema
+from incremental import model_fingerprint, ChangeTracker, delete_articles
+from indexes import deferred_indexes, INGEST_BULK_MODE
+from pipeline import IngestPipeline
 
 # --- CONFIGURATION ---
 DB_HOST = os.getenv("POSTGRES_HOST", "192.168.1.3")
@@ -15,21 +26,29 @@ DB_CONFIG = {
 
 SOURCE_FILE = "./data/code_consommation2.txt"
 EMBEDDING_MODEL = "Qwen/Qwen3-Embedding-0.6B"
+INSTRUCTION_PREFIX = "Instruct: Retrieve relevant legal passages for the following query\nQuery: "
+CODE_SOURCE = "Code Consommation"
+METADATA = '{"source": "Code Consommation TXT Strict"}'
+
+ARTICLE_PATTERN = re.compile(r"(?m)^\s*Article\s+(L|R|D)\.?\s*(\d+(?:-\d+)?(?:-\d+)?[a-zA-Z]*)")
+FOOTER_PATTERN = re.compile(r"Code de la consommation - Dernière modification.*", flags=re.IGNORECASE)
+CHUNK_SIZE = 1 << 20
+# A match ending this close to the end of the buffer may still grow with the next chunk
+LOOKAHEAD = 4096
 
 def clean_file_content(text):
     text = text.replace('\x0c', '')
-    text = re.sub(
-        r"Code de la consommation - Dernière modification.*", 
-        "", 
-        text, 
-        flags=re.IGNORECASE
-    )
+    text = FOOTER_PATTERN.sub("", text)
     return text
 
+def _article_number(match):
+    type_art = match.group(1).upper()
+    num_art = match.group(2).replace(" ", "").replace(".", "")
+    return f"{type_art}{num_art}"
+
 def parse_articles_strict(full_text):
-    # Regex
-    pattern = re.compile(r"(?m)^\s*Article\s+(L|R|D)\.?\s*(\d+(?:-\d+)?(?:-\d+)?[a-zA-Z]*)")
-    matches = list(pattern.finditer(full_text))
+    # Same pattern as the streaming parser (iter_articles_strict)
+    matches = list(ARTICLE_PATTERN.finditer(full_text))
     articles = []
     print(f"{len(matches)} 'Article' found.")
 
@@ -40,15 +59,74 @@ def parse_articles_strict(full_text):
         else:
             end_index = len(full_text)
         raw_content = full_text[start_index:end_index].strip()
-        
-        match = matches[i]
-        type_art = match.group(1).upper()
-        num_art = match.group(2).replace(" ", "").replace(".", "")
-        article_number = f"{type_art}{num_art}"
-        articles.append((article_number, raw_content))
+        articles.append((_article_number(matches[i]), raw_content))
         
     return articles
 
+def iter_clean_chunks(path, chunk_size=CHUNK_SIZE):
+    """
+    Reads the file through a memory map in chunks cut on line boundaries and applies
+    clean_file_content to each chunk (its patterns never cross a line).
+    Newlines are normalized like text-mode open() does.
+    """
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            pos = 0
+            while pos < size:
+                end = mm.find(b"\n", min(pos + chunk_size, size) - 1)
+                end = size if end == -1 else end + 1
+                chunk = mm[pos:end].decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
+                yield clean_file_content(chunk)
+                pos = end
+
+def iter_articles_strict(path, chunk_size=CHUNK_SIZE):
+    """
+    Streaming equivalent of parse_articles_strict(clean_file_content(<file>)):
+    yields (article_number, content) one at a time while holding at most
+    one article plus one chunk in memory.
+    """
+    buffer = ""          # unparsed data, starting with the current article's header
+    current = None       # article number of the article starting at buffer[0]
+    search_from = 0      # matches cannot start inside the current header (like finditer)
+    chunks = iter_clean_chunks(path, chunk_size)
+    exhausted = False
+
+    while not exhausted:
+        chunk = next(chunks, None)
+        if chunk is None:
+            exhausted = True
+        else:
+            buffer += chunk
+
+        limit = len(buffer) if exhausted else len(buffer) - LOOKAHEAD
+        start = 0
+        while True:
+            match = ARTICLE_PATTERN.search(buffer, search_from)
+            if match is None or match.end() > limit:
+                break
+            if current is not None:
+                yield current, buffer[start:match.start()].strip()
+            current = _article_number(match)
+            start = match.start()
+            search_from = match.end()
+
+        # Keep only the article in progress (one copy per chunk, not per article)
+        buffer = buffer[start:]
+        search_from -= start
+
+        if current is None and not exhausted:
+            # Preamble before the first article: drop it, cutting on a line start
+            cut = buffer.rfind('\n', 0, max(0, len(buffer) - 2 * LOOKAHEAD))
+            if cut > 0:
+                buffer = buffer[cut + 1:]
+                search_from = 0
+
+    if current is not None:
+        yield current, buffer.strip()
+
 def ingest_strict():
     print(f"Beggining of strict ingestion to {DB_HOST}...")
 
@@ -56,15 +134,8 @@ def ingest_strict():
         print(f"Unaible to find file : {SOURCE_FILE}")
         return
 
-    with open(SOURCE_FILE, 'r', encoding='utf-8') as f:
-        text = f.read()
-
-    text = clean_file_content(text)
-    print(f"File size : {len(text)} charactere.")
-
-    print("Surgical chunking...")
-    articles_data = parse_articles_strict(text)
-    print(f"{len(articles_data)} unique articles extracted")
+    print(f"File size : {os.path.getsize(SOURCE_FILE)} bytes.")
+    print("Surgical chunking (streamed)...")
 
     try:
         conn = psycopg2.connect(**DB_CONFIG)
@@ -73,67 +144,30 @@ def ingest_strict():
         print(f"Pi connection failed : {e}")
         return
 
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS legal_articles (
-            id bigserial PRIMARY KEY,
-            article_number text,
-            content text,
-            metadata jsonb,
-            content_search tsvector,
-            code_source text,
-            embedding vector(1024)
-        );
-    """)
-    cur.execute("SELECT article_number FROM legal_articles;")
-    existing_ids = {row[0] for row in cur.fetchall()}
-    articles_to_process = [a for a in articles_data if a[0] not in existing_ids]
-    
-    if not articles_to_process:
-        print("All articles already in DB")
-        return
+    ensure_schema(conn, CODE_SOURCE)
+    fingerprint = model_fingerprint(EMBEDDING_MODEL, INSTRUCTION_PREFIX)
+    tracker = ChangeTracker(conn, CODE_SOURCE, fingerprint)
+
+    # Parse -> embed (worker processes) -> bulk write, only for new or changed articles
+    pipeline = IngestPipeline(
+        conn, EMBEDDING_MODEL, CODE_SOURCE, METADATA,
+        embedding_model=fingerprint, instruction_prefix=INSTRUCTION_PREFIX,
+        cache=open_embedding_cache(EMBEDDING_MODEL, INSTRUCTION_PREFIX)
+    )
+    # INGEST_BULK_MODE=1 (full reloads): HNSW/GIN indexes are rebuilt once at the end
+    with deferred_indexes(conn, INGEST_BULK_MODE):
+        stats = pipeline.run(tracker.filter(iter_articles_strict(SOURCE_FILE)))
+        print(f"{len(tracker.last)} unique articles extracted")
+
+        plan = tracker.plan()
+        plan.print_summary()
+        deleted = delete_articles(conn, CODE_SOURCE, plan.deleted)
+        conn.commit()
 
-    print(f"Loading of Qwen Model (CPU) to process {len(articles_to_process)} articles...")
-    model = SentenceTransformer(EMBEDDING_MODEL, trust_remote_code=True, device="cpu")
-    
-    print("Inserting...")
-    count = 0
-    BATCH_SIZE = 25  # Commit every 25 articles to save progress
-    
-    for article_number, content in articles_to_process:
-        try:
-            task_instruction = f"Instruct: Retrieve relevant legal passages for the following query\nQuery: {content}"
-            vector = model.encode(task_instruction).tolist()
-            
-            sql = """
-                INSERT INTO legal_articles 
-                (article_number, content, metadata, embedding, content_search, code_source)
-                VALUES (%s, %s, %s, %s, to_tsvector('french', %s), %s);
-            """
-            
-            cur.execute(sql, (
-                article_number, 
-                content, 
-                '{"source": "Code Consommation TXT Strict"}', 
-                vector, 
-                content, 
-                "Code Consommation"
-            ))
-            
-            count += 1
-            
-            if count % BATCH_SIZE == 0:
-                conn.commit()
-                print(f"{count}/{len(articles_to_process)} articles committed...")
-                
-        except Exception as e:
-            print(f"Error on {article_number}: {e}")
-            conn.rollback()
-            continue
-
-    conn.commit()
     cur.close()
     conn.close()
-    print(f"\nFINISHED! {count} articles inserted.")
+    purge_cached_generations(plan.code_source, plan.changed + plan.deleted)
+    print(f"\nFINISHED! {stats['written']} articles upserted, {deleted} deleted.")
 
 if __name__ == "__main__":
     ingest_strict()
\ No newline at end of file
@@ -0,0 +1,114 @@
+"""
+legal_articles is list-partitioned by code_source (one partition, HNSW index and GIN index per code).
+
+    python backend/ingest/partitions.py status     # partitions, rows and index sizes
+    python backend/ingest/partitions.py migrate    # converts a database created before partitioning
+"""
+import os
+import time
+import argparse
+import psycopg2
+
+from bulk_loader import ensure_schema
+from indexes import build_search_indexes, index_definitions
+
+LEGACY_TABLE = "legal_articles_unpartitioned"
+COLUMNS = ("id", "code_source", "article_number", "content", "metadata", "embedding",
+           "content_hash", "embedding_model", "created_at")
+# Copied columns missing from tables created before incremental ingestion (left NULL: re-embedded)
+LEGACY_MISSING_COLUMNS = (("content_hash", "VARCHAR(64)"), ("embedding_model", "VARCHAR(200)"))
+
+
+def is_partitioned(conn) -> bool:
+    cur = conn.cursor()
+    cur.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass('legal_articles');")
+    row = cur.fetchone()
+    cur.close()
+    return row is not None and row[0] == "p"
+
+
+def partition_status(conn) -> list:
+    """[(partition, code_source or 'DEFAULT', rows, total size)]"""
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), s.n_live_tup,
+               pg_size_pretty(pg_total_relation_size(c.oid))
+        FROM pg_partition_tree('legal_articles') t
+        JOIN pg_class c ON c.oid = t.relid
+        LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+        WHERE t.isleaf
+        ORDER BY c.relname;
+    """)
+    rows = cur.fetchall()
+    cur.close()
+    return rows
+
+
+def migrate(conn, keep_legacy=False):
+    """
+    Renames the plain table (and its indexes/sequence) to legal_articles_unpartitioned, creates the
+    partitioned table from init.sql, one partition per code, and copies the rows without the search
+    indexes (built once per partition at the end). Everything up to the copy is one transaction:
+    a failure leaves the original table untouched, and migrate can simply be run again.
+    """
+    if is_partitioned(conn):
+        print("legal_articles is already partitioned.")
+        return
+    start = time.time()
+    cur = conn.cursor()
+    try:
+        for column, sql_type in LEGACY_MISSING_COLUMNS:
+            cur.execute(f"ALTER TABLE legal_articles ADD COLUMN IF NOT EXISTS {column} {sql_type};")
+        cur.execute("SELECT indexname FROM pg_indexes WHERE tablename = 'legal_articles';")
+        for (index,) in cur.fetchall():
+            cur.execute(f'ALTER INDEX "{index}" RENAME TO "{index}_unpartitioned";')
+        cur.execute(f"ALTER TABLE legal_articles RENAME TO {LEGACY_TABLE};")
+        cur.execute("ALTER SEQUENCE IF EXISTS legal_articles_id_seq RENAME TO legal_articles_unpartitioned_id_seq;")
+        cur.execute(f"SELECT DISTINCT code_source FROM {LEGACY_TABLE};")
+        codes = [row[0] for row in cur.fetchall()]
+
+        ensure_schema(conn, commit=False)
+        for code in codes:
+            ensure_schema(conn, code, commit=False)
+        for name in index_definitions():
+            cur.execute(f"DROP INDEX IF EXISTS {name};")
+
+        columns = ", ".join(COLUMNS)
+        # content_search is recomputed by the trigger
+        cur.execute(f"INSERT INTO legal_articles ({columns}) SELECT {columns} FROM {LEGACY_TABLE};")
+        copied = cur.rowcount
+        cur.execute("SELECT setval(pg_get_serial_sequence('legal_articles', 'id'), "
+                    "GREATEST((SELECT max(id) FROM legal_articles), 1));")
+        if not keep_legacy:
+            cur.execute(f"DROP TABLE {LEGACY_TABLE};")
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+    conn.commit()
+    build_search_indexes(conn)
+
+    print(f"✅ {copied} rows moved into {len(codes)} partitions in {time.time() - start:.1f}s"
+          + (f" ({LEGACY_TABLE} kept)" if keep_legacy else ""))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="legal_articles partitions")
+    parser.add_argument("command", choices=["status", "migrate"])
+    parser.add_argument("--keep-legacy", action="store_true", help=f"Keep {LEGACY_TABLE} after the migration")
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(
+        dbname=os.getenv("POSTGRES_DB", "legal_ai"), user=os.getenv("POSTGRES_USER", "legal_user"),
+        password=os.getenv("POSTGRES_PASSWORD", "legal_pass_dev"),
+        host=os.getenv("POSTGRES_HOST", "localhost"), port=os.getenv("POSTGRES_PORT", "5432")
+    )
+    if args.command == "migrate":
+        migrate(conn, args.keep_legacy)
+    if not is_partitioned(conn):
+        print("legal_articles is not partitioned (run: partitions.py migrate)")
+    else:
+        for name, bound, rows, size in partition_status(conn):
+            print(f"{name:45} {bound:55} {rows or 0:>8} rows {size:>10}")
+    conn.close()
@@ -0,0 +1,118 @@
+import os
+import re
+import time
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+
+# --- CONFIGURATION ---
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(os.cpu_count() or 2)))
+# Pages per task: large enough to amortize inter-process traffic, small enough to balance the load
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "16"))
+# Articles are cut right before each "\nArticle L/R"
+ARTICLE_BOUNDARY = re.compile(r"\nArticle [L|R]")
+# "Article L. 123-1" or "Article L123-1", searched in the first 200 characters of a chunk
+ARTICLE_NUMBER = re.compile(r"Article\s+([L|R]\.?\s*\d+[-]\d+[a-zA-Z]?)", re.IGNORECASE)
+MAX_CHUNK_CHARS = 4000
+MIN_CHUNK_CHARS = 50
+
+_reader = None
+
+
+def _open_reader(path):
+    """Pool initializer: each worker parses the PDF structure once."""
+    global _reader
+    from pypdf import PdfReader
+    _reader = PdfReader(path)
+
+
+def _extract_range(page_range):
+    pages = []
+    for page_no in range(*page_range):
+        start = time.perf_counter()
+        text = _reader.pages[page_no].extract_text() or ""
+        pages.append((page_no, text, time.perf_counter() - start))
+    return pages
+
+
+def page_count(path) -> int:
+    from pypdf import PdfReader
+    return len(PdfReader(path).pages)
+
+
+def iter_pdf_pages(path, workers=PDF_WORKERS, pages_per_task=PDF_PAGES_PER_TASK, timings=None):
+    """
+    Extracts the text of every page with a pool of processes, one page range per task.
+    Yields (page_no, text) in page order as soon as the next range is ready, so the
+    caller can split articles while later pages are still being extracted.
+    If a `timings` list is given, (page_no, seconds) is appended for each page.
+    """
+    total = page_count(path)
+    ranges = [(start, min(start + pages_per_task, total)) for start in range(0, total, pages_per_task)]
+    workers = max(1, min(workers, len(ranges)))
+    ctx = mp.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_open_reader,
+                             initargs=(path,)) as pool:
+        # map() submits every range up front and returns the results in order
+        for pages in pool.map(_extract_range, ranges):
+            for page_no, text, seconds in pages:
+                if timings is not None:
+                    timings.append((page_no, seconds))
+                yield page_no, text
+
+
+def print_page_timings(timings, elapsed, workers):
+    if not timings:
+        return
+    cpu = sum(s for _, s in timings)
+    slowest = sorted(timings, key=lambda t: t[1], reverse=True)[:5]
+    print(f"   📖 {len(timings)} pages extracted in {elapsed:.2f}s with {workers} processes "
+          f"({len(timings) / max(elapsed, 1e-9):.1f} pages/s, {cpu:.2f}s of page work, "
+          f"{1000 * cpu / len(timings):.1f} ms/page on average)")
+    print("   🐢 Slowest pages: " + ", ".join(f"p.{page_no + 1} {1000 * s:.0f} ms" for page_no, s in slowest))
+
+
+def iter_article_segments(pages):
+    """
+    Takes (page_no, text) in page order and yields the text of each article once it is complete.
+    Pages are joined with "\n" (like the former full text), so an article spanning two pages
+    stays in one piece.
+    """
+    buffer = ""
+    for i, (_, text) in enumerate(pages):
+        buffer = text if i == 0 else buffer + "\n" + text
+        starts = [m.start() for m in ARTICLE_BOUNDARY.finditer(buffer) if m.start() > 0]
+        if not starts:
+            continue
+        # The last article may continue on the next page: keep it in the buffer
+        cut = 0
+        for start in starts:
+            yield buffer[cut:start]
+            cut = start
+        buffer = buffer[cut:]
+    if buffer:
+        yield buffer
+
+
+def iter_pdf_articles(path, workers=PDF_WORKERS, timings=None):
+    """
+    Yields (article_number, content) from a code PDF while pages are still being extracted.
+    Articles over MAX_CHUNK_CHARS are cut by the recursive splitter; chunks without an
+    article number in their header (orphan text, tails of long articles) are skipped.
+    """
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    splitter = RecursiveCharacterTextSplitter(
+        separators=[r"(?=\nArticle [L|R])"],
+        chunk_size=MAX_CHUNK_CHARS,
+        chunk_overlap=0,
+        keep_separator=True,
+        is_separator_regex=True
+    )
+    for segment in iter_article_segments(iter_pdf_pages(path, workers, timings=timings)):
+        for chunk in splitter.split_text(segment):
+            content = chunk.strip()
+            if len(content) < MIN_CHUNK_CHARS:
+                continue
+            match = ARTICLE_NUMBER.search(content[:200])
+            if match:
+                # "L. 123-1" -> "L123-1"
+                yield match.group(1).replace(" ", "").replace(".", ""), content
@@ -0,0 +1,217 @@
+import os
+import time
+import queue
+import itertools
+import threading
+import multiprocessing as mp
+import numpy as np
+from batch_embedding import length_buckets, EMBED_BATCH_SIZE, EMBED_MAX_BATCH_TOKENS, EMBED_MAX_SEQ_LENGTH
+from bulk_loader import bulk_load
+
+# --- CONFIGURATION ---
+CPU_COUNT = os.cpu_count() or 2
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", str(max(1, CPU_COUNT // 4))))
+# torch threads per worker: workers x threads should not exceed the cores
+INGEST_THREADS_PER_WORKER = int(os.getenv("INGEST_THREADS_PER_WORKER", "0"))
+INGEST_WRITE_BATCH = int(os.getenv("INGEST_WRITE_BATCH", "256"))
+# Articles gathered before length-bucketing them into batches (bounded: memory stays flat)
+BUCKET_WINDOW = EMBED_BATCH_SIZE * 8
+CHARS_PER_TOKEN = 4
+
+
+def _embed_worker(worker_id, model_name, threads, in_q, out_q):
+    """Stage 2 (one process per worker): owns one model copy with a fixed torch thread count."""
+    import torch
+    torch.set_num_threads(threads)
+    from sentence_transformers import SentenceTransformer
+    model = SentenceTransformer(model_name, trust_remote_code=True, device="cpu")
+    model.max_seq_length = min(model.max_seq_length or EMBED_MAX_SEQ_LENGTH, EMBED_MAX_SEQ_LENGTH)
+    out_q.put(("ready", worker_id, None))
+
+    while True:
+        batch = in_q.get()
+        if batch is None:
+            out_q.put(("done", worker_id, None))
+            return
+        try:
+            start = time.perf_counter()
+            vectors = model.encode([item[3] for item in batch], batch_size=len(batch), convert_to_numpy=True)
+            out_q.put(("batch", [item[:3] for item in batch], (vectors, time.perf_counter() - start)))
+        except Exception as e:
+            out_q.put(("error", worker_id, f"{type(e).__name__}: {e}"))
+
+
+class IngestPipeline:
+    """
+    Streaming ingestion in three stages connected by bounded queues:
+    1. a parser thread reads articles lazily and groups them in length-bucketed batches,
+    2. N embedding processes (one model each),
+    3. the writer (this process) upserts rows with bulk_load and commits every `write_batch` rows.
+    Full queues block the upstream stage (backpressure), so memory does not grow with the source.
+    With an embedding `cache`, cached articles go straight to the writer and the workers are
+    only started on the first miss (a fully cached corpus loads no model).
+    Articles are (article_number, content) or (article_number, content, metadata); `metadata`
+    is used for the former.
+    On Ctrl+C or a worker error, rows already embedded are flushed before stopping.
+    """
+
+    def __init__(self, conn, model_name, code_source, metadata, embedding_model=None, instruction_prefix="",
+                 workers=INGEST_WORKERS, threads_per_worker=INGEST_THREADS_PER_WORKER,
+                 batch_size=EMBED_BATCH_SIZE, write_batch=INGEST_WRITE_BATCH, cache=None):
+        self.conn = conn
+        self.model_name = model_name
+        self.code_source = code_source
+        self.metadata = metadata
+        self.embedding_model = embedding_model
+        self.instruction_prefix = instruction_prefix
+        self.workers = max(1, workers)
+        self.threads = threads_per_worker or max(1, CPU_COUNT // self.workers)
+        self.batch_size = batch_size
+        self.write_batch = write_batch
+        self.cache = cache
+        self.processes = []
+        self.written = {}  # article_number -> sequence number of the version written
+        self.article_metadata = {}  # seq -> metadata of in-flight articles that have their own
+        self.stats = {"parsed": 0, "embedded": 0, "cached": 0, "written": 0,
+                      "parse_s": 0.0, "embed_s": 0.0, "write_s": 0.0}
+
+    # --- STAGE 2 ---
+
+    def _start_workers(self, ctx, in_q, out_q):
+        self.processes = [
+            ctx.Process(target=_embed_worker, args=(i, self.model_name, self.threads, in_q, out_q), daemon=True)
+            for i in range(self.workers)
+        ]
+        print(f"🏭 Pipeline: {self.workers} embedding workers x {self.threads} threads, "
+              f"batches of {self.batch_size}, writes of {self.write_batch}")
+        for p in self.processes:
+            p.start()
+
+    # --- STAGE 1 ---
+
+    def _dispatch(self, window, ctx, in_q, out_q):
+        if self.cache is not None:
+            cached = self.cache.get_many([item[2] for item in window])
+            hits = [i for i, vector in enumerate(cached) if vector is not None]
+            if hits:
+                out_q.put(("cached", [window[i][:3] for i in hits], np.stack([cached[i] for i in hits])))
+            window = [item for item, vector in zip(window, cached) if vector is None]
+            if not window:
+                return
+        if not self.processes:
+            self._start_workers(ctx, in_q, out_q)
+        lengths = [len(item[3]) // CHARS_PER_TOKEN + 1 for item in window]
+        for batch in length_buckets(lengths, self.batch_size, EMBED_MAX_BATCH_TOKENS):
+            in_q.put([window[i] for i in batch])
+
+    def _produce(self, articles, ctx, in_q, out_q, errors):
+        start = time.time()
+        try:
+            window = []
+            for seq, (article_number, content, *metadata) in enumerate(articles):
+                if metadata:
+                    self.article_metadata[seq] = metadata[0]
+                window.append((seq, article_number, content, self.instruction_prefix + content))
+                self.stats["parsed"] += 1
+                if len(window) >= BUCKET_WINDOW:
+                    self._dispatch(window, ctx, in_q, out_q)
+                    window = []
+            if window:
+                self._dispatch(window, ctx, in_q, out_q)
+        except Exception as e:
+            errors.append(f"parser: {type(e).__name__}: {e}")
+        finally:
+            self.stats["parse_s"] = time.time() - start
+            for _ in self.processes:
+                in_q.put(None)
+            # Tells the writer how many workers it must wait for
+            out_q.put(("parsed", len(self.processes), None))
+
+    # --- STAGE 3 ---
+
+    def _flush(self, pending):
+        if not pending:
+            return
+        start = time.time()
+        self.stats["written"] += bulk_load(self.conn, pending, embedding_model=self.embedding_model)
+        self.conn.commit()
+        self.stats["write_s"] += time.time() - start
+        pending.clear()
+
+    def run(self, articles) -> dict:
+        # Nothing to embed (routine incremental run): do not start any model
+        articles = iter(articles)
+        first = next(articles, None)
+        if first is None:
+            print("🏭 Pipeline: nothing to embed.")
+            self.stats["total_s"] = 0.0
+            return self.stats
+        articles = itertools.chain([first], articles)
+
+        ctx = mp.get_context("spawn")
+        in_q = ctx.Queue(maxsize=self.workers * 2)
+        out_q = ctx.Queue(maxsize=self.workers * 2)
+
+        errors = []
+        producer = threading.Thread(target=self._produce, args=(articles, ctx, in_q, out_q, errors), daemon=True)
+        producer.start()
+
+        pending = []
+        done = 0
+        expected = None  # number of workers started, known once the parser is done
+        start = time.time()
+        try:
+            while expected is None or done < expected:
+                try:
+                    kind, a, b = out_q.get(timeout=5)
+                except queue.Empty:
+                    if self.processes and not any(p.is_alive() for p in self.processes):
+                        errors.append("embedding workers exited unexpectedly")
+                        break
+                    continue
+                if kind == "parsed":
+                    expected = a
+                elif kind == "done":
+                    done += 1
+                elif kind == "error":
+                    errors.append(f"worker {a}: {b}")
+                    break
+                elif kind in ("batch", "cached"):
+                    if kind == "batch":
+                        b, embed_s = b
+                        self.stats["embed_s"] += embed_s
+                    for (seq, article_number, content), vector in zip(a, b):
+                        metadata = self.article_metadata.pop(seq, self.metadata)
+                        # Keep the last occurrence of a repeated article, whatever the worker order
+                        if seq >= self.written.get(article_number, -1):
+                            self.written[article_number] = seq
+                            pending.append((self.code_source, article_number, content, metadata, vector))
+                    if kind == "batch":
+                        self.stats["embedded"] += len(a)
+                        if self.cache is not None:
+                            self.cache.put_many([item[2] for item in a], b)
+                    else:
+                        self.stats["cached"] += len(a)
+                    if len(pending) >= self.write_batch:
+                        self._flush(pending)
+                    elapsed = time.time() - start
+                    print(f"   🧠 {self.stats['embedded']} embedded | {self.stats['cached']} cached | "
+                          f"{self.stats['written']} written | {self.stats['embedded'] / elapsed:.1f} articles/s",
+                          end="\r")
+        except KeyboardInterrupt:
+            errors.append("interrupted")
+        finally:
+            # Clean shutdown: what has been embedded is written, then workers are stopped
+            self._flush(pending)
+            for p in self.processes:
+                if errors:
+                    p.terminate()
+                p.join(timeout=10)
+
+        self.stats["total_s"] = time.time() - start
+        print(f"\n   ✅ {self.stats['embedded']} articles embedded, {self.stats['cached']} from the embedding cache, "
+              f"{self.stats['written']} written in {self.stats['total_s']:.1f}s "
+              f"({self.stats['embedded'] / max(self.stats['total_s'], 1e-9):.1f} articles/s)")
+        if errors:
+            raise RuntimeError("; ".join(errors))
+        return self.stats
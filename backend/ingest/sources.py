@@ -0,0 +1,72 @@
+import json
+from pathlib import Path
+
+from pdf_extract import iter_pdf_articles, PDF_WORKERS
+
+
+class TxtSource:
+    """Legifrance TXT export, parsed by the streaming strict parser of ingest_txt."""
+
+    kind = "txt"
+
+    def __init__(self, path, code_source="Code Consommation", metadata=None):
+        self.path = path
+        self.code_source = code_source
+        self.metadata = metadata or {"source": f"{code_source} TXT Strict"}
+
+    def __iter__(self):
+        from ingest_txt import iter_articles_strict
+        return iter_articles_strict(self.path)
+
+
+class PdfSource:
+    """Code PDF: pages extracted by a process pool, articles split as pages arrive."""
+
+    kind = "pdf"
+
+    def __init__(self, path, code_source="Code Consommation", metadata=None, workers=PDF_WORKERS):
+        self.path = path
+        self.code_source = code_source
+        self.metadata = metadata or {"source": f"{code_source} PDF", "type": "loi"}
+        self.workers = workers
+        self.page_timings = []
+
+    def __iter__(self):
+        return iter_pdf_articles(self.path, self.workers, timings=self.page_timings)
+
+
+class JsonSource:
+    """
+    code_consommation_sample.json format: [{"code", "article", "text", "metadata"}, ...].
+    Each record keeps its own metadata. One code per run: pass code_source when the file mixes several.
+    """
+
+    kind = "json"
+
+    def __init__(self, path, code_source=None, metadata=None):
+        self.path = path
+        with open(path, "r", encoding="utf-8") as f:
+            self.records = json.load(f)
+        codes = sorted({r["code"] for r in self.records})
+        if code_source is None:
+            if len(codes) != 1:
+                raise ValueError(f"{path} contains several codes ({', '.join(codes)}): choose one with --code-source")
+            code_source = codes[0]
+        self.code_source = code_source
+        self.metadata = metadata or {}
+
+    def __iter__(self):
+        for record in self.records:
+            if record["code"] == self.code_source:
+                yield record["article"], record["text"], {**self.metadata, **record.get("metadata", {})}
+
+
+SOURCES = {"txt": TxtSource, "pdf": PdfSource, "json": JsonSource}
+
+
+def open_source(path, kind=None, **options):
+    """Picks the reader from `kind` or from the file extension."""
+    kind = kind or Path(path).suffix.lower().lstrip(".")
+    if kind not in SOURCES:
+        raise ValueError(f"Unsupported source '{kind}' (expected one of: {', '.join(SOURCES)})")
+    return SOURCES[kind](path, **{k: v for k, v in options.items() if v is not None})
@@ -5,8 +5,11 @@ CREATE EXTENSION IF NOT EXISTS vector;
 CREATE EXTENSION IF NOT EXISTS unaccent;
 
 -- 2. Create Main Table
+-- List-partitioned by code: each code gets its own partition with its own HNSW and GIN
+-- indexes (created from the parent indexes below), so a query filtered on codes only
+-- scans their partitions. Partitions are created by legal_articles_ensure_partition().
 CREATE TABLE IF NOT EXISTS legal_articles (
-    id SERIAL PRIMARY KEY,
+    id SERIAL,
     
  
     code_source VARCHAR(100) NOT NULL,
@@ -17,15 +20,30 @@ CREATE TABLE IF NOT EXISTS legal_articles (
     metadata JSONB NOT NULL DEFAULT '{}',
     
     embedding vector(1024),
+
+    -- Incremental ingestion: sha256 of content + model/instruction used for the embedding
+    content_hash VARCHAR(64),
+    embedding_model VARCHAR(200),
     
     created_at TIMESTAMP DEFAULT NOW(),
     
-    UNIQUE(code_source, article_number),
+    content_search tsvector,
+
+    -- Unique keys of a partitioned table must contain the partition key
+    PRIMARY KEY (code_source, id),
+
+    UNIQUE(code_source, article_number)
+) PARTITION BY LIST (code_source);
 
-    UNIQUE(code_source, article_number),
+-- 2b. Columns added after the first release (existing databases)
+ALTER TABLE legal_articles ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64);
+ALTER TABLE legal_articles ADD COLUMN IF NOT EXISTS embedding_model VARCHAR(200);
 
-    content_search tsvector
-);
+-- 2c. Filter columns derived from the article number ("L221-18": type 'L', major 221 = book 2)
+ALTER TABLE legal_articles ADD COLUMN IF NOT EXISTS article_type CHAR(1)
+    GENERATED ALWAYS AS (upper(left(article_number, 1))) STORED;
+ALTER TABLE legal_articles ADD COLUMN IF NOT EXISTS article_major INT
+    GENERATED ALWAYS AS ((substring(article_number from '(\d+)'))::int) STORED;
 
 -- 3. HNSW Vector Index (For RAG performance)
 CREATE INDEX IF NOT EXISTS legal_articles_embedding_idx 
@@ -38,6 +56,14 @@ CREATE INDEX IF NOT EXISTS legal_articles_fts_idx
 ON legal_articles 
 USING GIN (content_search);
 
+-- 4b. Filter indexes: metadata containment (metadata @> '{"theme": ...}') and article type/number
+CREATE INDEX IF NOT EXISTS legal_articles_metadata_idx
+ON legal_articles
+USING GIN (metadata jsonb_path_ops);
+
+CREATE INDEX IF NOT EXISTS legal_articles_type_major_idx
+ON legal_articles (article_type, article_major);
+
 -- 5. Trigger Function to update content_search
 CREATE OR REPLACE FUNCTION legal_articles_tsvector_trigger() RETURNS trigger AS $$
 BEGIN
@@ -49,4 +75,44 @@ $$ LANGUAGE plpgsql;
 -- 6. Trigger application
 DROP TRIGGER IF EXISTS tsvectorupdate ON legal_articles;
 CREATE TRIGGER tsvectorupdate BEFORE INSERT OR UPDATE
-ON legal_articles FOR EACH ROW EXECUTE PROCEDURE legal_articles_tsvector_trigger();
\ No newline at end of file
+ON legal_articles FOR EACH ROW EXECUTE PROCEDURE legal_articles_tsvector_trigger();
+
+-- 7. Partitions (only when legal_articles is partitioned: databases created before
+--    partitioning keep working unchanged until migrated with ingest/partitions.py)
+DO $$
+BEGIN
+  IF (SELECT relkind FROM pg_class WHERE oid = 'legal_articles'::regclass) = 'p' THEN
+    -- Rows of a code without its own partition land here
+    CREATE TABLE IF NOT EXISTS legal_articles_default PARTITION OF legal_articles DEFAULT;
+  END IF;
+END
+$$;
+
+CREATE OR REPLACE FUNCTION legal_articles_ensure_partition(code TEXT) RETURNS TEXT AS $$
+DECLARE
+  part TEXT := 'legal_articles_' || left(regexp_replace(lower(unaccent(code)), '[^a-z0-9]+', '_', 'g'), 40);
+  cols TEXT;
+BEGIN
+  IF (SELECT relkind FROM pg_class WHERE oid = 'legal_articles'::regclass) <> 'p' THEN
+    RETURN 'legal_articles';
+  END IF;
+  IF to_regclass(part) IS NOT NULL THEN
+    RETURN part;
+  END IF;
+  IF EXISTS (SELECT 1 FROM legal_articles_default WHERE code_source = code) THEN
+    -- Rows loaded before the partition existed: move them out of the default partition
+    SELECT string_agg(quote_ident(attname), ', ' ORDER BY attnum) INTO cols
+    FROM pg_attribute
+    WHERE attrelid = 'legal_articles'::regclass AND attnum > 0 AND NOT attisdropped AND attgenerated = '';
+    -- Generated columns are recomputed on insert: they are left out of the copied columns
+    EXECUTE format('CREATE TABLE %I (LIKE legal_articles INCLUDING DEFAULTS INCLUDING GENERATED)', part);
+    EXECUTE format('INSERT INTO %I (%s) SELECT %s FROM legal_articles_default WHERE code_source = %L',
+                   part, cols, cols, code);
+    DELETE FROM legal_articles_default WHERE code_source = code;
+    EXECUTE format('ALTER TABLE legal_articles ATTACH PARTITION %I FOR VALUES IN (%L)', part, code);
+  ELSE
+    EXECUTE format('CREATE TABLE %I PARTITION OF legal_articles FOR VALUES IN (%L)', part, code);
+  END IF;
+  RETURN part;
+END
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,9 @@
+# backend/tests/conftest.py
+# Run from backend/: python -m pytest tests
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_DIR))
+sys.path.insert(0, str(BACKEND_DIR / "ingest"))  # the ingest scripts import each other by module name
+sys.path.insert(0, str(BACKEND_DIR.parent / "evaluation"))
@@ -0,0 +1,159 @@
+# backend/tests/test_admission.py
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import chat
+from app.models.schemas import Source
+from app.rag import rag_engine
+from app.rag.admission import ADMISSION_RETRY_AFTER, AdmissionController, Overloaded, StageLimiter
+from app.rag.rag_engine import RagEngine
+
+
+def hold(limiter, release: threading.Event):
+    """Occupies one slot of `limiter` from another thread until `release` is set."""
+    entered = threading.Event()
+
+    def run():
+        with limiter.slot():
+            entered.set()
+            release.wait(5)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    assert entered.wait(5)
+    return thread
+
+
+# --- StageLimiter ---
+
+def test_limit_bounds_concurrency():
+    limiter = StageLimiter("test", limit=2, max_queue=10, timeout=5)
+    active, peak, lock = [0], [0], threading.Lock()
+
+    def work():
+        with limiter.slot():
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.02)
+            with lock:
+                active[0] -= 1
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert peak[0] == 2
+    assert (limiter.active, limiter.waiting) == (0, 0)
+
+
+def test_full_queue_is_shed_immediately():
+    limiter = StageLimiter("test", limit=1, max_queue=0, timeout=5)
+    release = threading.Event()
+    thread = hold(limiter, release)
+    start = time.perf_counter()
+    with pytest.raises(Overloaded) as exc:
+        with limiter.slot():
+            pass
+    assert exc.value.reason == "queue_full"
+    assert time.perf_counter() - start < 1
+    release.set()
+    thread.join()
+
+
+def test_waiting_caller_times_out_or_gets_the_freed_slot():
+    limiter = StageLimiter("test", limit=1, max_queue=5, timeout=0.05)
+    release = threading.Event()
+    thread = hold(limiter, release)
+    with pytest.raises(Overloaded) as exc:
+        with limiter.slot():
+            pass
+    assert exc.value.reason == "timeout"
+
+    limiter.timeout = 5
+    threading.Timer(0.05, release.set).start()
+    with limiter.slot():
+        assert limiter.active == 1
+    thread.join()
+    assert limiter.waiting == 0
+
+
+def test_zero_limit_is_unlimited():
+    limiter = StageLimiter("test", limit=0, max_queue=0)
+    with limiter.slot(), limiter.slot():
+        assert not limiter.saturated()
+
+
+def test_request_cap():
+    controller = AdmissionController(max_in_flight=1, stage_limits={}, enabled=True)
+    with controller.request():
+        with pytest.raises(Overloaded):
+            with controller.request():
+                pass
+    with controller.request():
+        assert controller.in_flight == 1
+
+
+# --- Request path only ---
+
+def fake_engine():
+    """RagEngine without DB or models: searches return fixed candidates."""
+    engine = object.__new__(RagEngine)
+    engine._embedder = SimpleNamespace(encode=lambda query: np.zeros(3, dtype=np.float32))
+    docs = [Source(article_number=f"L{i}", content="texte", metadata={}, score=0.5, code_source="C")
+            for i in range(3)]
+    engine._vector_search = lambda *args, **kwargs: list(docs)
+    engine._keyword_search = lambda *args, **kwargs: list(docs)
+    engine._rerank = lambda query, candidates, top_k=5: candidates[:top_k]
+    return engine
+
+
+@pytest.fixture
+def saturated(monkeypatch):
+    """Admission whose rerank stage is full (one slot, taken; no queue)."""
+    controller = AdmissionController(max_in_flight=8, stage_limits={"rerank": (1, 0)}, enabled=True)
+    monkeypatch.setattr(chat, "admission", controller)
+    monkeypatch.setattr(rag_engine, "admission", controller)
+    release = threading.Event()
+    thread = hold(controller.stages["rerank"], release)
+    yield controller
+    release.set()
+    thread.join()
+
+
+def test_api_request_shed_with_503_and_retry_after(saturated, monkeypatch):
+    engine = fake_engine()
+    monkeypatch.setattr(RagEngine, "get_instance", classmethod(lambda cls: engine))
+    monkeypatch.setattr(chat, "SINGLEFLIGHT_ENABLED", False)
+    app = FastAPI()
+    app.include_router(chat.router, prefix="/api")
+
+    response = TestClient(app).post("/api/message", json={"query": "Délai de rétractation ?", "mode": "advanced"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == str(ADMISSION_RETRY_AFTER)
+    assert "rerank" in response.json()["detail"]
+    assert saturated.in_flight == 0
+
+
+def test_offline_callers_are_not_limited(saturated):
+    engine = fake_engine()
+    results = {}
+
+    def evaluate():
+        # What evaluate_rag does from its worker threads, outside any API request
+        results["advanced"] = engine.retrieve("q", mode="advanced", query_vector=[0.0])
+        results["deep"] = engine.retrieve_deep("q", depth=3, query_vector=[0.0])
+
+    thread = threading.Thread(target=evaluate)
+    thread.start()
+    thread.join()
+    assert [d.article_number for d in results["advanced"]] == ["L0", "L1", "L2"]
+    assert results["deep"]["reranked"] == ["L0", "L1", "L2"]
+    assert saturated.stages["rerank"].active == 1  # only the held slot
@@ -0,0 +1,32 @@
+# backend/tests/test_batch_embedding.py
+from batch_embedding import length_buckets
+
+
+def padded_tokens(batch, lengths):
+    return len(batch) * max(lengths[i] for i in batch)
+
+
+def test_every_index_once_longest_first():
+    lengths = [5, 300, 40, 40, 7, 120, 1]
+    batches = length_buckets(lengths, batch_size=3, max_batch_tokens=10_000)
+    flat = [i for batch in batches for i in batch]
+    assert sorted(flat) == list(range(len(lengths)))
+    assert [lengths[i] for i in flat] == sorted(lengths, reverse=True)
+    assert all(len(batch) <= 3 for batch in batches)
+
+
+def test_token_budget_isolates_long_texts():
+    lengths = [1000, 100, 100, 100, 100, 900]
+    batches = length_buckets(lengths, batch_size=16, max_batch_tokens=1000)
+    assert batches[0] == [0]  # alone, even at the budget
+    assert batches[1] == [5]  # 900 * 2 would exceed the budget
+    assert all(padded_tokens(b, lengths) <= 1000 for b in batches)
+
+
+def test_oversized_text_still_gets_a_batch():
+    batches = length_buckets([5000, 10], batch_size=16, max_batch_tokens=1000)
+    assert batches == [[0], [1]]
+
+
+def test_empty():
+    assert length_buckets([]) == []
@@ -0,0 +1,70 @@
+# backend/tests/test_bulk_loader.py
+import json
+import struct
+
+import numpy as np
+
+from bulk_loader import (COPY_HEADER, COPY_TRAILER, STAGING_COLUMNS, CopyStream, content_hash,
+                         encode_row)
+
+
+def decode_row(data: bytes):
+    """Splits one binary COPY tuple into its raw fields (None for NULL)."""
+    (count,) = struct.unpack_from(">h", data, 0)
+    offset, fields = 2, []
+    for _ in range(count):
+        (size,) = struct.unpack_from(">i", data, offset)
+        offset += 4
+        if size == -1:
+            fields.append(None)
+            continue
+        fields.append(data[offset:offset + size])
+        offset += size
+    assert offset == len(data)
+    return fields
+
+
+def test_encode_row_fields():
+    metadata = {"theme": "Contrats à distance"}
+    fields = decode_row(encode_row(3, "Code de la consommation", "L221-18", "Délai de rétractation",
+                                   metadata, [0.5, -1.0, 2.0], embedding_model="qwen"))
+    assert len(fields) == len(STAGING_COLUMNS)
+    ord_, code_source, article_number, content, jsonb, vector, digest, model = fields
+
+    assert struct.unpack(">i", ord_) == (3,)
+    assert code_source.decode("utf-8") == "Code de la consommation"
+    assert article_number == b"L221-18"
+    assert content.decode("utf-8") == "Délai de rétractation"
+    assert jsonb[:1] == b"\x01" and json.loads(jsonb[1:].decode("utf-8")) == metadata
+    assert digest.decode("ascii") == content_hash("Délai de rétractation")
+    assert model == b"qwen"
+
+    dim, unused = struct.unpack_from(">hh", vector, 0)
+    assert (dim, unused) == (3, 0)
+    assert np.frombuffer(vector[4:], dtype=">f4").tolist() == [0.5, -1.0, 2.0]
+
+
+def test_encode_row_nulls_and_json_text():
+    fields = decode_row(encode_row(0, "C", "L1", "x", '{"a": 1}', None))
+    assert fields[4] == b'\x01{"a": 1}'  # already serialized metadata is passed through
+    assert fields[5] is None  # no embedding
+    assert fields[7] is None  # no embedding model
+
+    fields = decode_row(encode_row(0, "C", "L1", "x", None, np.zeros(2, dtype=np.float32)))
+    assert fields[4] == b"\x01{}"
+    assert struct.unpack_from(">hh", fields[5], 0) == (2, 0)
+
+
+def test_copy_stream_frames_rows_in_small_reads():
+    rows = [("C", f"L{i}", f"texte {i}", {"i": i}, [float(i)]) for i in range(3)]
+    stream = CopyStream(iter(rows), embedding_model="m")
+    data = b""
+    while True:
+        chunk = stream.read(7)
+        if not chunk:
+            break
+        data += chunk
+
+    expected = COPY_HEADER + b"".join(encode_row(i, *row, embedding_model="m") for i, row in enumerate(rows))
+    assert data == expected + COPY_TRAILER
+    assert stream.count == 3
@@ -0,0 +1,77 @@
+# backend/tests/test_evaluate_rag.py
+import json
+from types import SimpleNamespace
+
+from app.models.schemas import Source
+from app.rag.rag_engine import GENERATION_ERROR_PREFIX, NO_SOURCES_ANSWER
+from evaluate_rag import Checkpoint, question_id, run_rag_pipeline, run_retrieval_only
+
+QUESTIONS = [
+    {"question": f"Question {i} ?", "reponse_attendue": "r", "article": f"Article L. 221-{i}",
+     "type_question": "factuelle"}
+    for i in range(3)
+]
+
+
+class FakeRag:
+    """Answers every question, except the ones listed in `failing` (LLM error) and `empty` (no sources)."""
+
+    def __init__(self, failing=(), empty=()):
+        self.failing = set(failing)
+        self.empty = set(empty)
+        self.calls = []
+
+    def retrieve(self, query, mode="advanced", timings=None, query_vector=None):
+        self.calls.append(query)
+        if query in self.empty:
+            return []
+        return [Source(article_number="L221-0", content="texte", metadata={}, score=1.0)]
+
+    def generate(self, query, sources, mode="advanced", timings=None):
+        if not sources:
+            return NO_SOURCES_ANSWER
+        if query in self.failing:
+            return f"{GENERATION_ERROR_PREFIX} (timeout)"
+        return "réponse"
+
+
+def test_question_id_is_stable():
+    q = {"question": "  Quel délai de rétractation ? "}
+    assert question_id({"id": 7, "question": "x"}) == "7"
+    assert question_id(q) == question_id({"question": "Quel délai de rétractation ?"})
+    assert question_id(q) != question_id({"question": "Autre question ?"})
+
+
+def test_failures_are_not_checkpointed_and_rerun_on_resume(tmp_path):
+    path = str(tmp_path / "checkpoint.jsonl")
+    failing, empty = QUESTIONS[1]["question"], QUESTIONS[2]["question"]
+
+    rag = FakeRag(failing=[failing], empty=[empty])
+    results = run_rag_pipeline(QUESTIONS, mode="naive", rag=rag, workers=2, checkpoint=Checkpoint(path))
+    assert [r["question"] for r in results] == [QUESTIONS[0]["question"]]
+    with open(path, encoding="utf-8") as f:
+        assert len(f.readlines()) == 1
+
+    rag = FakeRag()
+    results = run_rag_pipeline(QUESTIONS, mode="naive", rag=rag, workers=2, checkpoint=Checkpoint(path))
+    assert len(results) == 3
+    assert sorted(rag.calls) == sorted([failing, empty])
+
+
+def test_failed_entries_of_older_checkpoints_are_ignored(tmp_path):
+    path = tmp_path / "checkpoint.jsonl"
+    failed = {"answer": f"{GENERATION_ERROR_PREFIX} (boom)", "retrieved_articles": ["L221-0"]}
+    empty = {"answer": NO_SOURCES_ANSWER, "retrieved_articles": []}
+    ok = {"answer": "réponse", "retrieved_articles": ["L221-0"]}
+    path.write_text("".join(json.dumps({"mode": "naive", "id": qid, "result": r}) + "\n"
+                            for qid, r in (("a", failed), ("b", empty), ("c", ok))), encoding="utf-8")
+
+    checkpoint = Checkpoint(str(path))
+    assert checkpoint.get("naive", "a") is None
+    assert checkpoint.get("naive", "b") is None
+    assert checkpoint.get("naive", "c") == ok
+
+
+def test_retrieval_only_with_no_question(capsys):
+    run_retrieval_only([], SimpleNamespace(ks="1,5", depths="10", depth=10, workers=1))
+    assert "No question to evaluate" in capsys.readouterr().out
@@ -0,0 +1,56 @@
+# backend/tests/test_generation_cache.py
+import sqlite3
+
+import pytest
+
+from app.rag.generation_cache import GenerationCache, prompt_fingerprint
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return GenerationCache(path=str(tmp_path / "cache.sqlite3"), max_bytes=1000)
+
+
+def test_put_get_and_stats(cache):
+    assert cache.get("k") is None
+    cache.put("k", "m", "answer", [("Code de la consommation", "L221-18")])
+    assert cache.get("k") == "answer"
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+    assert stats["bytes_saved"] == len("answer")
+
+
+def test_purge_is_scoped_to_the_code(cache):
+    cache.put("conso", "m", "a", [("Code de la consommation", "L221-18")])
+    cache.put("civil", "m", "b", [("Code civil", "L221-18")])
+
+    assert cache.purge_articles("Code de la consommation", ["L221-18"]) == 1
+    assert cache.get("conso") is None
+    assert cache.get("civil") == "b"
+
+
+def test_lru_eviction(cache):
+    cache.put("old", "m", "x" * 600, [])
+    cache.put("new", "m", "y" * 600, [])
+    assert cache.get("old") is None
+    assert cache.get("new") == "y" * 600
+    assert cache.stats()["evictions"] == 1
+
+
+def test_legacy_dependency_table_is_dropped(tmp_path):
+    path = str(tmp_path / "legacy.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE generation_articles (key TEXT, article_number TEXT);")
+    conn.commit()
+    conn.close()
+
+    cache = GenerationCache(path=path)
+    cache.put("k", "m", "a", [("Code civil", "1240")])
+    assert cache.purge_articles("Code civil", ["1240"]) == 1
+
+
+def test_fingerprint_depends_on_source_order():
+    a = prompt_fingerprint("m", 0.3, "sys", ["s1", "s2"], "q")
+    b = prompt_fingerprint("m", 0.3, "sys", ["s2", "s1"], "q")
+    assert a != b
+    assert a == prompt_fingerprint("m", 0.3, "sys", ["s1", "s2"], "q")
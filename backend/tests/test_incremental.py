@@ -0,0 +1,73 @@
+# backend/tests/test_incremental.py
+from bulk_loader import content_hash
+from incremental import ChangeTracker, plan_changes
+
+FINGERPRINT = "model"
+
+
+class FakeConn:
+    """legal_articles of one code as {article_number: content}, read by ChangeTracker."""
+
+    def __init__(self, table, fingerprint=FINGERPRINT):
+        self.rows = [(a, content_hash(c), fingerprint) for a, c in table.items()]
+
+    def cursor(self):
+        conn = self
+
+        class Cursor:
+            def execute(self, sql, params=None):
+                pass
+
+            def fetchall(self):
+                return conn.rows
+
+            def close(self):
+                pass
+
+        return Cursor()
+
+
+def ingest_run(table, source):
+    """One streaming run: yielded articles are written, the last occurrence winning (like the pipeline)."""
+    tracker = ChangeTracker(FakeConn(table), "Code", FINGERPRINT)
+    for article_number, content in tracker.filter(source):
+        table[article_number] = content
+    return tracker.plan()
+
+
+def test_repeated_article_converges_on_its_last_occurrence():
+    source = [("L132-1", "ancien texte"), ("L221-18", "délai"), ("L132-1", "nouveau texte")]
+    table = {"L132-1": "nouveau texte", "L221-18": "délai"}
+
+    for _ in range(3):
+        plan = ingest_run(table, source)
+        assert table == {"L132-1": "nouveau texte", "L221-18": "délai"}
+        assert plan.changed == [] and plan.new == []
+        assert sorted(plan.unchanged) == ["L132-1", "L221-18"]
+
+
+def test_repeated_article_change_is_reported():
+    source = [("L132-1", "ancien texte"), ("L132-1", "nouveau texte")]
+    table = {"L132-1": "ancien texte"}
+    plan = ingest_run(table, source)
+    assert table["L132-1"] == "nouveau texte"
+    assert plan.changed == ["L132-1"]
+
+    plan = ingest_run(table, source)
+    assert table["L132-1"] == "nouveau texte"
+    assert plan.unchanged == ["L132-1"]
+
+
+def test_new_deleted_and_model_change():
+    table = {"L1": "a", "L2": "b"}
+    plan = ingest_run(table, [("L1", "a"), ("L3", "c")])
+    assert (plan.new, plan.unchanged, plan.deleted) == (["L3"], ["L1"], ["L2"])
+
+    tracker = ChangeTracker(FakeConn({"L1": "a"}, fingerprint="old-model"), "Code", FINGERPRINT)
+    assert list(tracker.filter([("L1", "a")])) == [("L1", "a")]
+    assert tracker.plan().changed == ["L1"]
+
+
+def test_plan_changes_keeps_the_last_occurrence():
+    plan = plan_changes(FakeConn({"L1": "b"}), "Code", [("L1", "a"), ("L1", "b")], FINGERPRINT)
+    assert plan.unchanged == ["L1"] and plan.to_embed == []
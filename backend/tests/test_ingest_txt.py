@@ -0,0 +1,46 @@
+# backend/tests/test_ingest_txt.py
+from pathlib import Path
+
+import pytest
+
+import ingest_txt
+from ingest_txt import CHUNK_SIZE, LOOKAHEAD, clean_file_content, iter_articles_strict, parse_articles_strict
+
+DATA_DIR = Path(__file__).resolve().parents[1] / "data"
+SOURCES = sorted(DATA_DIR.glob("code_consommation*.txt"))
+
+
+def reference(path):
+    with open(path, encoding="utf-8") as f:
+        return parse_articles_strict(clean_file_content(f.read()))
+
+
+@pytest.mark.skipif(not SOURCES, reason="no source text in backend/data")
+@pytest.mark.parametrize("path", SOURCES, ids=lambda p: p.name)
+@pytest.mark.parametrize("chunk_size", [97, 1000, LOOKAHEAD + 1, CHUNK_SIZE])
+def test_streaming_parser_matches_full_parser(path, chunk_size):
+    assert list(iter_articles_strict(path, chunk_size=chunk_size)) == reference(path)
+
+
+@pytest.mark.parametrize("lookahead", [32, LOOKAHEAD])
+def test_headers_cut_at_every_position(tmp_path, monkeypatch, lookahead):
+    """
+    Every chunk boundary position relative to the article headers, footers and form feeds.
+    A small LOOKAHEAD (still longer than a header) makes articles complete before the end of the file.
+    """
+    monkeypatch.setattr(ingest_txt, "LOOKAHEAD", lookahead)
+    text = (
+        "CODE DE LA CONSOMMATION\nPréambule\n\n"
+        "Article L. 111-1\nLe professionnel communique au consommateur...\n"
+        "Code de la consommation - Dernière modification le 01 janvier 2024\n\x0c"
+        "  Article R111-2-1a\nTexte réglementaire.\n\n"
+        "Article D. 111-3\r\nDécret.\r\n"
+        "Dans un texte, Article L. 999 n'est pas en début de ligne.\n"
+        "Article L132-1\nPremière version.\nArticle L132-1\nSeconde version.\n"
+    )
+    path = tmp_path / "code.txt"
+    path.write_bytes(text.encode("utf-8"))
+    expected = reference(path)
+    assert [a for a, _ in expected] == ["L111-1", "R111-2-1a", "D111-3", "L132-1", "L132-1"]
+    for chunk_size in range(1, len(text) + 2):
+        assert list(iter_articles_strict(path, chunk_size=chunk_size)) == expected, chunk_size
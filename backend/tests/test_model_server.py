@@ -0,0 +1,148 @@
+# backend/tests/test_model_server.py
+import asyncio
+import socket
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from app.rag.model_server import (HEADER, ModelServer, ModelServerClient, ModelServerError, pack_matrix,
+                                  pack_scores, pack_strings, unpack_matrix, unpack_scores, unpack_strings)
+
+
+class FakeEmbedder:
+    dim = 3
+
+    def __init__(self):
+        self.batches = []
+
+    def encode(self, texts, batch_size=32):
+        self.batches.append(list(texts))
+        return np.array([[len(t), 1.0, 0.0] for t in texts], dtype=np.float32)
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+
+class FakeReranker:
+    def predict(self, pairs, batch_size=32):
+        return np.array([len(q) + len(p) for q, p in pairs], dtype=np.float32)
+
+
+def start_server(url):
+    """Serves fake models from a background event loop; returns (server, stop, client)."""
+    server = ModelServer(url, threads=1, max_batch=64, batch_wait_ms=20)
+    server.embedder, server.reranker = FakeEmbedder(), FakeReranker()
+    server.models = {"embedding_model": "fake", "reranking_model": "fake"}
+    loop = asyncio.new_event_loop()
+    serve_task = loop.create_task(server.serve())
+
+    def run():
+        try:
+            loop.run_until_complete(serve_task)
+        except asyncio.CancelledError:
+            pass
+        pending = asyncio.all_tasks(loop)  # open connections
+        for task in pending:
+            task.cancel()
+        loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+        loop.close()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+
+    def stop():
+        loop.call_soon_threadsafe(serve_task.cancel)
+        thread.join()
+
+    client = ModelServerClient(url, timeout=5)
+    for _ in range(100):
+        try:
+            client.ping()
+            break
+        except ModelServerError:
+            time.sleep(0.02)
+    return server, stop, client
+
+
+@pytest.fixture
+def socket_url(tmp_path):
+    return f"unix://{tmp_path / 'models.sock'}"
+
+
+@pytest.fixture
+def served(socket_url):
+    server, stop, client = start_server(socket_url)
+    yield server, client
+    stop()
+
+
+def test_wire_format_round_trips():
+    assert unpack_strings(pack_strings(["é", "", "abc"])) == ["é", "", "abc"]
+    matrix = np.arange(6, dtype=np.float32).reshape(2, 3)
+    assert np.array_equal(unpack_matrix(pack_matrix(matrix)), matrix)
+    assert unpack_matrix(pack_matrix(np.arange(3))).shape == (1, 3)  # 1D -> one row
+    assert unpack_matrix(pack_matrix(np.zeros(0))).shape == (0, 0)
+    assert unpack_matrix(pack_matrix(np.zeros((0, 4)))).shape == (0, 4)
+    assert unpack_scores(pack_scores(np.zeros(0))).shape == (0,)
+
+
+def test_encode_rerank_and_empty_batches(served):
+    server, client = served
+    assert client.encode(["ab", "abcd"])[:, 0].tolist() == [2.0, 4.0]
+    assert client.encode([]).shape == (0, FakeEmbedder.dim)
+    assert client.rerank([("q", "pp")]).tolist() == [3.0]
+    assert client.rerank([]).shape == (0,)
+    assert all(server.embedder.batches)  # no empty batch reached the model
+
+
+def test_concurrent_requests_share_a_batch(served):
+    server, client = served
+    results = [None] * 8
+
+    def call(i):
+        results[i] = client.encode(["x" * i])
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert [r[0, 0] for r in results] == list(range(8))
+    assert len(server.embedder.batches) < 8
+
+
+def test_reconnects_after_server_restart(socket_url):
+    _, stop, client = start_server(socket_url)
+    assert client.encode(["a"]).shape == (1, 3)
+    stop()
+    _, stop, _ = start_server(socket_url)
+    try:
+        assert client.encode(["abc"])[0, 0] == 3.0  # stale connection replaced before sending
+    finally:
+        stop()
+
+
+def test_no_retry_once_the_request_was_sent(tmp_path):
+    path = str(tmp_path / "silent.sock")
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(path)
+    listener.listen()
+    received = []
+
+    def accept():
+        while True:
+            try:
+                conn, _ = listener.accept()
+            except OSError:
+                return
+            received.append(conn.recv(HEADER.size))  # reads the request, never answers
+
+    threading.Thread(target=accept, daemon=True).start()
+    client = ModelServerClient(f"unix://{path}", timeout=0.2)
+    with pytest.raises(ModelServerError, match="No response"):
+        client.encode(["a"])
+    time.sleep(0.1)
+    listener.close()
+    assert len(received) == 1
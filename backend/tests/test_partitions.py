@@ -0,0 +1,61 @@
+# backend/tests/test_partitions.py
+import pytest
+
+import partitions
+
+
+class RecordingConn:
+    """Records statements and transaction calls; the INSERT copy can be made to fail."""
+
+    def __init__(self, fail_on_copy=False):
+        self.fail_on_copy = fail_on_copy
+        self.log = []
+
+    def cursor(self):
+        conn = self
+
+        class Cursor:
+            rowcount = 0
+
+            def execute(self, sql, params=None):
+                conn.log.append(" ".join(sql.split()))
+                if conn.fail_on_copy and sql.startswith("INSERT INTO legal_articles"):
+                    raise RuntimeError('column "content_hash" does not exist')
+
+            def fetchone(self):
+                return ("r",)  # plain table: not partitioned yet
+
+            def fetchall(self):
+                return [("Code de la consommation",)] if "DISTINCT code_source" in conn.log[-1] else []
+
+            def close(self):
+                pass
+
+        return Cursor()
+
+    def commit(self):
+        self.log.append("COMMIT")
+
+    def rollback(self):
+        self.log.append("ROLLBACK")
+
+
+def test_failed_copy_rolls_back_everything(monkeypatch):
+    monkeypatch.setattr(partitions, "build_search_indexes", lambda conn: {})
+    conn = RecordingConn(fail_on_copy=True)
+    with pytest.raises(RuntimeError):
+        partitions.migrate(conn)
+    assert "COMMIT" not in conn.log
+    assert conn.log[-1] == "ROLLBACK"
+
+
+def test_legacy_columns_are_added_before_the_rename(monkeypatch):
+    built = []
+    monkeypatch.setattr(partitions, "build_search_indexes", lambda conn: built.append(True))
+    conn = RecordingConn()
+    partitions.migrate(conn)
+    add_columns = [i for i, sql in enumerate(conn.log) if "ADD COLUMN IF NOT EXISTS" in sql and "legal_articles " in sql]
+    rename = next(i for i, sql in enumerate(conn.log) if sql.startswith("ALTER TABLE legal_articles RENAME"))
+    assert add_columns and max(add_columns[:2]) < rename
+    assert conn.log.count("COMMIT") == 1 and conn.log.index("COMMIT") > rename
+    assert built == [True]
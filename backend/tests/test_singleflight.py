@@ -0,0 +1,144 @@
+# backend/tests/test_singleflight.py
+import asyncio
+import time
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.api import chat
+from app.api.singleflight import SingleFlight, request_key
+from app.models.schemas import ChatResponse, SearchFilters
+
+
+def test_request_key_normalization():
+    assert request_key("  Délai de  RÉTRACTATION ", "naive") == request_key("délai de rétractation", "naive")
+    assert request_key("q", "naive") != request_key("q", "advanced")
+    assert request_key("q", "naive", codes=["b", "a"]) == request_key("q", "naive", codes=["a", "b"])
+    assert request_key("q", "naive") != request_key("q", "naive", filters=SearchFilters(types=["L"]))
+
+
+def test_concurrent_calls_share_one_computation():
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    async def run():
+        flight = SingleFlight()
+        results = await asyncio.gather(*(flight.do("k", compute) for _ in range(10)))
+        return flight, results
+
+    flight, results = asyncio.run(run())
+    assert len(calls) == 1
+    assert [r for r, _ in results] == ["answer"] * 10
+    assert sum(shared for _, shared in results) == 9
+    assert flight.in_flight() == 0
+
+
+def test_exception_fans_out_to_every_caller():
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        raise ValueError("boom")
+
+    async def run():
+        flight = SingleFlight()
+        return await asyncio.gather(*(flight.do("k", compute) for _ in range(5)), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert all(isinstance(r, ValueError) for r in results)
+
+
+def test_joined_callers_time_out_while_the_leader_finishes():
+    async def compute():
+        await asyncio.sleep(0.2)
+        return "late"
+
+    async def run():
+        flight = SingleFlight(timeout=0.05)
+        return await asyncio.gather(*(flight.do("k", compute) for _ in range(3)), return_exceptions=True)
+
+    leader, *joined = asyncio.run(run())
+    assert leader == ("late", False)
+    assert all(isinstance(r, asyncio.TimeoutError) for r in joined)
+
+
+def test_waiters_beyond_the_cap_run_their_own_computation():
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    async def run():
+        flight = SingleFlight(max_waiters=2)
+        return await asyncio.gather(*(flight.do("k", compute) for _ in range(5)))
+
+    asyncio.run(run())
+    assert len(calls) == 3  # leader + 2 overflowing callers
+
+
+# --- Through the endpoint ---
+
+@pytest.fixture
+def api(monkeypatch):
+    """The chat router with a blocking fake pipeline (run in the threadpool like the real one)."""
+    calls = []
+    state = {"delay": 0.2, "error": None}
+
+    def answer_request(request, profile):
+        calls.append(request.query)
+        time.sleep(state["delay"])
+        if state["error"]:
+            raise state["error"]
+        return ChatResponse(answer=f"answer to {request.query}", sources=[], processing_time=0.0)
+
+    monkeypatch.setattr(chat, "answer_request", answer_request)
+    monkeypatch.setattr(chat, "single_flight", SingleFlight())
+    monkeypatch.setattr(chat, "SINGLEFLIGHT_ENABLED", True)
+    app = FastAPI()
+    app.include_router(chat.router, prefix="/api")
+    return app, calls, state
+
+
+def post_concurrently(app, bodies):
+    async def run():
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(*(client.post("/api/message", json=b) for b in bodies))
+
+    return asyncio.run(run())
+
+
+def test_identical_requests_run_the_pipeline_once(api):
+    app, calls, _ = api
+    bodies = [{"query": "Délai de rétractation ?", "mode": "naive"}] * 6
+    bodies += [{"query": "  délai de RÉTRACTATION ? ", "mode": "naive"}, {"query": "Autre ?", "mode": "naive"}]
+    responses = post_concurrently(app, bodies)
+    assert [r.status_code for r in responses] == [200] * 8
+    assert len(calls) == 2
+    assert len({r.json()["answer"] for r in responses[:7]}) == 1
+
+
+def test_joined_requests_get_504_on_timeout(api, monkeypatch):
+    app, calls, state = api
+    state["delay"] = 0.5
+    monkeypatch.setattr(chat, "single_flight", SingleFlight(timeout=0.1))
+    responses = post_concurrently(app, [{"query": "lent", "mode": "naive"}] * 3)
+    assert sorted(r.status_code for r in responses) == [200, 504, 504]
+    assert len(calls) == 1
+
+
+def test_pipeline_error_reaches_every_joined_request(api):
+    app, calls, state = api
+    state["error"] = RuntimeError("pipeline down")
+    responses = post_concurrently(app, [{"query": "q", "mode": "naive"}] * 4)
+    assert [r.status_code for r in responses] == [500] * 4
+    assert len(calls) == 1
@@ -0,0 +1,66 @@
+"""
+Fixed synthetic legal corpus for benchmarks.
+Everything is derived from a seed, so every machine benchmarks the same texts,
+article numbers and vectors.
+"""
+import math
+import random
+
+CORPUS_SEED = 1234
+CORPUS_SIZE = 2000
+EMBEDDING_DIM = 1024
+
+VOCABULARY = (
+    "consommateur professionnel contrat vente bien service délai rétractation conformité garantie "
+    "livraison remboursement prix information clause abusive paiement crédit démarchage distance "
+    "vendeur acheteur obligation défaut réparation remplacement résolution jours mois écrit support "
+    "durable commande fourniture numérique contenu producteur importateur sanction amende autorité"
+).split()
+
+QUERIES = [
+    "Que dit l'article L. 217-4 ?",
+    "Quel est le délai de rétractation pour un contrat conclu à distance ?",
+    "Le vendeur doit-il rembourser les frais de livraison ?",
+    "Article L221-28b exceptions au droit de rétractation",
+    "Quelles sanctions pour une clause abusive dans un contrat de crédit ?",
+    "garantie légale de conformité d'un bien comportant des éléments numériques",
+    "l 216-1 livraison",
+    "Le professionnel doit-il informer le consommateur du prix avant la commande ?",
+]
+
+
+def article_number(rng: random.Random, i: int) -> str:
+    prefix = rng.choice("LLLRD")
+    return f"{prefix}{111 + i // 20}-{1 + i % 20}"
+
+
+def article_text(rng: random.Random, number: str) -> str:
+    # Log-normal lengths: most articles are short, a few are very long (like the real code)
+    n_words = max(20, min(3000, int(rng.lognormvariate(4.5, 0.8))))
+    words = " ".join(rng.choice(VOCABULARY) for _ in range(n_words))
+    return f"Article {number}\n{words.capitalize()}."
+
+
+def unit_vector(rng: random.Random, dim: int = EMBEDDING_DIM):
+    v = [rng.gauss(0, 1) for _ in range(dim)]
+    norm = math.sqrt(sum(x * x for x in v))
+    return [x / norm for x in v]
+
+
+def build_corpus(size: int = CORPUS_SIZE, seed: int = CORPUS_SEED, with_vectors: bool = False):
+    """Returns a list of dicts: article_number, content, metadata (+ embedding if requested)."""
+    rng = random.Random(seed)
+    corpus = []
+    for i in range(size):
+        number = article_number(rng, i)
+        doc = {
+            "article_number": number,
+            "content": article_text(rng, number),
+            "metadata": {"theme": rng.choice(VOCABULARY), "type": number[0]},
+        }
+        corpus.append(doc)
+    if with_vectors:
+        vec_rng = random.Random(seed + 1)
+        for doc in corpus:
+            doc["embedding"] = unit_vector(vec_rng)
+    return corpus
@@ -0,0 +1,330 @@
+"""
+Replay-based load test for /api/message.
+
+Replays a query stream (JSONL / JSON file, or generated queries) against the API
+with a closed loop (N workers back-to-back) or an open loop (Poisson arrivals),
+and reports latency percentiles, throughput, error rate and the per-stage breakdown
+returned in `timings`. Results are saved as JSON so runs from different commits can be diffed.
+
+Typical local setup (no OpenAI, local Postgres):
+    docker run -d -p 5433:5432 -e POSTGRES_USER=legal_user -e POSTGRES_PASSWORD=legal_pass_dev \\
+        -e POSTGRES_DB=legal_ai -v $PWD/backend/scripts/init.sql:/docker-entrypoint-initdb.d/init.sql \\
+        pgvector/pgvector:pg16
+    python benchmarks/stub_llm.py --latency-ms 300 &
+    cd backend && POSTGRES_HOST=localhost POSTGRES_PORT=5433 OPENAI_BASE_URL=http://127.0.0.1:8089/v1 \\
+        OPENAI_API_KEY=stub GENERATION_CACHE_ENABLED=false uvicorn app.main:app --port 8000 &
+    python benchmarks/load_test.py --queries requests.jsonl --concurrency 4 --duration 60 \\
+        --mix naive=0.4,advanced=0.5,compare=0.1
+"""
+import os
+import json
+import time
+import random
+import argparse
+import threading
+import subprocess
+import urllib.request
+import urllib.error
+from pathlib import Path
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+LATE_ARRIVAL_MS = 10  # open loop: dispatch lag beyond which an arrival counts as late
+
+SYNTHETIC_TEMPLATES = [
+    "Que dit l'article L. {num} du code de la consommation ?",
+    "Quelles sont les obligations du professionnel prévues à l'article L{num} ?",
+    "Quel est le délai de rétractation pour un achat en ligne ?",
+    "Le vendeur doit-il rembourser les frais de livraison en cas de rétractation ?",
+    "Qu'est-ce qu'une clause abusive dans un contrat de consommation ?",
+    "Combien de temps dure la garantie légale de conformité ?",
+]
+
+
+# --- QUERY STREAM ---
+
+def load_queries(path: str):
+    """
+    Reads queries from a JSONL or JSON file.
+    Each item may carry "query", "question" (data_eval.json) or "title"/"body" (backlog format),
+    and optionally a "mode".
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            items = [json.loads(line) for line in f if line.strip()]
+        else:
+            items = json.load(f)
+
+    queries = []
+    for item in items:
+        if isinstance(item, str):
+            queries.append({"query": item})
+            continue
+        text = item.get("query") or item.get("question") or item.get("title") or item.get("body")
+        if text:
+            queries.append({"query": text, "mode": item.get("mode")})
+    return queries
+
+
+def generate_queries(n: int, seed: int = 0):
+    rng = random.Random(seed)
+    return [
+        {"query": rng.choice(SYNTHETIC_TEMPLATES).format(num=f"{rng.randint(111, 242)}-{rng.randint(1, 30)}")}
+        for _ in range(n)
+    ]
+
+
+def parse_mix(mix: str):
+    """"naive=0.4,advanced=0.5,compare=0.1" -> ([modes], [weights])"""
+    modes, weights = [], []
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        modes.append(name.strip())
+        weights.append(float(weight or 1))
+    return modes, weights
+
+
+# --- REQUESTS ---
+
+def send(url: str, query: str, mode: str, timeout: float, scheduled: float = None):
+    """
+    One request. `scheduled` (perf_counter time of the intended arrival, open loop) is the start
+    of the measured latency, so time spent waiting to be sent counts too.
+    """
+    body = json.dumps({"query": query, "mode": mode}).encode("utf-8")
+    req = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
+    start = time.perf_counter() if scheduled is None else scheduled
+    sample = {"mode": mode, "ok": False, "status": None, "timings": {}}
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            payload = json.loads(resp.read())
+            sample["status"] = resp.status
+            sample["ok"] = resp.status == 200
+            if payload.get("comparison"):
+                for sub_mode, result in payload["comparison"].items():
+                    for stage, ms in (result.get("timings") or {}).items():
+                        sample["timings"][f"{sub_mode}.{stage}"] = ms
+            else:
+                sample["timings"] = payload.get("timings") or {}
+    except urllib.error.HTTPError as e:
+        sample["status"] = e.code
+    except Exception as e:
+        sample["status"] = type(e).__name__
+    sample["latency_ms"] = (time.perf_counter() - start) * 1000
+    sample["end"] = time.time()
+    return sample
+
+
+def run_closed_loop(url, queries, modes, weights, concurrency, duration, max_requests, timeout, seed):
+    """N workers, each sends its next request as soon as the previous one returns."""
+    samples = []
+    lock = threading.Lock()
+    deadline = time.time() + duration
+    counter = iter(range(max_requests or 10 ** 12))
+
+    def worker(worker_id):
+        rng = random.Random(seed + worker_id)
+        while time.time() < deadline:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            q = queries[i % len(queries)]
+            mode = q.get("mode") or rng.choices(modes, weights)[0]
+            s = send(url, q["query"], mode, timeout)
+            with lock:
+                samples.append(s)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for w in range(concurrency):
+            pool.submit(worker, w)
+    return samples
+
+
+def run_open_loop(url, queries, modes, weights, rate, concurrency, duration, max_requests, timeout, seed):
+    """
+    Poisson arrivals at `rate` req/s, independent of response times.
+    Each arrival is sent from its own thread and its latency runs from its scheduled arrival time,
+    so a saturated server shows up in the tail instead of silently slowing the arrivals down
+    (coordinated omission). Arrivals finding `concurrency` requests in flight are dropped and
+    counted (0 = no cap); arrivals dispatched more than LATE_ARRIVAL_MS after schedule are counted.
+    Returns (samples, arrival stats).
+    """
+    rng = random.Random(seed)
+    samples, threads = [], []
+    lock = threading.Lock()
+    in_flight = [0]
+    stats = {"scheduled": 0, "late": 0, "dropped": 0, "max_dispatch_lag_ms": 0.0}
+
+    def fire(query, mode, scheduled):
+        s = send(url, query, mode, timeout, scheduled=scheduled)
+        with lock:
+            samples.append(s)
+            in_flight[0] -= 1
+
+    start = time.perf_counter()
+    next_arrival = start
+    i = 0
+    while not max_requests or i < max_requests:
+        next_arrival += rng.expovariate(rate)
+        if next_arrival - start >= duration:
+            break
+        delay = next_arrival - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        lag_ms = (time.perf_counter() - next_arrival) * 1000
+        stats["scheduled"] += 1
+        stats["max_dispatch_lag_ms"] = max(stats["max_dispatch_lag_ms"], lag_ms)
+        if lag_ms > LATE_ARRIVAL_MS:
+            stats["late"] += 1
+        q = queries[i % len(queries)]
+        mode = q.get("mode") or rng.choices(modes, weights)[0]
+        i += 1
+        with lock:
+            if concurrency and in_flight[0] >= concurrency:
+                stats["dropped"] += 1
+                samples.append({"mode": mode, "ok": False, "status": "dropped", "timings": {},
+                                "latency_ms": None, "end": time.time()})
+                continue
+            in_flight[0] += 1
+        t = threading.Thread(target=fire, args=(q["query"], mode, next_arrival), daemon=True)
+        t.start()
+        threads.append(t)
+    for t in threads:
+        t.join()
+    return samples, stats
+
+
+# --- REPORT ---
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    k = (len(values) - 1) * p / 100
+    lo, hi = int(k), min(int(k) + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def summarize_latencies(values):
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values) if values else None,
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+    }
+
+
+def summarize(samples, wall_time):
+    ok = [s for s in samples if s["ok"]]
+    by_mode = defaultdict(list)
+    stages = defaultdict(list)
+    for s in ok:
+        by_mode[s["mode"]].append(s["latency_ms"])
+        for stage, ms in s["timings"].items():
+            stages[f"{s['mode']}:{stage}"].append(ms)
+
+    errors = defaultdict(int)
+    for s in samples:
+        if not s["ok"]:
+            errors[str(s["status"])] += 1
+
+    return {
+        "requests": len(samples),
+        "wall_time_s": wall_time,
+        "throughput_rps": len(ok) / wall_time if wall_time else 0.0,
+        "error_rate": (len(samples) - len(ok)) / len(samples) if samples else 0.0,
+        "errors": dict(errors),
+        "latency_ms": summarize_latencies([s["latency_ms"] for s in ok]),
+        "latency_ms_by_mode": {m: summarize_latencies(v) for m, v in sorted(by_mode.items())},
+        "stages_ms": {k: summarize_latencies(v) for k, v in sorted(stages.items())},
+    }
+
+
+def print_report(summary):
+    lat = summary["latency_ms"]
+    print("\n" + "=" * 60)
+    print("📊 LOAD TEST")
+    print("=" * 60)
+    print(f"Requests: {summary['requests']} | Throughput: {summary['throughput_rps']:.2f} req/s | "
+          f"Errors: {summary['error_rate']:.1%} {summary['errors'] or ''}")
+    if lat["count"]:
+        print(f"Latency (ms): p50={lat['p50']:.0f} p95={lat['p95']:.0f} p99={lat['p99']:.0f}")
+    arrivals = summary.get("arrivals")
+    if arrivals:
+        print(f"Arrivals: {arrivals['scheduled']} scheduled | {arrivals['late']} late (>{LATE_ARRIVAL_MS}ms) | "
+              f"{arrivals['dropped']} dropped (in-flight cap) | max lag {arrivals['max_dispatch_lag_ms']:.1f}ms")
+
+    print(f"\n{'Stage':<40} {'n':>6} {'p50':>10} {'p95':>10} {'p99':>10}")
+    print("-" * 80)
+    for stage, st in summary["stages_ms"].items():
+        print(f"{stage:<40} {st['count']:>6} {st['p50']:>10.1f} {st['p95']:>10.1f} {st['p99']:>10.1f}")
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay load test for /api/message")
+    parser.add_argument("--url", default="http://127.0.0.1:8000/api/message")
+    parser.add_argument("--queries", help="JSONL/JSON query file (default: generated queries)")
+    parser.add_argument("--generate", type=int, default=200, help="Number of generated queries when --queries is not set")
+    parser.add_argument("--mix", default="naive=0.5,advanced=0.5", help="Mode mix, e.g. naive=0.4,advanced=0.5,compare=0.1")
+    parser.add_argument("--loop", choices=["closed", "open"], default="closed")
+    parser.add_argument("--concurrency", type=int, default=4,
+                        help="Workers (closed) or max in-flight before arrivals are dropped (open, 0 = no cap)")
+    parser.add_argument("--rate", type=float, default=2.0, help="Arrival rate in req/s (open loop)")
+    parser.add_argument("--duration", type=float, default=60.0, help="Test duration in seconds")
+    parser.add_argument("--max-requests", type=int, default=0)
+    parser.add_argument("--warmup", type=int, default=2, help="Requests sent (and ignored) before measuring")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Result file (default: benchmarks/results/load_<time>_<commit>.json)")
+    args = parser.parse_args()
+
+    queries = load_queries(args.queries) if args.queries else generate_queries(args.generate, args.seed)
+    if not queries:
+        print("No queries to replay.")
+        return
+    modes, weights = parse_mix(args.mix)
+    print(f"📋 {len(queries)} queries | {args.loop} loop | mix={args.mix}")
+
+    for q in queries[:args.warmup]:
+        send(args.url, q["query"], modes[0], args.timeout)
+
+    start = time.time()
+    arrivals = None
+    if args.loop == "closed":
+        samples = run_closed_loop(args.url, queries, modes, weights, args.concurrency,
+                                  args.duration, args.max_requests, args.timeout, args.seed)
+    else:
+        samples, arrivals = run_open_loop(args.url, queries, modes, weights, args.rate, args.concurrency,
+                                          args.duration, args.max_requests, args.timeout, args.seed)
+    wall_time = time.time() - start
+
+    summary = summarize(samples, wall_time)
+    if arrivals is not None:
+        summary["arrivals"] = arrivals
+    print_report(summary)
+
+    commit = git_commit()
+    output = args.output or str(RESULTS_DIR / f"load_{time.strftime('%Y%m%d_%H%M%S')}_{commit or 'nogit'}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({
+            "commit": commit,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "config": vars(args),
+            "summary": summary,
+        }, f, ensure_ascii=False, indent=2)
+    print(f"\n✅ Results saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+"""
+Stage-level microbenchmarks for the hot functions of RagEngine.
+
+    python benchmarks/microbench.py                     # run and compare with the stored baseline
+    python benchmarks/microbench.py --save-baseline     # overwrite benchmarks/baselines/microbench.json
+    python benchmarks/microbench.py --only rerank       # run a subset
+    python benchmarks/microbench.py --seed-db           # load the synthetic corpus into a scratch DB first
+
+Exit code is 1 when a benchmark is slower than its baseline by more than --threshold, or when
+there is no baseline to compare with (benchmarks/baselines/microbench.json holds the pure and
+filters groups; add the model/DB groups on a machine that has them).
+DB benchmarks need POSTGRES_* pointing at a scratch database (never the real legal_ai DB);
+model benchmarks need the Hugging Face models in the local cache. Missing pieces are skipped.
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import statistics
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent / "backend"))
+sys.path.insert(0, str(BENCH_DIR))
+
+import numpy as np  # noqa: E402
+from corpus import build_corpus, QUERIES, CORPUS_SIZE  # noqa: E402
+from app.rag.filters import is_empty  # noqa: E402
+
+BASELINE_FILE = BENCH_DIR / "baselines" / "microbench.json"
+PROTECTED_DBS = {"legal_ai"}
+
+
+# --- TIMING ---
+
+def measure(fn, repeat: int = 5, min_time: float = 0.2):
+    """
+    timeit-style: calibrates the number of calls so each run lasts at least `min_time`,
+    then returns per-call seconds (best and median of `repeat` runs).
+    """
+    fn()  # warm-up (lazy model loading, caches)
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or number >= 1_000_000:
+            break
+        number *= 10 if elapsed < min_time / 10 else 2
+
+    runs = [elapsed / number]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        runs.append((time.perf_counter() - start) / number)
+    return {"best_s": min(runs), "median_s": statistics.median(runs), "calls": number}
+
+
+def calibration():
+    """Pure-Python reference loop, used to normalize results across machines."""
+    total = 0
+    for i in range(100_000):
+        total += i * i % 7
+    return total
+
+
+# --- IN-PROCESS FILTER INDEX ---
+
+# First number of an article: "L221-18" -> 221 (book 2, title 2, chapter 1)
+ARTICLE_MAJOR_PATTERN = re.compile(r"\d+")
+
+
+def article_type(article_number: str) -> str:
+    """L (législative), R (réglementaire), D (décret)... Same as the article_type generated column."""
+    return article_number[:1].upper()
+
+
+def article_major(article_number: str):
+    """Same as the article_major generated column."""
+    match = ARTICLE_MAJOR_PATTERN.search(article_number)
+    return int(match.group(0)) if match else None
+
+
+class FilterIndex:
+    """
+    Reference in-process pre-filter (the API filters in SQL, see app.rag.filters.filter_sql),
+    benchmarked against the same corpus: one boolean bitmap per field value is computed once,
+    so a filter is a few vectorized AND/OR over the corpus instead of a Python loop per query.
+    `articles` are (code_source, article_number, metadata) in index order.
+    """
+
+    def __init__(self, articles):
+        self.size = len(articles)
+        self.bitmaps = {"code": {}, "theme": {}, "type": {}}
+        majors = np.full(self.size, -1, dtype=np.int64)
+        for i, (code_source, article_number, metadata) in enumerate(articles):
+            self._set("code", code_source, i)
+            self._set("theme", (metadata or {}).get("theme"), i)
+            self._set("type", article_type(article_number), i)
+            major = article_major(article_number)
+            if major is not None:
+                majors[i] = major
+        self.majors = majors
+        self._cache = {}
+
+    def _set(self, field, value, i):
+        if value is None:
+            return
+        bitmap = self.bitmaps[field].get(value)
+        if bitmap is None:
+            bitmap = self.bitmaps[field][value] = np.zeros(self.size, dtype=bool)
+        bitmap[i] = True
+
+    def _any(self, field, values):
+        mask = np.zeros(self.size, dtype=bool)
+        for value in values:
+            bitmap = self.bitmaps[field].get(value)
+            if bitmap is not None:
+                mask |= bitmap
+        return mask
+
+    def mask(self, codes=None, filters=None):
+        """Boolean mask of the allowed rows, or None when nothing is filtered. Masks are memoized."""
+        if is_empty(codes, filters):
+            return None
+        key = json.dumps([sorted(codes or []), filters.model_dump() if filters else None], sort_keys=True)
+        if key in self._cache:
+            return self._cache[key]
+
+        mask = np.ones(self.size, dtype=bool)
+        if codes:
+            mask &= self._any("code", codes)
+        if filters is not None:
+            if filters.themes:
+                mask &= self._any("theme", filters.themes)
+            if filters.types:
+                mask &= self._any("type", [t.upper() for t in filters.types])
+            if filters.books:
+                mask &= np.isin(self.majors // 100, list(filters.books)) & (self.majors >= 0)
+            if filters.range_from is not None:
+                mask &= self.majors >= filters.range_from
+            if filters.range_to is not None:
+                mask &= (self.majors <= filters.range_to) & (self.majors >= 0)
+        self._cache[key] = mask
+        return mask
+
+    def allowed(self, codes=None, filters=None):
+        mask = self.mask(codes, filters)
+        return None if mask is None else np.flatnonzero(mask).tolist()
+
+
+# --- BENCHMARKS ---
+
+def make_engine():
+    from app.rag.rag_engine import RagEngine
+    # Bypass the singleton initialization: the DB pool is only created if a DB benchmark runs
+    return object.__new__(RagEngine)
+
+
+def make_sources(corpus, n):
+    from app.models.schemas import Source
+    return [
+        Source(article_number=d["article_number"], content=d["content"], metadata=d["metadata"], score=0.5)
+        for d in corpus[:n]
+    ]
+
+
+def bench_pure(engine, corpus, results):
+    from app.models.schemas import ChatResponse
+
+    results["calibration"] = measure(calibration)
+    results["extract_article_id"] = measure(lambda: [engine._extract_article_id(q) for q in QUERIES])
+
+    vector_docs = make_sources(corpus, 25)
+    keyword_docs = make_sources(corpus[15:], 25)
+    results["fuse_25x25"] = measure(lambda: engine._fuse(vector_docs, keyword_docs))
+
+    sources = make_sources(corpus, 5)
+    response = ChatResponse(answer="x" * 800, sources=sources, processing_time=1.0, timings={"total": 1.0})
+    results["source_serialization_5"] = measure(lambda: response.model_dump_json())
+
+
+def bench_filters(engine, corpus, results):
+    from app.models.schemas import SearchFilters
+
+    articles = [("Benchmark", d["article_number"], d["metadata"]) for d in corpus]
+    results["filter_index_build"] = measure(lambda: FilterIndex(articles), repeat=3)
+    index = FilterIndex(articles)
+    theme = corpus[0]["metadata"]["theme"]
+    filters = SearchFilters(themes=[theme], types=["L", "R"], range_from=120, range_to=140)
+    # Fresh index per call would time the build: clear the memoized masks instead
+    results["filter_mask"] = measure(lambda: (index._cache.clear(), index.mask(filters=filters)))
+
+
+def bench_encode(engine, corpus, results):
+    texts = [d["content"][:2000] for d in corpus]
+    for batch in (1, 8, 32):
+        chunk = texts[:batch]
+        results[f"encode_batch_{batch}"] = measure(lambda: engine.embedder.encode(chunk), repeat=3)
+
+
+def bench_rerank(engine, corpus, results):
+    for n in (10, 25, 50):
+        candidates = make_sources(corpus, n)
+        results[f"rerank_{n}"] = measure(lambda: engine._rerank(QUERIES[1], candidates, top_k=5), repeat=3)
+
+
+def bench_db(engine, corpus, results):
+    # The search helpers swallow DB errors: fail here instead of timing the error path
+    engine.release_db_connection(engine.get_db_connection())
+    query_vector = corpus[0]["embedding"]
+    results["vector_search_25"] = measure(lambda: engine._vector_search(query_vector, limit=25))
+    results["keyword_search_25"] = measure(lambda: [engine._keyword_search(q, limit=25) for q in QUERIES])
+
+
+def seed_db(corpus):
+    """Loads the synthetic corpus (with random unit vectors) into the configured scratch DB."""
+    import psycopg2
+    from app.rag.rag_engine import DB_CONFIG
+    if DB_CONFIG["dbname"] in PROTECTED_DBS:
+        raise SystemExit(f"Refusing to seed '{DB_CONFIG['dbname']}': set POSTGRES_DB to a scratch database.")
+
+    conn = psycopg2.connect(**DB_CONFIG)
+    cur = conn.cursor()
+    init_sql = (BENCH_DIR.parent / "backend" / "scripts" / "init.sql").read_text(encoding="utf-8")
+    cur.execute(init_sql)
+    cur.execute("TRUNCATE TABLE legal_articles;")
+    cur.execute("SELECT legal_articles_ensure_partition(%s);", ("Benchmark",))
+    for d in corpus:
+        cur.execute(
+            "INSERT INTO legal_articles (code_source, article_number, content, metadata, embedding) "
+            "VALUES (%s, %s, %s, %s, %s);",
+            ("Benchmark", d["article_number"], d["content"], json.dumps(d["metadata"]), d["embedding"])
+        )
+    conn.commit()
+    cur.execute("ANALYZE legal_articles;")
+    cur.close()
+    conn.close()
+    print(f"Seeded {len(corpus)} synthetic articles into {DB_CONFIG['dbname']}.")
+
+
+GROUPS = [
+    ("pure", bench_pure),
+    ("filters", bench_filters),
+    ("encode", bench_encode),
+    ("rerank", bench_rerank),
+    ("db", bench_db),
+]
+
+
+# --- BASELINE COMPARISON ---
+
+def compare(results, baseline, threshold, normalize):
+    """Returns (benchmarks slower than baseline * (1 + threshold), benchmarks without a baseline)."""
+    scale = 1.0
+    if normalize and "calibration" in results and "calibration" in baseline:
+        # Slower machine -> larger calibration time -> expected times scale up too
+        scale = results["calibration"]["best_s"] / baseline["calibration"]["best_s"]
+        print(f"Machine speed factor vs baseline: {scale:.2f}")
+
+    regressions, missing = [], []
+    print(f"\n{'Benchmark':<28} {'baseline':>12} {'current':>12} {'delta':>9}")
+    print("-" * 65)
+    for name, current in results.items():
+        if name == "calibration":
+            continue
+        if name not in baseline:
+            missing.append(name)
+            print(f"{name:<28} {'-':>12} {current['best_s'] * 1e3:>10.3f}ms {'no baseline':>9}  ⚠️")
+            continue
+        expected = baseline[name]["best_s"] * scale
+        delta = current["best_s"] / expected - 1
+        flag = "  ⚠️" if delta > threshold else ""
+        print(f"{name:<28} {expected * 1e3:>10.3f}ms {current['best_s'] * 1e3:>10.3f}ms {delta:>+8.1%}{flag}")
+        if delta > threshold:
+            regressions.append(name)
+    return regressions, missing
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RagEngine microbenchmarks")
+    parser.add_argument("--only", help="Comma-separated groups: pure, filters, encode, rerank, db")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--baseline", default=str(BASELINE_FILE))
+    parser.add_argument("--threshold", type=float, default=0.20, help="Allowed slowdown (0.20 = 20%%)")
+    parser.add_argument("--no-normalize", action="store_true", help="Compare raw times, without machine calibration")
+    parser.add_argument("--seed-db", action="store_true", help="Load the synthetic corpus into the scratch DB first")
+    args = parser.parse_args()
+
+    corpus = build_corpus(CORPUS_SIZE, with_vectors=True)
+    if args.seed_db:
+        seed_db(corpus)
+
+    engine = make_engine()
+    selected = [s.strip() for s in args.only.split(",")] if args.only else None
+
+    results = {}
+    for group, fn in GROUPS:
+        if selected and group not in selected:
+            continue
+        group_results = {}
+        try:
+            fn(engine, corpus, group_results)
+        except Exception as e:
+            print(f"⏭️  Skipping '{group}': {type(e).__name__}: {e}")
+            continue
+        for name, r in group_results.items():
+            print(f"{name:<28} best={r['best_s'] * 1e3:10.3f}ms  median={r['median_s'] * 1e3:10.3f}ms  ({r['calls']} calls)")
+        results.update(group_results)
+
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, "r", encoding="utf-8") as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"\n✅ Baseline saved to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"\n❌ No baseline at {args.baseline}: nothing was compared. Run with --save-baseline first.")
+        sys.exit(1)
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+
+    regressions, missing = compare(results, baseline, args.threshold, not args.no_normalize)
+    if missing:
+        print(f"\n⚠️  {len(missing)} benchmark(s) NOT compared, no baseline entry: {', '.join(missing)}"
+              f"\n   Record them with --save-baseline --only <group>.")
+    if regressions:
+        print(f"\n❌ {len(regressions)} regression(s) beyond {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+    if not results:
+        print("\n❌ No benchmark ran: nothing was compared.")
+        sys.exit(1)
+    print("\n✅ No regression." if not missing else "\n✅ No regression among the compared benchmarks.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""
+Filtered vector search: one HNSW index over every code (post-filtering) vs one partition
+and HNSW index per code (partition pruning), on a synthetic multi-code corpus.
+
+    python benchmarks/partition_bench.py                        # 5 codes x 2000 articles
+    python benchmarks/partition_bench.py --codes 10 --per-code 5000 --ef-search 100
+
+Reports latency percentiles and recall@k against an exact (sequential scan) search with the
+same filter. Needs POSTGRES_* pointing at a scratch database with pgvector (never legal_ai);
+the bench_* tables are dropped at the end unless --keep is given.
+"""
+import io
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import statistics
+import subprocess
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent / "backend"))
+sys.path.insert(0, str(BENCH_DIR))
+
+from corpus import unit_vector  # noqa: E402
+
+RESULTS_DIR = BENCH_DIR / "results"
+PROTECTED_DBS = {"legal_ai"}
+SINGLE_TABLE = "bench_single"
+PARTITIONED_TABLE = "bench_partitioned"
+
+
+def build_vectors(codes, per_code, dim, topics, seed):
+    """
+    Rows (id, code, vector). Topics are shared by every code (like real codes that all talk about
+    contracts, deadlines...), so a filtered search competes with close neighbours from other codes.
+    """
+    rng = random.Random(seed)
+    centroids = [unit_vector(rng, dim) for _ in range(topics)]
+    rows = []
+    for c in range(codes):
+        for _ in range(per_code):
+            center = rng.choice(centroids)
+            v = [x + rng.gauss(0, 0.6 / dim ** 0.5) for x in center]
+            rows.append((len(rows) + 1, f"Code {c}", v))
+    return rows
+
+
+def vector_literal(v):
+    return "[" + ",".join(f"{x:.6f}" for x in v) + "]"
+
+
+def create_tables(conn, rows, codes, dim, m, ef_construction):
+    cur = conn.cursor()
+    cur.execute("CREATE EXTENSION IF NOT EXISTS vector;")
+    cur.execute(f"DROP TABLE IF EXISTS {SINGLE_TABLE}, {PARTITIONED_TABLE};")
+    cur.execute(f"CREATE TABLE {SINGLE_TABLE} (id int, code_source text, embedding vector({dim}));")
+    cur.execute(f"CREATE TABLE {PARTITIONED_TABLE} (id int, code_source text, embedding vector({dim})) "
+                f"PARTITION BY LIST (code_source);")
+    for c in range(codes):
+        cur.execute(f"CREATE TABLE {PARTITIONED_TABLE}_{c} PARTITION OF {PARTITIONED_TABLE} FOR VALUES IN (%s);",
+                    (f"Code {c}",))
+
+    data = "".join(f"{i}\t{code}\t{vector_literal(v)}\n" for i, code, v in rows)
+    builds = {}
+    for table in (SINGLE_TABLE, PARTITIONED_TABLE):
+        cur.copy_expert(f"COPY {table} (id, code_source, embedding) FROM STDIN", io.StringIO(data))
+        start = time.time()
+        cur.execute(f"CREATE INDEX ON {table} USING hnsw (embedding vector_cosine_ops) "
+                    f"WITH (m = {m}, ef_construction = {ef_construction});")
+        cur.execute(f"CREATE INDEX ON {table} (code_source);")
+        builds[table] = time.time() - start
+        cur.execute(f"ANALYZE {table};")
+    conn.commit()
+    cur.close()
+    return builds
+
+
+def search(cur, table, query, codes, k, ef_search, exact=False):
+    """One transaction per search: the SET LOCAL settings end with it."""
+    if exact:
+        cur.execute("SET LOCAL enable_indexscan = off;")
+    else:
+        cur.execute("SET LOCAL hnsw.ef_search = %s;", (ef_search,))
+    start = time.perf_counter()
+    cur.execute(
+        f"SELECT id FROM {table} WHERE code_source = ANY(%s) ORDER BY embedding <=> %s::vector LIMIT %s;",
+        (codes, query, k)
+    )
+    ids = [row[0] for row in cur.fetchall()]
+    elapsed = time.perf_counter() - start
+    cur.connection.commit()
+    return ids, elapsed
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def run(conn, rows, codes, args):
+    rng = random.Random(args.seed + 1)
+    cur = conn.cursor()
+    filters = {"1 code": 1, "2 codes": min(2, codes)}
+    report = {}
+    for label, n_codes in filters.items():
+        samples = {SINGLE_TABLE: [], PARTITIONED_TABLE: []}
+        recalls = {SINGLE_TABLE: [], PARTITIONED_TABLE: []}
+        for _ in range(args.queries):
+            selected = [f"Code {c}" for c in rng.sample(range(codes), n_codes)]
+            base = rng.choice(rows)[2]
+            query = vector_literal([x + rng.gauss(0, 0.3 / args.dim ** 0.5) for x in base])
+            truth, _ = search(cur, SINGLE_TABLE, query, selected, args.k, args.ef_search, exact=True)
+            for table in (SINGLE_TABLE, PARTITIONED_TABLE):
+                ids, elapsed = search(cur, table, query, selected, args.k, args.ef_search)
+                samples[table].append(elapsed * 1000)
+                recalls[table].append(len(set(ids) & set(truth)) / max(1, len(truth)))
+        report[label] = {
+            table: {
+                "p50_ms": percentile(samples[table], 50),
+                "p95_ms": percentile(samples[table], 95),
+                "mean_ms": statistics.mean(samples[table]),
+                "recall": statistics.mean(recalls[table]),
+            }
+            for table in samples
+        }
+    cur.close()
+    return report
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Partitioned vs single-table filtered vector search")
+    parser.add_argument("--codes", type=int, default=5)
+    parser.add_argument("--per-code", type=int, default=2000)
+    parser.add_argument("--dim", type=int, default=256, help="Vector size (1024 in production, slower to seed)")
+    parser.add_argument("--topics", type=int, default=50)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--ef-search", type=int, default=40)
+    parser.add_argument("--m", type=int, default=16)
+    parser.add_argument("--ef-construction", type=int, default=64)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep", action="store_true", help="Keep the bench_* tables")
+    parser.add_argument("--output", help="Result file (default: benchmarks/results/partitions_<time>_<commit>.json)")
+    args = parser.parse_args()
+
+    import psycopg2
+    from app.rag.rag_engine import DB_CONFIG
+    if DB_CONFIG["dbname"] in PROTECTED_DBS:
+        raise SystemExit(f"Refusing to run on '{DB_CONFIG['dbname']}': set POSTGRES_DB to a scratch database.")
+
+    print(f"🧪 {args.codes} codes x {args.per_code} articles, dim={args.dim}, k={args.k}, ef_search={args.ef_search}")
+    rows = build_vectors(args.codes, args.per_code, args.dim, args.topics, args.seed)
+    conn = psycopg2.connect(**DB_CONFIG)
+    try:
+        builds = create_tables(conn, rows, args.codes, args.dim, args.m, args.ef_construction)
+        report = run(conn, rows, args.codes, args)
+    finally:
+        if not args.keep:
+            conn.rollback()
+            cur = conn.cursor()
+            cur.execute(f"DROP TABLE IF EXISTS {SINGLE_TABLE}, {PARTITIONED_TABLE};")
+            conn.commit()
+            cur.close()
+        conn.close()
+
+    print(f"\n{'Filter':<10} {'Setup':<20} {'p50':>9} {'p95':>9} {'mean':>9} {'recall@' + str(args.k):>10}")
+    print("-" * 72)
+    for label, tables in report.items():
+        for table, st in tables.items():
+            name = "single table" if table == SINGLE_TABLE else "partitioned"
+            print(f"{label:<10} {name:<20} {st['p50_ms']:>7.2f}ms {st['p95_ms']:>7.2f}ms "
+                  f"{st['mean_ms']:>7.2f}ms {st['recall']:>10.3f}")
+    print(f"\nIndex builds: single {builds[SINGLE_TABLE]:.1f}s, partitioned {builds[PARTITIONED_TABLE]:.1f}s")
+
+    commit = git_commit()
+    output = args.output or str(RESULTS_DIR / f"partitions_{time.strftime('%Y%m%d_%H%M%S')}_{commit or 'nogit'}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({
+            "commit": commit,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "config": vars(args),
+            "index_build_s": builds,
+            "results": report,
+        }, f, ensure_ascii=False, indent=2)
+    print(f"\n✅ Results saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Minimal OpenAI-compatible stub for load tests.
+Answers POST /v1/chat/completions with a canned French answer after a fixed delay,
+so the API can be benchmarked without OpenAI cost or network jitter.
+
+Usage:
+    python benchmarks/stub_llm.py --port 8089 --latency-ms 300
+    OPENAI_BASE_URL=http://127.0.0.1:8089/v1 OPENAI_API_KEY=stub uvicorn app.main:app
+"""
+import re
+import json
+import time
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    latency_s = 0.3
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_error(404)
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        messages = payload.get("messages", [])
+        prompt = " ".join(m.get("content", "") for m in messages)
+
+        time.sleep(self.latency_s)
+
+        cited = re.findall(r"--- ARTICLE (\S+) ---", prompt)[:2]
+        answer = "Réponse simulée." + (f" Selon l'article {cited[0]}, la règle s'applique." if cited else "")
+        prompt_tokens = len(prompt) // 4
+        completion_tokens = len(answer) // 4
+        body = json.dumps({
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": answer},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
+            }
+        }).encode("utf-8")
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI-compatible stub LLM")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=300)
+    args = parser.parse_args()
+
+    StubHandler.latency_s = args.latency_ms / 1000
+    server = ThreadingHTTPServer((args.host, args.port), StubHandler)
+    print(f"Stub LLM listening on http://{args.host}:{args.port}/v1 ({args.latency_ms:.0f}ms per call)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
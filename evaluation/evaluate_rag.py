@@ -7,21 +7,14 @@ import json
 import time
 import os
 import sys
+import argparse
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # Add backend to path
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
-print('import de datasets')
-from datasets import Dataset
-print('import de ragas')
-from ragas import evaluate
-print('import de metrics')
-from ragas.metrics import (
-    faithfulness,
-    answer_relevancy,
-    context_precision,
-    context_recall,
-)
-
+EVAL_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(EVAL_DIR, '..', 'backend'))
 # Load environment variables
 from dotenv import load_dotenv
 load_dotenv()
@@ -31,52 +24,274 @@ def load_test_data(filepath: str):
     with open(filepath, 'r', encoding='utf-8') as f:
         return json.load(f)
 
-def run_rag_pipeline(questions: list, mode: str = "advanced"):
-    """Run RAG pipeline on all questions and collect results"""
-    print('import de RagEngine')
-    from backend.app.rag.rag_engine import RagEngine
-    
-    rag = RagEngine.get_instance()
-    results = []
-    
+class RateLimiter:
+    """Spaces calls at least 1/rate seconds apart, across all worker threads."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate and rate > 0 else 0.0
+        self.next_slot = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def failure_reason(result: dict):
+    """Why a result must not be scored (nor checkpointed), or None for a real answer."""
+    from app.rag.rag_engine import GENERATION_ERROR_PREFIX
+    if not result.get('retrieved_articles'):
+        return "no sources retrieved"
+    if result.get('answer', '').startswith(GENERATION_ERROR_PREFIX):
+        return result['answer']
+    return None
+
+
+class Checkpoint:
+    """
+    Append-only JSONL of successful results, keyed by (mode, question id).
+    Failed results are never written, so a resumed run retries them.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.done = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # partially written last line of an interrupted run
+                    if failure_reason(entry['result']) is None:  # written by an older version
+                        self.done[(entry['mode'], entry['id'])] = entry['result']
+
+    def get(self, mode: str, qid):
+        return self.done.get((mode, qid))
+
+    def save(self, mode: str, qid, result: dict):
+        if failure_reason(result) is not None:
+            return
+        with self.lock:
+            self.done[(mode, qid)] = result
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({"mode": mode, "id": qid, "result": result}, ensure_ascii=False) + "\n")
+                f.flush()
+
+
+def question_id(q: dict) -> str:
+    """Stable across edits of the dataset: the explicit id, else a hash of the question text."""
+    if q.get('id') is not None:
+        return str(q['id'])
+    return hashlib.sha1(q['question'].strip().encode('utf-8')).hexdigest()[:16]
+
+
+def run_question(rag, q: dict, mode: str, query_vector, limiter: RateLimiter):
+    """Retrieve + generate for one question (thread-safe: RagEngine uses a threaded pool)."""
+    timings = {}
+    start = time.time()
+
+    # Retrieve sources (embedding shared across modes)
+    sources = rag.retrieve(q['question'], mode=mode, timings=timings, query_vector=query_vector)
+
+    # Generate answer
+    limiter.wait()
+    answer = rag.generate(q['question'], sources, mode=mode, timings=timings)
+
+    latency = time.time() - start
+
+    # Extract article numbers and content from sources
+    retrieved_articles = [s.article_number for s in sources]
+    contexts = [s.content for s in sources]
+
+    result = {
+        "question": q['question'],
+        "answer": answer,
+        "contexts": contexts,
+        "ground_truth": q['reponse_attendue'],
+        "expected_article": q['article'],
+        "retrieved_articles": retrieved_articles,
+        "question_type": q['type_question'],
+        "latency_ms": latency * 1000,
+        "timings": timings
+    }
+    # Fallback answers (retrieval or LLM failure) would be scored as wrong answers
+    reason = failure_reason(result)
+    if reason is not None:
+        raise RuntimeError(reason)
+    return result
+
+
+def run_rag_pipeline(questions: list, mode: str = "advanced", rag=None, query_vectors: list = None,
+                     workers: int = 4, limiter: RateLimiter = None, checkpoint: Checkpoint = None):
+    """Run RAG pipeline on all questions concurrently and collect results (in question order)"""
+    if rag is None:
+        print('import de RagEngine')
+        from app.rag.rag_engine import RagEngine
+        rag = RagEngine.get_instance()
+    limiter = limiter or RateLimiter(0)
+
     print(f"\n{'='*60}")
-    print(f"Running {mode.upper()} mode on {len(questions)} questions...")
+    print(f"Running {mode.upper()} mode on {len(questions)} questions ({workers} workers)...")
     print('='*60)
-    
+
+    results = [None] * len(questions)
+    pending = []
     for i, q in enumerate(questions):
-        print(f"\n[{i+1}/{len(questions)}] {q['question'][:60]}...")
-        
-        start = time.time()
-        
-        # Retrieve sources
-        sources = rag.retrieve(q['question'], mode=mode)
-        
-        # Generate answer
-        answer = rag.generate(q['question'], sources)
-        
-        latency = time.time() - start
-        
-        # Extract article numbers and content from sources
-        retrieved_articles = [s.article_number for s in sources]
-        contexts = [s.content for s in sources]
-        
-        results.append({
-            "question": q['question'],
-            "answer": answer,
-            "contexts": contexts,
-            "ground_truth": q['reponse_attendue'],
-            "expected_article": q['article'],
-            "retrieved_articles": retrieved_articles,
-            "question_type": q['type_question'],
-            "latency_ms": latency * 1000
-        })
-        
-        # Quick feedback
-        expected_id = q['article'].replace("Article L. ", "L").replace("Article L.", "L").replace(" ", "")
-        hit = any(expected_id in art for art in retrieved_articles)
-        print(f"   → Hit: {'✅' if hit else '❌'} | Retrieved: {retrieved_articles[:3]} | {latency*1000:.0f}ms")
-    
-    return results
+        cached = checkpoint.get(mode, question_id(q)) if checkpoint else None
+        if cached is not None:
+            results[i] = cached
+        else:
+            pending.append(i)
+    if len(pending) < len(questions):
+        print(f"   ↩️  Resuming: {len(questions) - len(pending)} results loaded from checkpoint")
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(run_question, rag, questions[i], mode,
+                        query_vectors[i] if query_vectors else None, limiter): i
+            for i in pending
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            i = futures[future]
+            q = questions[i]
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"\n[{done}/{len(pending)}] ❌ {q['question'][:60]}... failed: {e}")
+                continue
+            results[i] = result
+            if checkpoint:
+                checkpoint.save(mode, question_id(q), result)
+
+            # Quick feedback
+            expected_id = normalize_article_id(q['article'])
+            hit = any(expected_id in art for art in result['retrieved_articles'])
+            print(f"\n[{done}/{len(pending)}] {q['question'][:60]}...")
+            print(f"   → Hit: {'✅' if hit else '❌'} | Retrieved: {result['retrieved_articles'][:3]} | {result['latency_ms']:.0f}ms")
+
+    # Failed questions are left out (they will be retried on the next run)
+    return [r for r in results if r is not None]
+
+def normalize_article_id(article: str) -> str:
+    return article.replace("Article L. ", "L").replace("Article L.", "L").replace(" ", "")
+
+def ranking_metrics(rankings: list, expected: list, ks: list) -> dict:
+    """
+    recall@k (= hit rate, one relevant article per question), MRR@k and nDCG@k
+    for every k at once, from the rank of the first relevant article.
+    """
+    import numpy as np
+
+    depth = max(ks)
+    n = len(rankings)
+    # relevance[i, r] is True when the article at rank r answers question i
+    relevance = np.zeros((n, depth), dtype=bool)
+    for i, (ranking, exp) in enumerate(zip(rankings, expected)):
+        for r, art in enumerate(ranking[:depth]):
+            if exp in art or art in exp:
+                relevance[i, r] = True
+                break
+    has_hit = relevance.any(axis=1)
+    first_rank = np.where(has_hit, relevance.argmax(axis=1) + 1, depth + 1)  # 1-based
+
+    ks_arr = np.array(ks)[None, :]
+    hit_at_k = first_rank[:, None] <= ks_arr
+    recall = hit_at_k.mean(axis=0)
+    mrr = np.where(hit_at_k, 1.0 / first_rank[:, None], 0.0).mean(axis=0)
+    ndcg = np.where(hit_at_k, 1.0 / np.log2(first_rank[:, None] + 1), 0.0).mean(axis=0)
+    return {
+        f"@{k}": {"recall": float(recall[j]), "mrr": float(mrr[j]), "ndcg": float(ndcg[j])}
+        for j, k in enumerate(ks)
+    }
+
+def latency_percentiles(timings: list) -> dict:
+    """p50/p95/p99 per stage (ms)"""
+    import numpy as np
+
+    stages = sorted({stage for t in timings for stage in t})
+    out = {}
+    for stage in stages:
+        values = np.array([t[stage] for t in timings if stage in t])
+        p50, p95, p99 = np.percentile(values, [50, 95, 99])
+        out[stage] = {"p50": float(p50), "p95": float(p95), "p99": float(p99)}
+    return out
+
+def run_retrieval_only(test_data: list, args):
+    """
+    Retrieval evaluation without any LLM call: one deep retrieval per question,
+    then recall/MRR/nDCG for every k and every candidate depth from the same lists.
+    """
+    if not test_data:
+        print("No question to evaluate.")
+        return
+    print('import de RagEngine')
+    from app.rag.rag_engine import RagEngine
+    rag = RagEngine.get_instance()
+
+    ks = sorted({int(k) for k in args.ks.split(",") if int(k) <= args.depth})
+    depths = sorted({int(d) for d in args.depths.split(",") if int(d) <= args.depth})
+    questions = [q['question'] for q in test_data]
+    expected = [normalize_article_id(q['article']) for q in test_data]
+
+    t0 = time.time()
+    query_vectors = rag.embed_queries(questions)
+    embed_ms = (time.time() - t0) * 1000 / len(questions)
+    print(f"🧠 {len(questions)} questions embedded ({embed_ms:.0f}ms/question, batched)")
+
+    def deep(i):
+        timings = {}
+        lists = rag.retrieve_deep(questions[i], depth=args.depth, query_vector=query_vectors[i], timings=timings)
+        return i, lists, timings
+
+    deep_lists = [None] * len(questions)
+    timings = []
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        for i, lists, t in pool.map(deep, range(len(questions))):
+            deep_lists[i] = lists
+            timings.append(t)
+    print(f"🔎 Deep retrieval (depth={args.depth}) done in {time.time() - t0:.1f}s")
+
+    report = {
+        "config": {"depth": args.depth, "ks": ks, "candidate_depths": depths, "n_questions": len(questions)},
+        "naive_vector": ranking_metrics([d["vector"] for d in deep_lists], expected, ks),
+        "keyword": ranking_metrics([d["keyword"] for d in deep_lists], expected, ks),
+        "advanced_reranked": {},
+        "latency_ms": latency_percentiles(timings),
+    }
+    # Reranker scores do not depend on the other candidates, so the ranking for a smaller
+    # candidate depth d is the deep reranked list restricted to vector[:d] + keyword[:d].
+    for d in depths:
+        rankings = []
+        for lists in deep_lists:
+            pool_d = set(lists["vector"][:d]) | set(lists["keyword"][:d])
+            rankings.append([a for a in lists["reranked"] if a in pool_d])
+        report["advanced_reranked"][f"candidates={d}"] = ranking_metrics(rankings, expected, ks)
+
+    print("\n" + "="*60)
+    print("📊 RETRIEVAL-ONLY METRICS")
+    print("="*60)
+    rows = [("naive (vector)", report["naive_vector"]), ("keyword", report["keyword"])]
+    rows += [(f"rerank, {name}", m) for name, m in report["advanced_reranked"].items()]
+    for metric in ("recall", "mrr", "ndcg"):
+        print(f"\n{metric.upper():<26}" + "".join(f"{'@' + str(k):>8}" for k in ks))
+        for name, m in rows:
+            print(f"{name:<26}" + "".join(f"{m['@' + str(k)][metric]:>8.3f}" for k in ks))
+
+    print(f"\n{'Stage':<20} {'p50':>10} {'p95':>10} {'p99':>10}")
+    for stage, p in report["latency_ms"].items():
+        print(f"{stage:<20} {p['p50']:>10.1f} {p['p95']:>10.1f} {p['p99']:>10.1f}")
+
+    with open(args.retrieval_output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n✅ Results saved to {args.retrieval_output}")
 
 def calculate_retrieval_metrics(results: list):
     """Calculate retrieval-specific metrics"""
@@ -85,7 +300,7 @@ def calculate_retrieval_metrics(results: list):
     
     for r in results:
         # Normalize expected article ID
-        expected_id = r['expected_article'].replace("Article L. ", "L").replace("Article L.", "L").replace(" ", "")
+        expected_id = normalize_article_id(r['expected_article'])
         
         # Check if expected article is in retrieved
         retrieved = r['retrieved_articles']
@@ -105,6 +320,15 @@ def calculate_retrieval_metrics(results: list):
 
 def run_ragas_evaluation(results: list):
     """Run RAGAS evaluation on the results"""
+    # Imported here: the retrieval-only mode does not need ragas at all
+    from datasets import Dataset
+    from ragas import evaluate
+    from ragas.metrics import (
+        faithfulness,
+        answer_relevancy,
+        context_precision,
+        context_recall,
+    )
     from langchain_openai import ChatOpenAI, OpenAIEmbeddings
     
     # Prepare dataset for RAGAS
@@ -138,18 +362,69 @@ def run_ragas_evaluation(results: list):
     
     return ragas_results
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="RAGAS evaluation: Naive vs Advanced")
+    parser.add_argument("--data", default=os.path.join(EVAL_DIR, "data_eval.json"))
+    parser.add_argument("--limit", type=int, default=0, help="Only evaluate the first N questions")
+    parser.add_argument("--workers", type=int, default=4, help="Questions processed concurrently")
+    parser.add_argument("--rate", type=float, default=2.0, help="Max LLM calls per second (0 = unlimited)")
+    parser.add_argument("--checkpoint", default=os.path.join(EVAL_DIR, "evaluation_checkpoint.jsonl"),
+                        help="JSONL file of finished results, used to resume an interrupted run")
+    parser.add_argument("--fresh", action="store_true", help="Ignore and overwrite an existing checkpoint")
+    parser.add_argument("--retrieval-only", action="store_true",
+                        help="Skip generation and RAGAS: deep retrieval + recall/MRR/nDCG at many k")
+    parser.add_argument("--depth", type=int, default=100, help="Deep retrieval size (retrieval-only)")
+    parser.add_argument("--ks", default="1,3,5,10,25,50,100", help="Cutoffs for the ranking metrics")
+    parser.add_argument("--depths", default="10,25,50,100", help="Candidate depths per retriever before rerank")
+    parser.add_argument("--retrieval-output", default="retrieval_results.json")
+    return parser.parse_args()
+
 def main():
+    args = parse_args()
+
     # Load test data
-    test_data = load_test_data("data_eval.json")
+    test_data = load_test_data(args.data)
     
     # Optional: use subset for quick testing
-    #test_data = test_data[:5]
+    if args.limit:
+        test_data = test_data[:args.limit]
     
     print(f"📋 Loaded {len(test_data)} test questions")
-    
+    if not test_data:
+        print("No question to evaluate.")
+        return
+
+    if args.retrieval_only:
+        run_retrieval_only(test_data, args)
+        return
+
+    if args.fresh and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+    checkpoint = Checkpoint(args.checkpoint)
+
+    print('import de RagEngine')
+    from app.rag.rag_engine import RagEngine
+    rag = RagEngine.get_instance()
+
+    # Embed every question once (batched), shared by both modes
+    todo = [q['question'] for q in test_data
+            if checkpoint.get("naive", question_id(q)) is None or checkpoint.get("advanced", question_id(q)) is None]
+    query_vectors = None
+    if todo:
+        t0 = time.time()
+        vectors = dict(zip(todo, rag.embed_queries(todo)))
+        query_vectors = [vectors.get(q['question']) for q in test_data]
+        print(f"🧠 {len(todo)} questions embedded in {time.time() - t0:.1f}s")
+
     # Run both modes
-    results_naive = run_rag_pipeline(test_data, mode="naive")
-    results_advanced = run_rag_pipeline(test_data, mode="advanced")
+    limiter = RateLimiter(args.rate)
+    results_naive = run_rag_pipeline(test_data, mode="naive", rag=rag, query_vectors=query_vectors,
+                                     workers=args.workers, limiter=limiter, checkpoint=checkpoint)
+    results_advanced = run_rag_pipeline(test_data, mode="advanced", rag=rag, query_vectors=query_vectors,
+                                        workers=args.workers, limiter=limiter, checkpoint=checkpoint)
+    if not results_naive or not results_advanced:
+        print("\n❌ No successful result to score in one of the modes; see the failures above.")
+        return
     
     # Calculate retrieval metrics
     print("\n" + "="*60)
@@ -171,8 +446,12 @@ def main():
     print("="*60)
     
     try:
-        ragas_naive = run_ragas_evaluation(results_naive)
-        ragas_advanced = run_ragas_evaluation(results_advanced)
+        # Both scorings are independent LLM-bound jobs: run them side by side
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            future_naive = pool.submit(run_ragas_evaluation, results_naive)
+            future_advanced = pool.submit(run_ragas_evaluation, results_advanced)
+            ragas_naive = future_naive.result()
+            ragas_advanced = future_advanced.result()
         
         print(f"\n{'Metric':<25} {'Naive':>15} {'Advanced':>15}")
         print("-"*55)
@@ -56,7 +56,8 @@ export class AppComponent {
       },
       error: (err) => {
         console.error(err);
-        this.messages.push({ content: "Server error.", sender: 'bot', timestamp: new Date() });
+        const content = err?.status === 503 ? "Server busy, please retry in a few seconds." : "Server error.";
+        this.messages.push({ content, sender: 'bot', timestamp: new Date() });
         this.isLoading = false;
       }
     });
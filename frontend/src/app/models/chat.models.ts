@@ -1,10 +1,21 @@
+export interface SearchFilters {
+  themes?: string[];
+  types?: string[];
+  books?: number[];
+  range_from?: number;
+  range_to?: number;
+}
+
 export interface ChatRequest {
   query: string;
   mode: string;
+  codes?: string[];
+  filters?: SearchFilters;
 }
 
 export interface Source {
     article_number: string;
+    code_source?: string;
     content: string;
     score: number;
     metadata?: any;
@@ -14,12 +25,14 @@ export interface ChatResult {
     answer: string;
     sources: Source[];
     processing_time: number;
+    timings?: Record<string, number>;
 }
 
 export interface ChatResponse {
     answer?: string;
     sources?: Source[];
     processing_time?: number;
+    timings?: Record<string, number>;
     comparison?: {
         naive: ChatResult;
         advanced: ChatResult;
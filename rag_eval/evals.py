@@ -1,8 +1,9 @@
+import asyncio
 import os
 import sys
 from pathlib import Path
 
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 
 from ragas import Dataset, experiment
 from ragas.llms import llm_factory
@@ -10,10 +11,27 @@ from ragas.metrics import DiscreteMetric
 
 # Add the current directory to the path so we can import rag module when run as a script
 sys.path.insert(0, str(Path(__file__).parent))
-from rag import default_rag_client
+from rag import BM25Retriever, DenseRetriever, JsonlTraceSink, default_rag_client
+
+# bm25 (keyword) or dense (same embedding model as the backend)
+RETRIEVER = os.environ.get("RAG_RETRIEVER", "bm25")
 
 openai_client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
-rag_client = default_rag_client(llm_client=openai_client, logdir="evals/logs")
+async_openai_client = AsyncOpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+retriever = DenseRetriever() if RETRIEVER == "dense" else BM25Retriever()
+# Traces are buffered and appended to evals/logs/traces_*.jsonl.gz off the query path
+trace_sink = JsonlTraceSink(
+    logdir="evals/logs",
+    compress=True,
+    sample_rate=float(os.environ.get("TRACE_SAMPLE_RATE", "1.0")),
+)
+rag_client = default_rag_client(
+    llm_client=openai_client,
+    logdir="evals/logs",
+    retriever=retriever,
+    trace_sink=trace_sink,
+    async_llm_client=async_openai_client,
+)
 llm = llm_factory("gpt-4o", client=openai_client)
 
 
@@ -57,9 +75,11 @@ my_metric = DiscreteMetric(
 
 @experiment()
 async def run_experiment(row):
-    response = rag_client.query(row["question"])
+    response = await rag_client.aquery(row["question"])
 
-    score = my_metric.score(
+    # The judge client is synchronous: run it in a thread so rows keep overlapping
+    score = await asyncio.to_thread(
+        my_metric.score,
         llm=llm,
         response=response.get("answer", " "),
         grading_notes=row["grading_notes"],
@@ -77,7 +97,10 @@ async def run_experiment(row):
 async def main():
     dataset = load_dataset()
     print("dataset loaded successfully", dataset)
+    # One batched retrieval for every question instead of one per experiment row
+    rag_client.prefetch([row["question"] for row in dataset])
     experiment_results = await run_experiment.arun(dataset)
+    trace_sink.close()
     print("Experiment completed successfully!")
     print("Experiment results:", experiment_results)
 
@@ -88,6 +111,4 @@ async def main():
 
 
 if __name__ == "__main__":
-    import asyncio
-
     asyncio.run(main())
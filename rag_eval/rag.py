@@ -1,9 +1,22 @@
+import asyncio
+import atexit
+import glob
+import gzip
+import hashlib
+import heapq
 import json
+import math
 import os
+import random
+import re
+import shutil
+import threading
+from collections import Counter, defaultdict, deque
 from dataclasses import asdict, dataclass
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
+import numpy as np
 from openai import OpenAI
 
 DOCUMENTS = [
@@ -14,6 +27,9 @@ DOCUMENTS = [
     "Ragas can be performed on various instruments or sung vocally.",
 ]
 
+# Same embedding model as the backend, so dense experiments reflect the production retrieval
+DENSE_MODEL = "Qwen/Qwen3-Embedding-0.6B"
+
 
 @dataclass
 class TraceEvent:
@@ -24,6 +40,209 @@ class TraceEvent:
     data: Dict[str, Any]
 
 
+class TraceSink:
+    """
+    Destination of the per-run trace records written by ExampleRAG.
+    Subclasses implement write (returns where the run is logged) and find (lookup by run_id).
+    """
+
+    # write() does file I/O on the caller's thread (aquery then runs it in a worker thread)
+    blocking = True
+
+    def write(self, record: Dict[str, Any]) -> Optional[str]:
+        raise NotImplementedError("Subclasses should implement this method.")
+
+    def find(self, run_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError("Subclasses should implement this method.")
+
+    def flush(self):
+        """Write any buffered record"""
+
+    def close(self):
+        self.flush()
+
+
+class JsonFileTraceSink(TraceSink):
+    """One indented JSON file per run, written synchronously"""
+
+    def __init__(self, logdir: str = "logs"):
+        self.logdir = logdir
+        os.makedirs(self.logdir, exist_ok=True)
+
+    def write(self, record: Dict[str, Any]) -> Optional[str]:
+        log_filename = f"rag_run_{record['run_id']}_{record['timestamp'].replace(':', '-').replace('.', '-')}.json"
+        log_filepath = os.path.join(self.logdir, log_filename)
+        with open(log_filepath, "w") as f:
+            json.dump(record, f, indent=2)
+
+        print(f"RAG traces exported to: {log_filepath}")
+        return log_filepath
+
+    def find(self, run_id: str) -> Optional[Dict[str, Any]]:
+        paths = sorted(glob.glob(os.path.join(self.logdir, f"rag_run_{glob.escape(run_id)}_*.json")))
+        if not paths:
+            return None
+        with open(paths[-1]) as f:
+            return json.load(f)
+
+
+class JsonlTraceSink(TraceSink):
+    """
+    Buffered JSONL trace log.
+
+    write() only serializes the record into an in-memory ring buffer (at most max_buffer records:
+    the oldest are dropped, and counted, if the writer falls behind). A background thread appends
+    the buffer to traces_<time>.jsonl segments every flush_interval seconds. A segment is closed
+    after max_file_bytes, then gzipped when compress is set. sample_rate keeps that fraction of
+    the runs (runs without a result, i.e. errors, are always kept).
+    Call close() (or flush()) before exiting: buffered records are not on disk yet.
+    """
+
+    blocking = False
+
+    def __init__(
+        self,
+        logdir: str = "logs",
+        max_buffer: int = 10000,
+        flush_interval: float = 1.0,
+        max_file_bytes: int = 50 * 1024 * 1024,
+        compress: bool = False,
+        sample_rate: float = 1.0,
+    ):
+        self.logdir = logdir
+        self.max_file_bytes = max_file_bytes
+        self.compress = compress
+        self.sample_rate = sample_rate
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self.sampled_out = 0
+        os.makedirs(self.logdir, exist_ok=True)
+
+        # (segment path, line): the segment is chosen at write time so the returned path is final
+        # (with compress, the path of the segment once gzipped, i.e. after rotation or close();
+        # records written after close() stay in a plain .jsonl segment)
+        self._buffer: deque = deque(maxlen=max_buffer)
+        self._buffer_lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self._segment = self._new_segment_path()
+        self._segment_bytes = 0
+        self._closed_segments: List[str] = []
+        self._run_segments: Dict[str, str] = {}
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="jsonl-trace-sink", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _new_segment_path(self) -> str:
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        return os.path.join(self.logdir, f"traces_{stamp}_{os.getpid()}.jsonl")
+
+    def write(self, record: Dict[str, Any]) -> Optional[str]:
+        if record.get("result") is not None and random.random() >= self.sample_rate:
+            self.sampled_out += 1
+            return None
+        line = json.dumps(record, default=str) + "\n"
+        size = len(line.encode("utf-8"))
+        with self._buffer_lock:
+            if self._segment_bytes and self._segment_bytes + size > self.max_file_bytes:
+                self._closed_segments.append(self._segment)
+                self._segment = self._new_segment_path()
+                self._segment_bytes = 0
+            self._segment_bytes += size
+            if len(self._buffer) == self._buffer.maxlen:
+                self.dropped += 1
+            self._buffer.append((self._segment, line))
+            self._run_segments[record["run_id"]] = self._segment
+            segment = self._segment
+        if self._stop.is_set():
+            # Written after close(): no background thread left, and no later close() to compress it
+            self.flush()
+            return segment
+        return segment + ".gz" if self.compress else segment
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """Append the buffered records to their segments, then compress the closed segments"""
+        with self._io_lock:
+            with self._buffer_lock:
+                items = list(self._buffer)
+                self._buffer.clear()
+                closed = self._closed_segments
+                self._closed_segments = []
+            lines: Dict[str, List[str]] = defaultdict(list)
+            for segment, line in items:
+                lines[segment].append(line)
+            for segment, segment_lines in lines.items():
+                with open(segment, "a", encoding="utf-8") as f:
+                    f.writelines(segment_lines)
+            if self.compress:
+                for segment in closed:
+                    self._compress(segment)
+
+    @staticmethod
+    def _compress(path: str):
+        if not os.path.exists(path):
+            return
+        with open(path, "rb") as src, gzip.open(path + ".gz", "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(path)
+
+    def close(self):
+        """Stop the background thread and write everything (idempotent)"""
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._thread.join()
+        with self._buffer_lock:
+            self._closed_segments.append(self._segment)
+            self._segment = self._new_segment_path()
+            self._segment_bytes = 0
+        self.flush()
+
+    @staticmethod
+    def _read_segment(path: str, run_id: str) -> Optional[Dict[str, Any]]:
+        opener = gzip.open if path.endswith(".gz") else open
+        found = None
+        marker = json.dumps(run_id)
+        with opener(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if marker in line:
+                    record = json.loads(line)
+                    if record.get("run_id") == run_id:
+                        found = record  # last write wins, as with one file per run
+        return found
+
+    def find(self, run_id: str) -> Optional[Dict[str, Any]]:
+        """Trace record of run_id (flushes first; older processes' segments are scanned newest first)"""
+        self.flush()
+        with self._buffer_lock:
+            segment = self._run_segments.get(run_id)
+        if segment is not None:
+            candidates = [segment, segment + ".gz"]
+        else:
+            candidates = sorted(glob.glob(os.path.join(self.logdir, "traces_*.jsonl*")), reverse=True)
+        for path in candidates:
+            if os.path.exists(path):
+                record = self._read_segment(path, run_id)
+                if record is not None:
+                    return record
+        return None
+
+
+def _length_summary(documents: List[str]) -> Dict[str, int]:
+    """Document sizes for traces (a per-document list grows with the corpus)"""
+    lengths = [len(doc) for doc in documents]
+    return {
+        "count": len(lengths),
+        "total": sum(lengths),
+        "max": max(lengths, default=0),
+    }
+
+
 class BaseRetriever:
     """
     Base class for retrievers.
@@ -37,10 +256,18 @@ class BaseRetriever:
         """Store the documents"""
         self.documents = documents
 
+    def add_documents(self, documents: List[str]):
+        """Add documents to the fitted ones (refits by default, subclasses can index incrementally)"""
+        self.fit(self.documents + list(documents))
+
     def get_top_k(self, query: str, k: int = 3) -> List[tuple]:
         """Retrieve top-k most relevant documents for the query."""
         raise NotImplementedError("Subclasses should implement this method.")
 
+    def get_top_k_batch(self, queries: List[str], k: int = 3) -> List[List[tuple]]:
+        """Top-k for several queries (one get_top_k per query unless overridden)."""
+        return [self.get_top_k(query, k) for query in queries]
+
 
 class SimpleKeywordRetriever(BaseRetriever):
     """Ultra-simple keyword matching retriever"""
@@ -72,11 +299,223 @@ class SimpleKeywordRetriever(BaseRetriever):
         return scores[:k]
 
 
+class BM25Retriever(BaseRetriever):
+    """
+    Okapi BM25 retriever backed by an inverted index.
+
+    Documents are tokenized once: each term maps to its postings (document id, term frequency),
+    so a query only touches the documents containing its terms. add_documents extends the index
+    without re-tokenizing the existing documents.
+    """
+
+    TOKEN_PATTERN = re.compile(r"\w+")
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        super().__init__()
+        self.k1 = k1
+        self.b = b
+        self._reset()
+
+    def _reset(self):
+        self.documents = []
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}
+        self.doc_lengths: List[int] = []
+        self.total_length = 0
+        # Depend on the corpus size and average length: recomputed after documents are added
+        self._length_norms: Optional[List[float]] = None
+        self._idf: Dict[str, float] = {}
+
+    def tokenize(self, text: str) -> List[str]:
+        return self.TOKEN_PATTERN.findall(text.lower())
+
+    def fit(self, documents: List[str]):
+        """Build the index from scratch"""
+        self._reset()
+        self.add_documents(documents)
+
+    def add_documents(self, documents: List[str]):
+        """Index new documents; ids continue after the existing ones"""
+        for document in documents:
+            doc_id = len(self.documents)
+            tokens = self.tokenize(document)
+            self.documents.append(document)
+            self.doc_lengths.append(len(tokens))
+            self.total_length += len(tokens)
+            for term, tf in Counter(tokens).items():
+                self.postings.setdefault(term, []).append((doc_id, tf))
+        if documents:
+            self._length_norms = None
+            self._idf = {}
+
+    def _term_idf(self, term: str) -> float:
+        idf = self._idf.get(term)
+        if idf is None:
+            df = len(self.postings.get(term, ()))
+            idf = self._idf[term] = math.log(1 + (len(self.documents) - df + 0.5) / (df + 0.5))
+        return idf
+
+    def _norms(self) -> List[float]:
+        """k1 * (1 - b + b * |d| / avgdl) for every document"""
+        if self._length_norms is None:
+            avg_length = (self.total_length / len(self.doc_lengths)) or 1.0
+            self._length_norms = [
+                self.k1 * (1 - self.b + self.b * length / avg_length) for length in self.doc_lengths
+            ]
+        return self._length_norms
+
+    def get_scores(self, query: str) -> Dict[int, float]:
+        """BM25 score of every document sharing at least one term with the query"""
+        if not self.documents:
+            return {}
+        norms = self._norms()
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(self.tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = self._term_idf(term)
+            for doc_id, tf in postings:
+                scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norms[doc_id])
+        return scores
+
+    def get_top_k(self, query: str, k: int = 3) -> List[tuple]:
+        """Get top k documents by BM25 score (documents without any query term are left out)"""
+        return heapq.nlargest(k, self.get_scores(query).items(), key=lambda item: item[1])
+
+
+class DenseRetriever(BaseRetriever):
+    """
+    Embedding retriever (cosine similarity).
+
+    Documents are encoded once, in batches, into an L2-normalized float32 matrix that is saved
+    to cache_dir under a hash of the encoder, the matrix format and the corpus: re-running an
+    experiment on the same documents skips the encoding. get_top_k_batch scores all queries
+    with one matrix product.
+    """
+
+    # Part of the cache key: bump when the stored matrix changes (dtype, normalization)
+    CACHE_FORMAT = "float32-l2"
+
+    def __init__(
+        self,
+        model_name: str = DENSE_MODEL,
+        encode_fn: Optional[Callable[[List[str]], Any]] = None,
+        batch_size: int = 32,
+        cache_dir: Optional[str] = "evals/embeddings",
+        query_prompt: Optional[str] = None,
+        encoder_id: Optional[str] = None,
+    ):
+        """
+        Args:
+            model_name: sentence-transformers model
+            encode_fn: Optional function mapping a list of texts to vectors (replaces the model)
+            batch_size: Number of texts per encode call
+            cache_dir: Directory of the saved document matrices (None disables the cache)
+            query_prompt: Optional instruction prepended to queries only
+            encoder_id: Identifies encode_fn in the cache key; without it, encode_fn disables the cache
+        """
+        super().__init__()
+        self.model_name = model_name
+        self.encode_fn = encode_fn
+        self.batch_size = batch_size
+        self.encoder_id = encoder_id if encode_fn is not None else model_name
+        self.cache_dir = cache_dir if self.encoder_id else None
+        self.query_prompt = query_prompt
+        self._model = None
+        self._model_lock = threading.Lock()  # aquery retrieves from several worker threads
+        self.embeddings = np.zeros((0, 0), dtype=np.float32)
+
+    def _encode_batch(self, texts: List[str], prompt: Optional[str] = None):
+        if self.encode_fn is not None:
+            return self.encode_fn([prompt + t for t in texts] if prompt else texts)
+        with self._model_lock:
+            if self._model is None:
+                from sentence_transformers import SentenceTransformer
+
+                self._model = SentenceTransformer(self.model_name)
+        kwargs = {"prompt": prompt} if prompt else {}
+        return self._model.encode(texts, batch_size=self.batch_size, **kwargs)
+
+    def encode(self, texts: List[str], prompt: Optional[str] = None) -> np.ndarray:
+        """Encode texts in batches into a (len(texts), dim) matrix of unit vectors"""
+        chunks = [
+            np.asarray(self._encode_batch(texts[i : i + self.batch_size], prompt), dtype=np.float32)
+            for i in range(0, len(texts), self.batch_size)
+        ]
+        if not chunks:
+            return np.zeros((0, self.embeddings.shape[1]), dtype=np.float32)
+        vectors = np.vstack(chunks)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def _cache_path(self, documents: List[str]) -> Optional[str]:
+        if not self.cache_dir:
+            return None
+        digest = hashlib.sha256(f"{self.encoder_id}\0{self.CACHE_FORMAT}\0".encode("utf-8"))
+        for document in documents:
+            digest.update(document.encode("utf-8"))
+            digest.update(b"\0")
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", self.encoder_id).strip("_")
+        return os.path.join(self.cache_dir, f"{slug}_{digest.hexdigest()[:16]}.npy")
+
+    def _save(self):
+        path = self._cache_path(self.documents)
+        if path is None:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = path + ".tmp.npy"
+        np.save(tmp_path, self.embeddings)
+        os.replace(tmp_path, path)
+
+    def fit(self, documents: List[str]):
+        """Load the document matrix from the cache, or encode and save it"""
+        self.documents = list(documents)
+        path = self._cache_path(self.documents)
+        if path and os.path.exists(path):
+            self.embeddings = np.load(path)
+            return
+        self.embeddings = self.encode(self.documents)
+        self._save()
+
+    def add_documents(self, documents: List[str]):
+        """Encode only the new documents and append them to the matrix"""
+        if not self.documents:
+            self.fit(documents)
+            return
+        # Saved under the new corpus key; the previous matrix stays the cache entry of its own corpus
+        self.documents.extend(documents)
+        self.embeddings = np.vstack([self.embeddings, self.encode(list(documents))])
+        self._save()
+
+    def get_top_k(self, query: str, k: int = 3) -> List[tuple]:
+        """Get top k documents by cosine similarity"""
+        return self.get_top_k_batch([query], k)[0]
+
+    def get_top_k_batch(self, queries: List[str], k: int = 3) -> List[List[tuple]]:
+        """Top-k for every query from one (queries x documents) similarity matrix"""
+        if not queries:
+            return []
+        k = min(k, len(self.documents))
+        if k <= 0:
+            return [[] for _ in queries]
+        scores = self.encode(list(queries), prompt=self.query_prompt) @ self.embeddings.T
+        # argpartition is O(documents) per query; only the k selected columns are sorted
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+        return [
+            [(int(i), float(score)) for i, score in zip(row_ids, row_scores)]
+            for row_ids, row_scores in zip(top, top_scores)
+        ]
+
+
 class ExampleRAG:
     """
     Simple RAG system that:
     1. accepts a llm client
-    2. uses simple keyword matching to retrieve relevant documents
+    2. uses BM25 keyword search to retrieve relevant documents
     3. uses the llm client to generate a response based on the retrieved documents when a query is made
     """
 
@@ -86,18 +525,27 @@ class ExampleRAG:
         retriever: Optional[BaseRetriever] = None,
         system_prompt: Optional[str] = None,
         logdir: str = "logs",
+        trace_sink: Optional[TraceSink] = None,
+        async_llm_client=None,
+        max_concurrency: int = 8,
     ):
         """
         Initialize RAG system
 
         Args:
             llm_client: LLM client with a generate() method
-            retriever: Document retriever (defaults to SimpleKeywordRetriever)
+            retriever: Document retriever (defaults to BM25Retriever)
             system_prompt: System prompt template for generation
             logdir: Directory for trace log files
+            trace_sink: Where run traces go (defaults to one JSON file per run in logdir)
+            async_llm_client: Optional async LLM client (e.g. AsyncOpenAI) used by aquery()
+            max_concurrency: Maximum number of LLM calls in flight in aquery()
         """
         self.llm_client = llm_client
-        self.retriever = retriever or SimpleKeywordRetriever()
+        self.async_llm_client = async_llm_client
+        self.max_concurrency = max_concurrency
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.retriever = retriever or BM25Retriever()
         self.system_prompt = (
             system_prompt
             or """Answer the following question based on the provided documents:
@@ -111,6 +559,9 @@ class ExampleRAG:
         self.is_fitted = False
         self.traces = []
         self.logdir = logdir
+        self.trace_sink = trace_sink or JsonFileTraceSink(logdir)
+        # (query, top_k) -> documents retrieved ahead of time by prefetch()
+        self._prefetched: Dict[Tuple[str, int], List[Dict[str, Any]]] = {}
 
         # Create log directory if it doesn't exist
         os.makedirs(self.logdir, exist_ok=True)
@@ -124,6 +575,7 @@ class ExampleRAG:
                     "retriever_type": type(self.retriever).__name__,
                     "system_prompt_length": len(self.system_prompt),
                     "logdir": self.logdir,
+                    "trace_sink": type(self.trace_sink).__name__,
                 },
             )
         )
@@ -138,14 +590,18 @@ class ExampleRAG:
                     "operation": "add_documents",
                     "num_new_documents": len(documents),
                     "total_documents_before": len(self.documents),
-                    "document_lengths": [len(doc) for doc in documents],
+                    "document_chars": _length_summary(documents),
                 },
             )
         )
 
+        self._prefetched.clear()
+        # Only the new documents are indexed (before extending: the retriever may share our list)
+        if self.is_fitted:
+            self.retriever.add_documents(documents)
+        else:
+            self.retriever.fit(self.documents + list(documents))
         self.documents.extend(documents)
-        # Refit retriever with all documents
-        self.retriever.fit(self.documents)
         self.is_fitted = True
 
         self.traces.append(
@@ -172,12 +628,13 @@ class ExampleRAG:
                     "operation": "set_documents",
                     "num_new_documents": len(documents),
                     "old_document_count": old_doc_count,
-                    "document_lengths": [len(doc) for doc in documents],
+                    "document_chars": _length_summary(documents),
                 },
             )
         )
 
         self.documents = documents
+        self._prefetched.clear()
         self.retriever.fit(self.documents)
         self.is_fitted = True
 
@@ -193,13 +650,73 @@ class ExampleRAG:
             )
         )
 
-    def retrieve_documents(self, query: str, top_k: int = 3) -> List[Dict[str, Any]]:
+    def _to_documents(self, top_docs: List[tuple]) -> List[Dict[str, Any]]:
+        """(index, score) pairs -> document dicts"""
+        return [
+            {
+                "content": self.documents[idx],
+                "similarity_score": score,
+                "document_id": idx,
+            }
+            for idx, score in top_docs
+            if score > 0  # Only include documents with positive similarity scores
+        ]
+
+    def retrieve_documents_batch(
+        self, queries: List[str], top_k: int = 3
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Retrieve top-k documents for several queries in one retriever call
+
+        Args:
+            queries: Search queries
+            top_k: Number of documents to retrieve per query
+
+        Returns:
+            One list of document dicts per query
+        """
+        if not self.is_fitted:
+            raise ValueError(
+                "No documents have been added. Call add_documents() or set_documents() first."
+            )
+
+        results = [
+            self._to_documents(top_docs)
+            for top_docs in self.retriever.get_top_k_batch(queries, k=top_k)
+        ]
+
+        self.traces.append(
+            TraceEvent(
+                event_type="retrieval",
+                component="retriever",
+                data={
+                    "operation": "retrieve_batch",
+                    "num_queries": len(queries),
+                    "top_k": top_k,
+                    "total_documents": len(self.documents),
+                },
+            )
+        )
+        return results
+
+    def prefetch(self, queries: List[str], top_k: int = 3):
+        """
+        Retrieve documents for a whole dataset up front (see retrieve_documents_batch);
+        later query() calls with the same question and top_k reuse them.
+        """
+        for query, docs in zip(queries, self.retrieve_documents_batch(queries, top_k)):
+            self._prefetched[(query, top_k)] = docs
+
+    def retrieve_documents(
+        self, query: str, top_k: int = 3, traces: Optional[List[TraceEvent]] = None
+    ) -> List[Dict[str, Any]]:
         """
         Retrieve top-k most relevant documents for the query
 
         Args:
             query: Search query
             top_k: Number of documents to retrieve
+            traces: Trace list of the run (defaults to self.traces)
 
         Returns:
             List of dictionaries containing document info
@@ -209,7 +726,8 @@ class ExampleRAG:
                 "No documents have been added. Call add_documents() or set_documents() first."
             )
 
-        self.traces.append(
+        traces = self.traces if traces is None else traces
+        traces.append(
             TraceEvent(
                 event_type="retrieval",
                 component="retriever",
@@ -223,25 +741,19 @@ class ExampleRAG:
             )
         )
 
-        top_docs = self.retriever.get_top_k(query, k=top_k)
-
-        retrieved_docs = []
-        for idx, score in top_docs:
-            if score > 0:  # Only include documents with positive similarity scores
-                retrieved_docs.append(
-                    {
-                        "content": self.documents[idx],
-                        "similarity_score": score,
-                        "document_id": idx,
-                    }
-                )
+        prefetched = self._prefetched.get((query, top_k))
+        if prefetched is not None:
+            retrieved_docs = prefetched
+        else:
+            retrieved_docs = self._to_documents(self.retriever.get_top_k(query, k=top_k))
 
-        self.traces.append(
+        traces.append(
             TraceEvent(
                 event_type="retrieval",
                 component="retriever",
                 data={
                     "operation": "retrieve_complete",
+                    "prefetched": prefetched is not None,
                     "num_retrieved": len(retrieved_docs),
                     "scores": [doc["similarity_score"] for doc in retrieved_docs],
                     "document_ids": [doc["document_id"] for doc in retrieved_docs],
@@ -251,39 +763,19 @@ class ExampleRAG:
 
         return retrieved_docs
 
-    def generate_response(self, query: str, top_k: int = 3) -> str:
-        """
-        Generate response to query using retrieved documents
-
-        Args:
-            query: User query
-            top_k: Number of documents to retrieve
-
-        Returns:
-            Generated response
-        """
-        if not self.is_fitted:
-            raise ValueError(
-                "No documents have been added. Call add_documents() or set_documents() first."
-            )
-
-        # Retrieve relevant documents
-        retrieved_docs = self.retrieve_documents(query, top_k)
-
-        if not retrieved_docs:
-            return "I couldn't find any relevant documents to answer your question."
-
+    def _build_messages(
+        self, query: str, retrieved_docs: List[Dict[str, Any]], traces: List[TraceEvent]
+    ) -> List[Dict[str, str]]:
+        """Chat messages for the LLM call (traced as llm_call)"""
         # Build context from retrieved documents
         context_parts = []
         for i, doc in enumerate(retrieved_docs, 1):
             context_parts.append(f"Document {i}:\n{doc['content']}")
 
         context = "\n\n".join(context_parts)
-
-        # Generate response using LLM client
         prompt = self.system_prompt.format(query=query, context=context)
 
-        self.traces.append(
+        traces.append(
             TraceEvent(
                 event_type="llm_call",
                 component="openai_api",
@@ -297,34 +789,66 @@ class ExampleRAG:
                 },
             )
         )
+        return [
+            {"role": "system", "content": self.system_prompt},
+            {"role": "user", "content": prompt},
+        ]
 
-        try:
-            response = self.llm_client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": self.system_prompt},
-                    {"role": "user", "content": prompt},
-                ],
+    @staticmethod
+    def _read_response(response, traces: List[TraceEvent]) -> str:
+        """Answer text of a chat completion (traced as llm_response)"""
+        response_text = response.choices[0].message.content.strip()
+
+        traces.append(
+            TraceEvent(
+                event_type="llm_response",
+                component="openai_api",
+                data={
+                    "operation": "generate_response",
+                    "response_length": len(response_text),
+                    "usage": (response.usage.model_dump() if response.usage else None),
+                    "model": "gpt-4o",
+                },
             )
+        )
+        return response_text
+
+    def generate_response(
+        self,
+        query: str,
+        top_k: int = 3,
+        retrieved_docs: Optional[List[Dict[str, Any]]] = None,
+    ) -> str:
+        """
+        Generate response to query using retrieved documents
 
-            response_text = response.choices[0].message.content.strip()
+        Args:
+            query: User query
+            top_k: Number of documents to retrieve
+            retrieved_docs: Documents already retrieved for the query (skips retrieval)
 
-            self.traces.append(
-                TraceEvent(
-                    event_type="llm_response",
-                    component="openai_api",
-                    data={
-                        "operation": "generate_response",
-                        "response_length": len(response_text),
-                        "usage": (
-                            response.usage.model_dump() if response.usage else None
-                        ),
-                        "model": "gpt-4o",
-                    },
-                )
+        Returns:
+            Generated response
+        """
+        if not self.is_fitted:
+            raise ValueError(
+                "No documents have been added. Call add_documents() or set_documents() first."
             )
 
-            return response_text
+        # Retrieve relevant documents
+        if retrieved_docs is None:
+            retrieved_docs = self.retrieve_documents(query, top_k)
+
+        if not retrieved_docs:
+            return "I couldn't find any relevant documents to answer your question."
+
+        messages = self._build_messages(query, retrieved_docs, self.traces)
+
+        try:
+            response = self.llm_client.chat.completions.create(
+                model="gpt-4o", messages=messages
+            )
+            return self._read_response(response, self.traces)
 
         except Exception as e:
             self.traces.append(
@@ -352,7 +876,7 @@ class ExampleRAG:
         """
         # Generate run_id if not provided
         if run_id is None:
-            run_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{hash(question) % 10000:04d}"
+            run_id = self._new_run_id(question)
 
         # Reset traces for this query
         self.traces = []
@@ -373,7 +897,7 @@ class ExampleRAG:
 
         try:
             retrieved_docs = self.retrieve_documents(question, top_k)
-            response = self.generate_response(question, top_k)
+            response = self.generate_response(question, top_k, retrieved_docs)
 
             result = {"answer": response, "run_id": run_id}
 
@@ -410,47 +934,188 @@ class ExampleRAG:
                 "logs": logs_path,
             }
 
-    def export_traces_to_log(
+    async def aquery(
+        self, question: str, top_k: int = 3, run_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Async version of query() for running many questions concurrently
+
+        Retrieves once in a worker thread (scoring is CPU-bound and would stall the event loop),
+        calls the async LLM client (at most max_concurrency calls in flight)
+        and keeps its traces in a list of its own, so concurrent runs do not mix their traces.
+
+        Args:
+            question: User question
+            top_k: Number of documents to retrieve
+            run_id: Optional run ID for tracing (auto-generated if not provided)
+
+        Returns:
+            Dictionary containing response and retrieved documents
+        """
+        if run_id is None:
+            run_id = self._new_run_id(question)
+
+        traces = [
+            TraceEvent(
+                event_type="query_start",
+                component="rag_system",
+                data={
+                    "run_id": run_id,
+                    "question": question,
+                    "question_length": len(question),
+                    "top_k": top_k,
+                    "total_documents": len(self.documents),
+                },
+            )
+        ]
+
+        try:
+            retrieved_docs = await asyncio.to_thread(
+                self.retrieve_documents, question, top_k, traces
+            )
+            if not retrieved_docs:
+                response = "I couldn't find any relevant documents to answer your question."
+            else:
+                messages = self._build_messages(question, retrieved_docs, traces)
+                try:
+                    response = self._read_response(
+                        await self._acomplete(messages), traces
+                    )
+                except Exception as e:
+                    traces.append(
+                        TraceEvent(
+                            event_type="error",
+                            component="openai_api",
+                            data={"operation": "generate_response", "error": str(e)},
+                        )
+                    )
+                    response = f"Error generating response: {str(e)}"
+
+            result = {"answer": response, "run_id": run_id}
+
+            traces.append(
+                TraceEvent(
+                    event_type="query_complete",
+                    component="rag_system",
+                    data={
+                        "run_id": run_id,
+                        "success": True,
+                        "response_length": len(response),
+                        "num_retrieved": len(retrieved_docs),
+                    },
+                )
+            )
+
+            logs_path = await self._aexport_traces(run_id, question, result, traces)
+            return {"answer": response, "run_id": run_id, "logs": logs_path}
+
+        except Exception as e:
+            traces.append(
+                TraceEvent(
+                    event_type="error",
+                    component="rag_system",
+                    data={"run_id": run_id, "operation": "aquery", "error": str(e)},
+                )
+            )
+
+            logs_path = await self._aexport_traces(run_id, question, None, traces)
+            return {
+                "answer": f"Error processing query: {str(e)}",
+                "run_id": run_id,
+                "logs": logs_path,
+            }
+
+    async def _acomplete(self, messages: List[Dict[str, str]]):
+        """One chat completion, limited to max_concurrency concurrent calls"""
+        # Created on first use: the semaphore belongs to the running event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            if self.async_llm_client is not None:
+                return await self.async_llm_client.chat.completions.create(
+                    model="gpt-4o", messages=messages
+                )
+            # No async client: keep the event loop free by calling the sync one in a thread
+            return await asyncio.to_thread(
+                self.llm_client.chat.completions.create,
+                model="gpt-4o",
+                messages=messages,
+            )
+
+    @staticmethod
+    def _new_run_id(question: str) -> str:
+        return f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{hash(question) % 10000:04d}"
+
+    def _log_record(
         self,
         run_id: str,
-        query: Optional[str] = None,
-        result: Optional[Dict[str, Any]] = None,
-    ):
-        """Export traces to a log file with run_id"""
-        timestamp = datetime.now().isoformat()
-        log_filename = (
-            f"rag_run_{run_id}_{timestamp.replace(':', '-').replace('.', '-')}.json"
-        )
-        log_filepath = os.path.join(self.logdir, log_filename)
-
-        log_data = {
+        query: Optional[str],
+        result: Optional[Dict[str, Any]],
+        traces: List[TraceEvent],
+    ) -> Dict[str, Any]:
+        return {
             "run_id": run_id,
-            "timestamp": timestamp,
+            "timestamp": datetime.now().isoformat(),
             "query": query,
             "result": result,
             "num_documents": len(self.documents),
-            "traces": [asdict(trace) for trace in self.traces],
+            "traces": [asdict(trace) for trace in traces],
         }
 
-        with open(log_filepath, "w") as f:
-            json.dump(log_data, f, indent=2)
-
-        print(f"RAG traces exported to: {log_filepath}")
-        return log_filepath
-
+    def export_traces_to_log(
+        self,
+        run_id: str,
+        query: Optional[str] = None,
+        result: Optional[Dict[str, Any]] = None,
+    ):
+        """Send the traces of run_id to the trace sink (returns where they are logged)"""
+        return self.trace_sink.write(self._log_record(run_id, query, result, self.traces))
 
-def default_rag_client(llm_client, logdir: str = "logs") -> ExampleRAG:
+    async def _aexport_traces(
+        self,
+        run_id: str,
+        query: str,
+        result: Optional[Dict[str, Any]],
+        traces: List[TraceEvent],
+    ):
+        """export_traces_to_log for aquery: blocking sinks are written from a worker thread"""
+        record = self._log_record(run_id, query, result, traces)
+        if self.trace_sink.blocking:
+            return await asyncio.to_thread(self.trace_sink.write, record)
+        return self.trace_sink.write(record)
+
+    def get_run_log(self, run_id: str) -> Optional[Dict[str, Any]]:
+        """Trace record of a previous run"""
+        return self.trace_sink.find(run_id)
+
+
+def default_rag_client(
+    llm_client,
+    logdir: str = "logs",
+    retriever: Optional[BaseRetriever] = None,
+    trace_sink: Optional[TraceSink] = None,
+    async_llm_client=None,
+) -> ExampleRAG:
     """
     Create a default RAG client with OpenAI LLM and optional retriever.
 
     Args:
-        retriever: Optional retriever instance (defaults to SimpleKeywordRetriever)
+        llm_client: OpenAI client
         logdir: Directory for trace logs
+        retriever: Optional retriever instance (defaults to BM25Retriever)
+        trace_sink: Optional trace sink (defaults to one JSON file per run)
+        async_llm_client: Optional async OpenAI client for aquery()
     Returns:
         ExampleRAG instance
     """
-    retriever = SimpleKeywordRetriever()
-    client = ExampleRAG(llm_client=llm_client, retriever=retriever, logdir=logdir)
+    retriever = retriever or BM25Retriever()
+    client = ExampleRAG(
+        llm_client=llm_client,
+        retriever=retriever,
+        logdir=logdir,
+        trace_sink=trace_sink,
+        async_llm_client=async_llm_client,
+    )
     client.add_documents(DOCUMENTS)  # Add default documents
     return client
 
@@ -466,7 +1131,7 @@ if __name__ == "__main__":
 
     # Initialize RAG system with tracing enabled
     llm = OpenAI(api_key=api_key)
-    r = SimpleKeywordRetriever()
+    r = BM25Retriever()
     rag_client = ExampleRAG(llm_client=llm, retriever=r, logdir="logs")
 
     # Add documents (this will be traced)
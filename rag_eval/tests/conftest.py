@@ -0,0 +1,6 @@
+# rag_eval/tests/conftest.py
+# Run from rag_eval/: python -m pytest tests
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
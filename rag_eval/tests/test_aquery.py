@@ -0,0 +1,61 @@
+# rag_eval/tests/test_aquery.py
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+from rag import BaseRetriever, ExampleRAG, JsonlTraceSink
+
+
+class SlowRetriever(BaseRetriever):
+    """CPU-bound stand-in: blocks its thread for `delay` seconds per query."""
+
+    def __init__(self, delay):
+        super().__init__()
+        self.delay = delay
+        self.threads = set()
+
+    def get_top_k(self, query, k=3):
+        self.threads.add(threading.get_ident())
+        time.sleep(self.delay)
+        return [(0, 1.0)]
+
+
+class FakeAsyncLLM:
+    def __init__(self):
+        async def create(model, messages):
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="answer"))],
+                                   usage=None)
+
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=create))
+
+
+def test_retrieval_runs_off_the_event_loop(tmp_path):
+    retriever = SlowRetriever(delay=0.2)
+    sink = JsonlTraceSink(logdir=str(tmp_path))
+    rag = ExampleRAG(llm_client=None, retriever=retriever, logdir=str(tmp_path), trace_sink=sink,
+                     async_llm_client=FakeAsyncLLM())
+    rag.add_documents(["doc"])
+
+    async def run():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        tick_task = asyncio.create_task(ticker())
+        start = time.perf_counter()
+        results = await asyncio.gather(*(rag.aquery(f"question {i}", top_k=1) for i in range(4)))
+        elapsed = time.perf_counter() - start
+        tick_task.cancel()
+        return results, elapsed, ticks
+
+    results, elapsed, ticks = asyncio.run(run())
+    sink.close()
+    assert [r["answer"] for r in results] == ["answer"] * 4
+    assert elapsed < 0.6  # 4 x 0.2s retrievals overlapped
+    assert ticks >= 5  # the loop kept running while retrieving
+    assert threading.get_ident() not in retriever.threads
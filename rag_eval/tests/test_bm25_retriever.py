@@ -0,0 +1,66 @@
+# rag_eval/tests/test_bm25_retriever.py
+import math
+
+import pytest
+
+from rag import BM25Retriever
+
+DOCS = [
+    "Le délai de rétractation est de quatorze jours.",
+    "Le vendeur rembourse le consommateur.",
+    "Le contrat est conclu à distance.",
+    "Garantie légale de conformité du bien vendu.",
+    "Le consommateur exerce son droit de rétractation sans motif.",
+]
+QUERIES = ["délai de rétractation", "consommateur", "contrat à distance", "garantie", "inconnu"]
+
+
+def reference_scores(retriever, query):
+    """BM25 computed term by term over the raw documents"""
+    docs = [retriever.tokenize(d) for d in retriever.documents]
+    avg_length = sum(map(len, docs)) / len(docs)
+    scores = {}
+    for doc_id, tokens in enumerate(docs):
+        score = 0.0
+        for term in set(retriever.tokenize(query)):
+            tf = tokens.count(term)
+            if not tf:
+                continue
+            df = sum(term in d for d in docs)
+            idf = math.log(1 + (len(docs) - df + 0.5) / (df + 0.5))
+            norm = retriever.k1 * (1 - retriever.b + retriever.b * len(tokens) / avg_length)
+            score += idf * tf * (retriever.k1 + 1) / (tf + norm)
+        if score:
+            scores[doc_id] = score
+    return scores
+
+
+@pytest.mark.parametrize("split", [0, 2, len(DOCS)])
+def test_add_documents_matches_fit(split):
+    full = BM25Retriever()
+    full.fit(DOCS)
+
+    incremental = BM25Retriever()
+    incremental.fit(DOCS[:split])
+    incremental.get_scores(QUERIES[0])  # fills the idf and length caches before the update
+    incremental.add_documents(DOCS[split:])
+
+    for query in QUERIES:
+        assert incremental.get_scores(query) == pytest.approx(full.get_scores(query))
+        assert incremental.get_top_k(query, k=len(DOCS)) == full.get_top_k(query, k=len(DOCS))
+
+
+def test_scores_match_the_reference_formula():
+    retriever = BM25Retriever()
+    retriever.fit(DOCS)
+    for query in QUERIES:
+        assert retriever.get_scores(query) == pytest.approx(reference_scores(retriever, query))
+
+
+def test_documents_without_query_terms_are_left_out():
+    retriever = BM25Retriever()
+    retriever.fit(DOCS)
+    top = retriever.get_top_k("garantie", k=len(DOCS))
+    assert [doc_id for doc_id, _ in top] == [3]
+    assert retriever.get_top_k("inconnu", k=3) == []
+    assert BM25Retriever().get_top_k("garantie") == []
@@ -0,0 +1,82 @@
+# rag_eval/tests/test_dense_retriever.py
+import os
+
+import numpy as np
+import pytest
+
+from rag import DenseRetriever
+
+DOCS = ["alpha beta", "gamma", "delta epsilon zeta"]
+
+
+def fake_encoder(dim=4):
+    """Deterministic vectors from the text length; counts the encoded texts."""
+    calls = []
+
+    def encode(texts):
+        calls.extend(texts)
+        return [[len(t), 1.0] + [0.0] * (dim - 2) for t in texts]
+
+    return encode, calls
+
+
+def cache_files(path):
+    return sorted(f for f in os.listdir(path) if f.endswith(".npy")) if os.path.exists(path) else []
+
+
+def test_matrix_is_normalized_and_ranked():
+    encode, _ = fake_encoder()
+    retriever = DenseRetriever(encode_fn=encode, cache_dir=None)
+    retriever.fit(DOCS)
+    assert retriever.embeddings.shape == (3, 4)
+    assert np.allclose(np.linalg.norm(retriever.embeddings, axis=1), 1.0)
+
+    top = retriever.get_top_k("x" * 18, k=2)
+    assert [i for i, _ in top] == [2, 0]
+    assert top[0][1] >= top[1][1]
+    assert retriever.get_top_k_batch([], k=2) == []
+
+
+def test_encode_fn_without_id_disables_the_cache(tmp_path):
+    encode, _ = fake_encoder()
+    retriever = DenseRetriever(encode_fn=encode, cache_dir=str(tmp_path))
+    retriever.fit(DOCS)
+    assert cache_files(tmp_path) == []
+
+
+def test_cache_is_keyed_by_encoder(tmp_path):
+    encode, calls = fake_encoder()
+    DenseRetriever(encode_fn=encode, encoder_id="fake-v1", cache_dir=str(tmp_path)).fit(DOCS)
+    DenseRetriever(encode_fn=encode, encoder_id="fake-v1", cache_dir=str(tmp_path)).fit(DOCS)
+    assert len(calls) == len(DOCS)  # second fit loaded the matrix
+
+    DenseRetriever(encode_fn=encode, encoder_id="fake-v2", cache_dir=str(tmp_path)).fit(DOCS)
+    assert len(calls) == 2 * len(DOCS)
+    assert len(cache_files(tmp_path)) == 2
+
+
+def test_add_documents_keeps_the_previous_cached_matrix(tmp_path):
+    encode, calls = fake_encoder()
+    retriever = DenseRetriever(encode_fn=encode, encoder_id="fake", cache_dir=str(tmp_path))
+    retriever.fit(DOCS[:2])
+    base = retriever.embeddings.copy()
+    retriever.add_documents(DOCS[2:])
+    assert calls == DOCS  # only the new document was encoded
+    assert len(cache_files(tmp_path)) == 2
+
+    reloaded = DenseRetriever(encode_fn=encode, encoder_id="fake", cache_dir=str(tmp_path))
+    reloaded.fit(DOCS)
+    assert len(calls) == len(DOCS)
+    assert np.array_equal(reloaded.embeddings, retriever.embeddings)
+
+    reloaded.fit(DOCS[:2])  # the base corpus is still cached
+    assert len(calls) == len(DOCS)
+    assert np.array_equal(reloaded.embeddings, base)
+
+
+@pytest.mark.parametrize("k", [0, 10])
+def test_k_is_clamped(k):
+    encode, _ = fake_encoder()
+    retriever = DenseRetriever(encode_fn=encode, cache_dir=None)
+    retriever.fit(DOCS)
+    assert all(len(r) == min(k, len(DOCS)) for r in retriever.get_top_k_batch(["a", "b"], k=k))
@@ -0,0 +1,88 @@
+# rag_eval/tests/test_trace_sink.py
+import gzip
+import json
+import os
+
+import pytest
+
+from rag import JsonlTraceSink
+
+
+def record(run_id, result="ok", size=0):
+    return {"run_id": run_id, "timestamp": "2024-01-01T00:00:00", "result": result, "pad": "x" * size}
+
+
+@pytest.fixture
+def make_sink(tmp_path):
+    sinks = []
+
+    def make(**kwargs):
+        kwargs.setdefault("flush_interval", 3600)  # flushes are explicit in the tests
+        sink = JsonlTraceSink(logdir=str(tmp_path), **kwargs)
+        sinks.append(sink)
+        return sink
+
+    yield make
+    for sink in sinks:
+        sink.close()
+
+
+def read_lines(path):
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_write_is_buffered_until_flush(make_sink):
+    sink = make_sink()
+    path = sink.write(record("a"))
+    assert not os.path.exists(path)
+    sink.flush()
+    assert [r["run_id"] for r in read_lines(path)] == ["a"]
+    assert sink.find("a")["run_id"] == "a"
+    assert sink.find("missing") is None
+
+
+def test_rotation_and_compression_return_final_paths(make_sink, tmp_path):
+    sink = make_sink(max_file_bytes=300, compress=True)
+    paths = [sink.write(record(f"run{i}", size=200)) for i in range(3)]
+    assert all(p.endswith(".jsonl.gz") for p in paths)
+    assert len(set(paths)) == 3  # one record per segment at this size
+
+    sink.flush()
+    assert os.path.exists(paths[0]) and os.path.exists(paths[1])  # closed segments are gzipped
+    sink.close()
+    for i, path in enumerate(paths):
+        assert [r["run_id"] for r in read_lines(path)] == [f"run{i}"]
+    assert not [f for f in os.listdir(tmp_path) if f.endswith(".jsonl")]
+
+    # A new process finds the run by scanning the segments
+    assert make_sink().find("run1")["run_id"] == "run1"
+
+
+def test_full_buffer_drops_oldest(make_sink):
+    sink = make_sink(max_buffer=2)
+    path = None
+    for i in range(3):
+        path = sink.write(record(f"run{i}"))
+    assert sink.dropped == 1
+    sink.flush()
+    assert [r["run_id"] for r in read_lines(path)] == ["run1", "run2"]
+
+
+def test_sampling_keeps_failed_runs(make_sink):
+    sink = make_sink(sample_rate=0.0)
+    assert sink.write(record("ok")) is None
+    assert sink.write(record("failed", result=None)) is not None
+    assert sink.sampled_out == 1
+    assert sink.find("failed")["run_id"] == "failed"
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_write_after_close_goes_to_disk(make_sink, compress):
+    sink = make_sink(compress=compress)
+    sink.close()
+    path = sink.write(record("late"))
+    assert os.path.exists(path)
+    assert [r["run_id"] for r in read_lines(path)] == ["late"]
+    assert sink.find("late")["run_id"] == "late"